@@ -0,0 +1,119 @@
+# async_db.py
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import metrics
+
+# Функції db.py, які лише читають (йдуть у пул reader-потоків)
+READ_FUNCS = {
+    "get_participants",
+    "count_participants",
+    "count_participants_today",
+    "count_participants_last_hour",
+    "participants_per_hour",
+    "participants_per_day",
+    "get_all_user_ids",
+    "get_stores",
+    "get_store_stats",
+    "get_rules",
+    "table_counts",
+    "pick_random_winner",
+    "get_winners",
+    "get_participant",
+    "get_eligible_entries",
+    "get_export_checkpoint",
+    "fetch_gs_outbox",
+    "count_gs_outbox",
+    "fetch_broadcast_batch",
+    "get_broadcast_job",
+    "get_running_broadcast_jobs",
+    "broadcast_error_summary",
+    "get_active_campaign",
+    "campaign_report",
+    "fsm_load",
+    "find_receipt",
+    "get_receipt_hashes",
+    "fetch_unhashed_receipts",
+    "get_flagged_receipts",
+    "get_cached_validation",
+    "fetch_unvalidated_receipts",
+    "validation_summary",
+    "get_notify_modes",
+}
+
+# Функції, які пишуть (серіалізуються на одному writer-потоці)
+WRITE_FUNCS = {
+    "init_db",
+    "save_participant",
+    "add_participant",
+    "upsert_store",
+    "set_rules",
+    "save_winner",
+    "ack_gs_outbox",
+    "retry_gs_outbox",
+    "reconcile_gs_seq",
+    "create_broadcast_job",
+    "save_broadcast_results",
+    "finish_broadcast_job",
+    "check_store_counters",
+    "draw_winners",
+    "set_export_checkpoint",
+    "start_campaign",
+    "fsm_save",
+    "fsm_expire",
+    "save_receipt_hash",
+    "clear_receipt_flag",
+    "save_validation",
+    "set_notify_mode",
+}
+
+
+class AsyncDB:
+    """
+    Async-фасад над db.py для хендлерів aiogram.
+    Читання — у пулі потоків (розмір = db.READER_POOL_SIZE),
+    запис — на одному окремому потоці, тож повільний запис/VACUUM
+    не блокує ні event loop, ні читання інших користувачів.
+    """
+
+    def __init__(self, readers: int = db.READER_POOL_SIZE):
+        self._read_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+    async def read(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_pool, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_pool, functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name in READ_FUNCS:
+            run = self.read
+        elif name in WRITE_FUNCS:
+            run = self.write
+        else:
+            raise AttributeError(f"AsyncDB: невідома функція db.{name}")
+        fn = getattr(db, name)
+
+        async def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await run(fn, *args, **kwargs)
+            finally:
+                metrics.observe("bot_db_seconds", time.perf_counter() - started, fn=name)
+
+        call.__name__ = name
+        return call
+
+    def shutdown(self) -> None:
+        self._read_pool.shutdown(wait=True)
+        self._write_pool.shutdown(wait=True)
+        db.close_db()
+
+
+adb = AsyncDB()
@@ -0,0 +1,80 @@
+# backup.py
+import asyncio
+import glob
+import logging
+import os
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+
+import db
+
+log = logging.getLogger("backup")
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join("data", "backups"))
+BACKUP_EVERY_HOURS = float(os.getenv("BACKUP_EVERY_HOURS", "0"))  # 0 — планові бекапи вимкнені
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+
+def make_snapshot(dest_dir: str) -> dict:
+    """
+    Знімок БД: backup API (каталог + файл активної кампанії) -> тимчасові .db -> .tar.gz у dest_dir.
+    Відновлення — розпакувати архів у data/ (шляхи всередині відносні до неї).
+    Повертає {"path", "seconds", "db_size", "gz_size"}.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    started = time.monotonic()
+    gz_path = os.path.join(dest_dir, f"bot_backup_{datetime.now():%Y%m%d_%H%M%S}.tar.gz")
+    campaign = db.get_active_campaign()
+    members = (
+        ("main", os.path.basename(db.DB_PATH)),
+        ("campaign", os.path.relpath(campaign["path"], os.path.dirname(db.DB_PATH) or ".")),
+    )
+    db_size = 0
+    with tempfile.TemporaryDirectory(dir=dest_dir) as tmp:
+        try:
+            with tarfile.open(gz_path, "w:gz", compresslevel=6) as tar:
+                for schema, arcname in members:
+                    raw_path = os.path.join(tmp, f"{schema}.db")
+                    db.backup_to(raw_path, schema=schema)
+                    db_size += os.path.getsize(raw_path)
+                    tar.add(raw_path, arcname=arcname)
+        except BaseException:
+            if os.path.exists(gz_path):
+                os.remove(gz_path)
+            raise
+    return {
+        "path": gz_path,
+        "seconds": time.monotonic() - started,
+        "db_size": db_size,
+        "gz_size": os.path.getsize(gz_path),
+    }
+
+
+def prune(dest_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> list[str]:
+    """Лишає keep найновіших знімків, решту видаляє."""
+    files = sorted(glob.glob(os.path.join(dest_dir, "bot_backup_*.tar.gz")))
+    removed = files[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+async def backup_scheduler(stop: asyncio.Event) -> None:
+    """Планові знімки в BACKUP_DIR кожні BACKUP_EVERY_HOURS годин з ротацією (BACKUP_KEEP)."""
+    if BACKUP_EVERY_HOURS <= 0:
+        return
+    interval = BACKUP_EVERY_HOURS * 3600
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            info = await asyncio.to_thread(make_snapshot, BACKUP_DIR)
+            await asyncio.to_thread(prune)
+            log.info("Бекап %s: %.1fs, %d -> %d байт", info["path"], info["seconds"], info["db_size"], info["gz_size"])
+        except Exception:
+            log.exception("Плановий бекап не вдався")
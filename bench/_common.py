@@ -0,0 +1,61 @@
+# bench/_common.py
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+
+STORES = 50
+
+
+@contextmanager
+def temp_db():
+    """Свіжий каталог + кампанія у тимчасовій теці (data/bot.db не чіпаємо); видаляється після заміру."""
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    db.close_db()
+    saved = db.DB_PATH, db._active
+    db.DB_PATH, db._active = os.path.join(tmp, "bot.db"), None
+    try:
+        db.init_db()
+        for store_no in range(1, STORES + 1):
+            db.upsert_store(store_no, f"Магазин {store_no}")
+        yield tmp
+    finally:
+        db.close_db()
+        db.DB_PATH, db._active = saved
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def fill_participants(n: int, users: int | None = None, batch: int = 50000, seed: int = 1) -> None:
+    """n реєстрацій від users різних юзерів (за замовчуванням — кожна від свого) пачками через writer."""
+    rnd = random.Random(seed)
+    users = users or n
+    done = 0
+    while done < n:
+        size = min(batch, n - done)
+        rows = [
+            (rnd.randrange(1, users + 1), f"user{i}", f"Учасник {i}", f"+38067{i:07d}",
+             f"photo{i}", rnd.randrange(1, STORES + 1))
+            for i in range(done, done + size)
+        ]
+        with db._write(touch=True) as conn:
+            conn.executemany(
+                "INSERT INTO participants (tg_user_id, username, full_name, phone, photo_id, store_no) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        done += size
+
+
+def timed(fn, *args, **kwargs):
+    """(результат, секунди)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
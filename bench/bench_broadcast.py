@@ -0,0 +1,101 @@
+# bench/bench_broadcast.py
+"""
+Розсилка broadcast.Broadcaster через справжній aiogram Bot на локальний фейковий Bot API
+(aiohttp): затримка відповіді, частка 403 і періодичні 429 RetryAfter налаштовуються.
+
+    python bench/bench_broadcast.py [-n 10000] [--rate 25] [--concurrency 8] [--latency-ms 30]
+                                    [--forbidden 0.02] [--retry-every 0]
+
+Дефолтні ліміти (25 msg/s) тримають 10k отримувачів ~7 хв; щоб поміряти сам рушій —
+підніміть --rate і --concurrency (напр. --rate 5000 --concurrency 64 -n 100000).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import _common  # noqa: F401  (шлях до модулів бота)
+import broadcast
+
+TOKEN = "123456:bench"
+
+
+def _fake_api(args) -> web.Application:
+    rnd = random.Random(1)
+    state = {"calls": 0}
+
+    async def send_message(request: web.Request) -> web.Response:
+        state["calls"] += 1
+        data = await request.post()
+        await asyncio.sleep(args.latency_ms / 1000)
+        if args.retry_every and state["calls"] % args.retry_every == 0:
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            }, status=429)
+        if rnd.random() < args.forbidden:
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}, status=403
+            )
+        chat_id = int(data["chat_id"])
+        return web.Response(text=json.dumps({"ok": True, "result": {
+            "message_id": state["calls"], "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", ""),
+        }}), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/sendMessage", send_message)
+    app["state"] = state
+    return app
+
+
+async def _recipients(n: int):
+    for chat_id in range(1, n + 1):
+        yield chat_id
+
+
+async def run(args) -> None:
+    app = _fake_api(args)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"), limit=args.concurrency * 2)
+    bot = Bot(TOKEN, session=session)
+    try:
+        started = time.perf_counter()
+        stats = await broadcast.Broadcaster(bot, "Бенчмарк розсилки", rate=args.rate, concurrency=args.concurrency).run(
+            _recipients(args.n), total=args.n
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        await session.close()
+        await runner.cleanup()
+
+    print(f"отримувачів: {args.n}, rate={args.rate:g}/с, concurrency={args.concurrency}, "
+          f"затримка API {args.latency_ms} мс")
+    print(f"надіслано: {stats.sent}, помилок: {stats.failed}, запитів до API: {app['state']['calls']}")
+    print(f"час: {elapsed:.1f} с, {stats.done / elapsed:.1f} msg/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=10000, help="кількість отримувачів")
+    parser.add_argument("--rate", type=float, default=broadcast.GLOBAL_RATE, help="глобальний ліміт, msg/s")
+    parser.add_argument("--concurrency", type=int, default=broadcast.CONCURRENCY, help="паралельних відправників")
+    parser.add_argument("--latency-ms", type=float, default=30, help="затримка відповіді фейкового API")
+    parser.add_argument("--forbidden", type=float, default=0.02, help="частка отримувачів, що заблокували бота")
+    parser.add_argument("--retry-every", type=int, default=0, help="кожен N-й запит — 429 retry_after=1 (0 — ні)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/bench_db_pool.py
+"""
+Реєстрація (insert + count) як у хендлері: старий db.py (sqlite3.connect на кожен виклик,
+rollback journal) проти пулу з'єднань у WAL (db.add_participant + db.count_participants).
+
+    python bench/bench_db_pool.py [-n 5000]
+"""
+import argparse
+import os
+import sqlite3
+
+from _common import db, temp_db, timed
+
+
+def _legacy(path: str, n: int) -> None:
+    """Як було до пулу: _connect() на кожен виклик, commit і close."""
+    def connect():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return sqlite3.connect(path)
+
+    with connect() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS participants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, tg_user_id INTEGER, username TEXT, full_name TEXT,
+                phone TEXT, photo_id TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, store_no INTEGER
+            )
+        """)
+    for i in range(n):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO participants (tg_user_id, username, full_name, phone, photo_id, store_no) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (i, f"user{i}", f"Учасник {i}", "+380670000000", f"photo{i}", i % 50 + 1),
+            )
+        conn.close()
+        conn = connect()
+        conn.execute("SELECT COUNT(*) FROM participants").fetchone()
+        conn.close()
+
+
+def _pooled(n: int) -> None:
+    for i in range(n):
+        db.add_participant(i, f"user{i}", f"Учасник {i}", "+380670000000", f"photo{i}", i % 50 + 1)
+        db.count_participants()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=5000, help="кількість реєстрацій")
+    args = parser.parse_args()
+
+    with temp_db() as tmp:
+        _, legacy = timed(_legacy, os.path.join(tmp, "legacy", "bot.db"), args.n)
+        _, pooled = timed(_pooled, args.n)
+    print(f"{'':<26} {'с':>8} {'reg/s':>10}")
+    print(f"{'connect на кожен виклик':<26} {legacy:>8.2f} {args.n / legacy:>10.0f}")
+    print(f"{'пул + WAL':<26} {pooled:>8.2f} {args.n / pooled:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
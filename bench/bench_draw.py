@@ -0,0 +1,72 @@
+# bench/bench_draw.py
+"""
+Розіграш: старий ORDER BY RANDOM() LIMIT 1 проти draw.EligiblePool
+(побудова пулу один раз, далі pick() для кожного режиму ваги) і цикл, як у /random_winner:
+pick → db.save_winner → pick → ... — пул має доганяти зміни на місці, без перебудови.
+
+    python bench/bench_draw.py [-n 1000000] [--users 300000] [--draws 10000] [--cycles 50]
+"""
+import argparse
+import time
+
+from _common import db, fill_participants, temp_db, timed
+
+import draw
+
+OLD_SQL = """
+    SELECT p.id, p.username, p.full_name, p.phone, p.created_at, p.store_no
+    FROM participants p
+    LEFT JOIN winners w ON w.participant_id = p.id
+    WHERE w.participant_id IS NULL
+    ORDER BY RANDOM()
+    LIMIT 1
+"""
+
+
+def _old() -> tuple:
+    with db._read() as conn:
+        return conn.execute(OLD_SQL).fetchone()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=1000000, help="кількість учасників")
+    parser.add_argument("--users", type=int, default=300000, help="скільки різних юзерів")
+    parser.add_argument("--draws", type=int, default=10000, help="розіграшів на кожен режим пулу")
+    parser.add_argument("--old-draws", type=int, default=5, help="розіграшів старим запитом")
+    parser.add_argument("--cycles", type=int, default=50, help="циклів pick + save_winner")
+    args = parser.parse_args()
+
+    with temp_db():
+        fill_participants(args.n, users=args.users)
+        old = min(timed(_old)[1] for _ in range(args.old_draws))
+        pool = draw.EligiblePool()
+        size, build = timed(pool.size)
+        print(f"учасників: {size}")
+        print(f"ORDER BY RANDOM(): {old * 1000:.0f} мс на розіграш (найкращий з {args.old_draws})")
+        print(f"побудова пулу: {build:.2f} с")
+        for weight in draw.WEIGHTS:
+            _, first = timed(pool.pick, weight)   # для user/store — ще й групування за ключем
+            started = time.perf_counter()
+            for _ in range(args.draws):
+                pool.pick(weight)
+            per_draw = (time.perf_counter() - started) / args.draws
+            print(f"pick({weight!r}): перший {first * 1000:.0f} мс, далі {per_draw * 1e6:.1f} мкс")
+
+        for weight in draw.WEIGHTS:
+            rebuilds = pool.rebuilds
+            started = time.perf_counter()
+            for _ in range(args.cycles):
+                db.save_winner(pool.pick(weight))
+            per_cycle = (time.perf_counter() - started) / args.cycles
+            print(f"pick({weight!r}) + save_winner: {per_cycle * 1000:.2f} мс на цикл, "
+                  f"перебудов пулу: {pool.rebuilds - rebuilds}")
+        started = time.perf_counter()
+        for _ in range(args.old_draws):
+            db.save_winner(_old()[0])
+        per_cycle = (time.perf_counter() - started) / args.old_draws
+        print(f"ORDER BY RANDOM() + save_winner: {per_cycle * 1000:.0f} мс на цикл")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# bench/bench_export.py
+"""
+/export: export.build_export() у CSV і XLSX — час побудови, розмір файлу
+і пік пам'яті Python-хіпу, щоб перевірити, що він не росте з кількістю рядків.
+
+    python bench/bench_export.py [-n 500000] [--fmt csv xlsx] [--trace]
+
+Без --trace пік — це ru_maxrss процесу (разом із заповненням БД, page cache і mmap SQLite —
+росте з розміром файлу БД); з --trace — tracemalloc лише на час побудови: саме він показує,
+чи тримає експорт рядки в пам'яті, але сповільнює побудову в ~8 разів.
+"""
+import argparse
+import os
+import resource
+import time
+import tracemalloc
+
+from _common import fill_participants, temp_db
+
+import export
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=500000, help="кількість учасників")
+    parser.add_argument("--fmt", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    parser.add_argument("--trace", action="store_true", help="пік хіпу через tracemalloc")
+    args = parser.parse_args()
+
+    with temp_db():
+        fill_participants(args.n)
+        peak_title = "пік хіпу, MB" if args.trace else "maxrss, MB"
+        print(f"{'':<6} {'рядків':>8} {'с':>8} {'MB файлу':>9} {peak_title:>13}")
+        for fmt in args.fmt:
+            if args.trace:
+                tracemalloc.start()
+            started = time.perf_counter()
+            path, rows, _ = export.build_export(fmt=fmt)
+            elapsed = time.perf_counter() - started
+            if args.trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            else:
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # Linux: КБ
+            size = os.path.getsize(path)
+            os.remove(path)
+            print(f"{fmt:<6} {rows:>8} {elapsed:>8.1f} {size / 2**20:>9.1f} {peak / 2**20:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
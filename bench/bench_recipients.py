@@ -0,0 +1,42 @@
+# bench/bench_recipients.py
+"""
+Список отримувачів розсилки: старий запит (рядок на кожен чек) проти db.get_all_user_ids()
+(рядок на юзера) і db.create_broadcast_job() (INSERT ... SELECT DISTINCT).
+
+    python bench/bench_recipients.py [-n 100000] [--users 25000]
+"""
+import argparse
+
+from _common import db, fill_participants, temp_db, timed
+
+OLD_SQL = "SELECT tg_user_id, id FROM participants WHERE tg_user_id IS NOT NULL"
+
+
+def _old() -> list:
+    with db._read() as conn:
+        return conn.execute(OLD_SQL).fetchall()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=100000, help="кількість реєстрацій")
+    parser.add_argument("--users", type=int, default=25000, help="скільки різних юзерів їх зробили")
+    args = parser.parse_args()
+
+    with temp_db():
+        fill_participants(args.n, users=args.users)
+        _old(), db.get_all_user_ids()   # прогрів page cache
+        old_rows, old = timed(_old)
+        new_rows, new = timed(db.get_all_user_ids)
+        job, job_time = timed(db.create_broadcast_job, 0, "bench")
+
+    print(f"реєстрацій: {args.n}, юзерів: до {args.users}")
+    print(f"{'':<28} {'рядків':>8} {'мс':>8}")
+    print(f"{'старий SELECT':<28} {len(old_rows):>8} {old * 1000:>8.1f}")
+    print(f"{'get_all_user_ids()':<28} {len(new_rows):>8} {new * 1000:>8.1f}")
+    print(f"{'create_broadcast_job()':<28} {job['total']:>8} {job_time * 1000:>8.1f}")
+    print(f"зайвих повідомлень без дедуплікації: {len(old_rows) - len(new_rows)}")
+
+
+if __name__ == "__main__":
+    main()
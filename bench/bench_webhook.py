@@ -0,0 +1,150 @@
+# bench/bench_webhook.py
+"""
+Пропускна здатність прийому апдейтів: long polling (dp.start_polling проти фейкового
+getUpdates) проти webhook.UpdateServer (паралельні POST-и записаних апдейтів, як це робить
+Telegram з max_connections). Хендлер однаковий — «I/O» на --handler-ms; кожен запит
+до/від Telegram коштує --rtt-ms.
+
+    python bench/bench_webhook.py [-n 3000] [--handler-ms 20] [--rtt-ms 50] [--connections 40]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import ClientSession, TCPConnector, web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+import _common  # noqa: F401  (шлях до модулів бота)
+import webhook
+
+TOKEN = "123456:bench"
+BATCH = 100     # getUpdates limit за замовчуванням
+
+
+def _update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 1700000000,
+            "chat": {"id": update_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": update_id, "is_bot": False, "first_name": "Bench"},
+            "text": "/start",
+        },
+    }
+
+
+def _dispatcher(args, done: asyncio.Event, counter: dict) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message) -> None:
+        await asyncio.sleep(args.handler_ms / 1000)
+        counter["handled"] += 1
+        if counter["handled"] == args.n:
+            done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def _fake_api(args) -> tuple[web.AppRunner, int]:
+    """getMe + getUpdates: апдейти 1..n пачками по BATCH, далі — порожні відповіді."""
+    rtt = args.rtt_ms / 1000
+
+    async def call(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        await asyncio.sleep(rtt)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            offset = max(int(data.get("offset") or 1), 1)
+            last = min(offset + int(data.get("limit") or BATCH), args.n + 1)
+            result = [_update(i) for i in range(offset, last)]
+            if not result:
+                await asyncio.sleep(0.5)
+        else:
+            result = True
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/{{method}}", call)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def bench_polling(args) -> float:
+    runner, port = await _fake_api(args)
+    done, counter = asyncio.Event(), {"handled": 0}
+    dp = _dispatcher(args, done, counter)
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")))
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(
+        bot, handle_signals=False, close_bot_session=False, tasks_concurrency_limit=webhook.MAX_CONCURRENT_UPDATES,
+    ))
+    try:
+        await done.wait()
+        return time.perf_counter() - started
+    finally:
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+        await runner.cleanup()
+
+
+async def bench_webhook(args) -> float:
+    done, counter = asyncio.Event(), {"handled": 0}
+    dp = _dispatcher(args, done, counter)
+    bot = Bot(TOKEN)
+    server = webhook.UpdateServer(dp, bot, secret="")
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{webhook.WEBHOOK_PATH}"
+    bodies = iter(range(1, args.n + 1))
+
+    async def connection(session: ClientSession) -> None:
+        # як Telegram: наступний апдейт у це з'єднання — лише після відповіді на попередній
+        for update_id in bodies:
+            await asyncio.sleep(args.rtt_ms / 1000)
+            async with session.post(url, json=_update(update_id)) as resp:
+                assert resp.status == 200, resp.status
+
+    started = time.perf_counter()
+    try:
+        async with ClientSession(connector=TCPConnector(limit=args.connections)) as session:
+            await asyncio.gather(*(connection(session) for _ in range(args.connections)))
+        await done.wait()
+        return time.perf_counter() - started
+    finally:
+        await server.drain()
+        await runner.cleanup()
+        await bot.session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=3000, help="кількість апдейтів")
+    parser.add_argument("--handler-ms", type=float, default=20, help="час хендлера")
+    parser.add_argument("--rtt-ms", type=float, default=50, help="затримка мережі до Telegram")
+    parser.add_argument("--connections", type=int, default=40, help="max_connections webhook-а")
+    args = parser.parse_args()
+
+    print(f"апдейтів: {args.n}, хендлер {args.handler_ms:g} мс, RTT {args.rtt_ms:g} мс, "
+          f"ліміт обробки {webhook.MAX_CONCURRENT_UPDATES}")
+    for title, fn in (("polling", bench_polling), (f"webhook ({args.connections} з'єднань)", bench_webhook)):
+        elapsed = asyncio.run(fn(args))
+        print(f"{title:<24} {elapsed:>6.2f} с  {args.n / elapsed:>7.0f} upd/s")
+
+
+if __name__ == "__main__":
+    main()
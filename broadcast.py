@@ -0,0 +1,310 @@
+# broadcast.py
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Awaitable, Callable
+
+from aiogram import Bot
+
+from async_db import adb
+from notifier import send_with_retry
+
+log = logging.getLogger("broadcast")
+
+# Ліміти Telegram: ~30 повідомлень/с глобально, ~1 повідомлення/с в один чат
+GLOBAL_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+PER_CHAT_INTERVAL = 1.0
+CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+PROGRESS_EVERY_SEC = 5
+PAGE_SIZE = 500        # скільки отримувачів читаємо з БД за раз
+FLUSH_EVERY = 25       # скільки результатів доставки пишемо в БД пачкою
+
+
+class TokenBucket:
+    """Token bucket: rate токенів/с, до capacity накопичених; pause() — для RetryAfter."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Зупиняє видачу токенів для всіх відправників (Telegram попросив почекати)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+class Broadcaster:
+    """
+    Розсилка: обмежена кількість паралельних відправників + спільний token bucket.
+    Отримувачі беруться з async-ітератора по одному (без завантаження всього списку в пам'ять).
+    """
+
+    def __init__(self, bot: Bot, text: str, rate: float = GLOBAL_RATE, concurrency: int = CONCURRENCY):
+        self.bot = bot
+        self.text = text
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.stats = BroadcastStats()
+        self._chat_next: dict[int, float] = {}
+
+    async def _wait_chat(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready_at = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, ready_at) + PER_CHAT_INTERVAL
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    async def send_one(self, chat_id: int) -> str | None:
+        """
+        Надсилає одне повідомлення. Повертає None або клас помилки.
+        Повтори — notifier.send_with_retry: RetryAfter ставить на паузу весь bucket
+        і не рахується як спроба, ліміт спроб — лише на мережеві збої.
+        """
+        await self._wait_chat(chat_id)
+        error = await send_with_retry(
+            lambda: self.bot.send_message(chat_id, self.text),
+            before=self.bucket.acquire,
+            on_retry_after=self._on_retry_after,
+        )
+        return None if error is None else type(error).__name__
+
+    def _on_retry_after(self, seconds: float) -> None:
+        log.warning("RetryAfter %ss — пауза розсилки", seconds)
+        self.bucket.pause(seconds)
+
+    async def _worker(self, queue: asyncio.Queue, on_result) -> None:
+        while True:
+            chat_id = await queue.get()
+            try:
+                if chat_id is None:
+                    return
+                error = await self.send_one(chat_id)
+                if error is None:
+                    self.stats.sent += 1
+                else:
+                    self.stats.failed += 1
+                if on_result is not None:
+                    await on_result(chat_id, error)
+            finally:
+                queue.task_done()
+
+    async def run(
+        self,
+        chat_ids: AsyncIterable[int],
+        total: int | None = None,
+        on_result: Callable[[int, str | None], Awaitable[None]] | None = None,
+    ) -> BroadcastStats:
+        if total is not None:
+            self.stats.total = total
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue, on_result)) for _ in range(self.concurrency)]
+        try:
+            async for chat_id in chat_ids:
+                await queue.put(chat_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+        return self.stats
+
+
+def format_progress(stats: BroadcastStats, title: str = "🚀 Розсилка") -> str:
+    total = stats.total or "?"
+    return (
+        f"{title}: {stats.done}/{total}\n"
+        f"✅ Надіслано: {stats.sent}, ❌ помилок: {stats.failed}\n"
+        f"⚡ {stats.rate:.1f} msg/s"
+    )
+
+
+async def report_progress(
+    bot: Bot, chat_id: int, message_id: int, stats: BroadcastStats, stop: asyncio.Event, title: str = "🚀 Розсилка"
+) -> None:
+    """Періодично оновлює повідомлення адміну з прогресом."""
+    last = None
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=PROGRESS_EVERY_SEC)
+        except asyncio.TimeoutError:
+            pass
+        text = format_progress(stats, title)
+        if text == last:
+            continue
+        try:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+            last = text
+        except Exception:
+            pass
+
+
+# ==========================================
+#   Персистентні задачі розсилки (SQLite)
+# ==========================================
+
+_tasks: dict[int, asyncio.Task] = {}
+_cancel_events: dict[int, asyncio.Event] = {}
+
+
+async def _pending_recipients(job_id: int, cancelled: asyncio.Event):
+    """Стрімить pending-отримувачів сторінками з БД; після рестарту продовжує з тих, хто ще не отримав."""
+    cursor = -(2 ** 63)
+    while not cancelled.is_set():
+        page = await adb.fetch_broadcast_batch(job_id, cursor, PAGE_SIZE)
+        if not page:
+            return
+        for tg_user_id in page:
+            if cancelled.is_set():
+                return
+            yield tg_user_id
+        cursor = page[-1]
+
+
+async def _run_job(bot: Bot, job: dict, cancelled: asyncio.Event) -> None:
+    job_id = job["id"]
+    bc = Broadcaster(bot, job["text"])
+    bc.stats.total = job["total"] - job["sent"] - job["failed"]
+
+    buffer: list[tuple[int, str | None]] = []
+
+    async def on_result(chat_id: int, error: str | None) -> None:
+        buffer.append((chat_id, error))
+        if len(buffer) >= FLUSH_EVERY:
+            batch = buffer[:]
+            buffer.clear()
+            await adb.save_broadcast_results(job_id, batch)
+
+    admin_chat_id = job["admin_chat_id"]
+    title = f"🚀 Розсилка #{job_id}"
+    status = None
+    if admin_chat_id:
+        try:
+            status = await bot.send_message(admin_chat_id, format_progress(bc.stats, title))
+        except Exception:
+            status = None
+
+    stop = asyncio.Event()
+    progress = None
+    if status is not None:
+        progress = asyncio.create_task(
+            report_progress(bot, admin_chat_id, status.message_id, bc.stats, stop, title)
+        )
+    try:
+        await bc.run(_pending_recipients(job_id, cancelled), on_result=on_result)
+    finally:
+        await adb.save_broadcast_results(job_id, buffer)
+        stop.set()
+        if progress is not None:
+            await progress
+
+    await adb.finish_broadcast_job(job_id, "cancelled" if cancelled.is_set() else "done")
+    final = await adb.get_broadcast_job(job_id)
+    if admin_chat_id:
+        try:
+            await bot.send_message(
+                admin_chat_id,
+                f"{'🛑 Скасовано' if cancelled.is_set() else '✅ Готово'}: розсилка #{job_id}. "
+                f"Надіслано: {final['sent']}, помилок: {final['failed']} з {final['total']}. "
+                f"Швидкість: {bc.stats.rate:.1f} msg/s."
+            )
+        except Exception:
+            pass
+
+
+def _forget(job_id: int) -> None:
+    _tasks.pop(job_id, None)
+    _cancel_events.pop(job_id, None)
+
+
+def _spawn(bot: Bot, job: dict) -> None:
+    job_id = job["id"]
+    cancelled = asyncio.Event()
+    task = asyncio.create_task(_run_job(bot, job, cancelled), name=f"broadcast-{job_id}")
+    _tasks[job_id] = task
+    _cancel_events[job_id] = cancelled
+    task.add_done_callback(lambda t: _forget(job_id))
+
+
+def running_job_ids() -> list[int]:
+    return [job_id for job_id, t in _tasks.items() if not t.done()]
+
+
+async def start_job(bot: Bot, admin_chat_id: int, text: str) -> dict:
+    job = await adb.create_broadcast_job(admin_chat_id, text)
+    if job["total"]:
+        _spawn(bot, job)
+    else:
+        await adb.finish_broadcast_job(job["id"])
+    return job
+
+
+async def resume_jobs(bot: Bot) -> list[int]:
+    """Викликається на старті: продовжує всі незавершені розсилки."""
+    resumed = []
+    for job in await adb.get_running_broadcast_jobs():
+        if job["id"] in _tasks:
+            continue
+        log.info("Відновлюю розсилку #%s (%s/%s)", job["id"], job["sent"] + job["failed"], job["total"])
+        _spawn(bot, job)
+        resumed.append(job["id"])
+    return resumed
+
+
+async def cancel_job(job_id: int) -> bool:
+    """Зупиняє розсилку: в цьому процесі — через event, інакше — лише статус у БД."""
+    cancelled = _cancel_events.get(job_id)
+    if cancelled is not None:
+        cancelled.set()
+        return True
+    job = await adb.get_broadcast_job(job_id)
+    if job and job["status"] == "running":
+        await adb.finish_broadcast_job(job_id, "cancelled")
+        return True
+    return False
+
+
+async def shutdown() -> None:
+    """Зупиняє задачі без зміни статусу (вони продовжаться після рестарту)."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
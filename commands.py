@@ -18,19 +18,30 @@ ADMIN_COMMANDS = [
     BotCommand(command="ping",          description="Перевірка бота (pong)"),
     BotCommand(command="version",       description="Версія бота"),
     BotCommand(command="stats",         description="Статистика (БД + Google Sheet)"),
+    BotCommand(command="perf",          description="Швидкодія: p50/p95/p99 хендлерів, БД, Sheets"),
+    BotCommand(command="profile",       description="Профайлер: /profile 30 (флеймграф + блокування loop)"),
 
     # ✅ магазини
     BotCommand(command="stores",        description="Магазини + кількість реєстрацій"),
     BotCommand(command="store_add",     description="Додати/оновити магазин: /store_add 12 Назва"),
+    BotCommand(command="stores_check",  description="Звірити лічильники магазинів"),
 
-    BotCommand(command="export",        description="Експорт учасників у XLSX"),
+    BotCommand(command="export",        description="Експорт учасників у XLSX/CSV"),
+    BotCommand(command="export_delta",  description="Експорт лише нових учасників"),
     BotCommand(command="backup",        description="Бекап файлу БД"),
-    BotCommand(command="clear",         description="Очистити БД та Google Sheet"),
+    BotCommand(command="clear",         description="Нова кампанія: /clear [назва] (+ очистка Google Sheet)"),
+    BotCommand(command="campaigns",     description="Усі кампанії та їхні підсумки"),
     BotCommand(command="set_rules",     description="Встановити правила розіграшу"),
     BotCommand(command="get_rules",     description="Показати поточні правила"),
     BotCommand(command="random_winner", description="Рандомний переможець"),
+    BotCommand(command="draw",          description="N переможців: /draw 10 [store=8] [unique_user]"),
     BotCommand(command="winners",       description="Список переможців"),
+    BotCommand(command="duplicates",    description="Схожі чеки (дублі)"),
+    BotCommand(command="dup_ok",        description="Повернути чек у розіграш: /dup_ok 123"),
+    BotCommand(command="notify",        description="Алерти про реєстрації: /notify all|digest|off"),
     BotCommand(command="broadcast",     description="Розсилка всім учасникам"),
+    BotCommand(command="broadcast_status", description="Стан розсилки"),
+    BotCommand(command="broadcast_cancel", description="Зупинити розсилку"),
 
     # ✅ правильний help для адмінів
     BotCommand(command="help_admin",    description="Список адмін-команд"),
@@ -1,72 +1,662 @@
 # db.py
+import glob
+import logging
 import os
+import queue
+import random
 import sqlite3
-from datetime import date
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from urllib.request import pathname2url
 
+log = logging.getLogger("db")
+
+# Каталог: список кампаній + глобальні таблиці (магазини, розсилки).
+# Гарячі дані кампанії (participants, winners, rules, ...) — в окремому файлі
+# data/campaigns/campaign_<id>.db, який кожне з'єднання підключає як схему "campaign".
 DB_PATH = os.path.join("data", "bot.db")
+CAMPAIGNS_SUBDIR = "campaigns"
+
+# ==========================================
+#   Пул з'єднань (1 writer + N readers, WAL)
+# ==========================================
+
+ARCHIVE_ATTEMPTS = 3
+ARCHIVE_BUSY_TIMEOUT_SEC = 1.0
+READER_POOL_SIZE = max(int(os.getenv("DB_READERS", "4")), 1)
+STATEMENT_CACHE_SIZE = 256
+
+# Прагми рівня файлу — ставляться окремо для main і campaign
+_SCHEMA_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",      # у WAL це безпечно: fsync лише на checkpoint
+    "cache_size=-16000",       # ~16 MB page cache на з'єднання
+    "mmap_size=134217728",     # 128 MB memory-mapped I/O
+)
+_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_writer_lock = threading.RLock()
+_writer: sqlite3.Connection | None = None
+_readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+_readers_lock = threading.Lock()
+_readers_opened = 0
+# Росте при зміні кампанії: з'єднання старої епохи не повертаються в пул, а закриваються
+_readers_epoch = 0
+_reader_epoch: dict[sqlite3.Connection, int] = {}
+
+# Активна кампанія {"id", "title", "path"} — читається з каталогу при першому з'єднанні
+_active: dict | None = None
+_catalog_lock = threading.Lock()
+
+# Лічильник змін participants/winners — для in-process кешів (див. draw.py)
+_generation = 0
+# Журнал останніх змін: (generation, [(op, id, tg_user_id, store_no), ...] або None — «перебудуй усе»).
+# draw.EligiblePool доганяє по ньому замість перечитувати всіх учасників після кожного запису.
+CHANGES_KEEP = 10000
+_changes: deque = deque(maxlen=CHANGES_KEEP)
+_changes_lock = threading.Lock()
+_pending: list = []    # зміни поточної транзакції writer-а (під _writer_lock)
+
+
+def _data_path(db_file: str) -> str:
+    """db_file у каталозі кампаній — відносно теки, де лежить DB_PATH."""
+    return os.path.join(os.path.dirname(DB_PATH) or ".", db_file)
+
+
+def _active_campaign() -> dict:
+    global _active
+    if _active is None:
+        with _catalog_lock:
+            if _active is None:
+                _active = _open_catalog()
+    return _active
+
+
+def _open_connection(readonly: bool = False) -> sqlite3.Connection:
+    campaign = _active_campaign()
+    os.makedirs(os.path.dirname(campaign["path"]) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,          # з'єднання живуть довше за один потік (executor)
+        cached_statements=STATEMENT_CACHE_SIZE,
+        uri=True,                         # для ATTACH 'file:...?mode=ro' у звітах по архівах
+    )
+    # таблиці кампанії не мають префікса в запитах: SQLite шукає їх у main, потім у campaign
+    conn.execute("ATTACH DATABASE ? AS campaign", (campaign["path"],))
+    for schema in ("main", "campaign"):
+        for pragma in _SCHEMA_PRAGMAS:
+            conn.execute(f"PRAGMA {schema}.{pragma}")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def _writer_conn() -> sqlite3.Connection:
+    global _writer
+    if _writer is None:
+        _writer = _open_connection()
+    return _writer
+
+
+@contextmanager
+def _write(touch: bool = False):
+    """
+    Єдине writer-з'єднання: серіалізує записи, commit/rollback автоматично.
+    touch=True — після commit повністю інвалідує кеші, що залежать від participants/winners;
+    точкові зміни (_changed) публікуються в журнал і застосовуються кешами на місці.
+    """
+    with _writer_lock:
+        conn = _writer_conn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            _pending.clear()
+            conn.rollback()
+            raise
+        changes = _pending[:]
+        _pending.clear()
+        if touch:
+            _publish(None)
+        elif changes:
+            _publish(changes)
+
+
+def _changed(op: str, participant_id: int, tg_user_id: int | None, store_no: int | None) -> None:
+    """Викликати всередині _write(): op — 'add' (новий кандидат) або 'remove' (виграв / дубль чека)."""
+    _pending.append((op, participant_id, tg_user_id, store_no))
+
+
+def _changed_row(cur: sqlite3.Cursor, op: str, participant_id: int) -> None:
+    cur.execute("SELECT tg_user_id, store_no FROM participants WHERE id = ?", (participant_id,))
+    row = cur.fetchone()
+    if row:
+        _changed(op, participant_id, *row)
+
+
+def _publish(changes: list | None) -> None:
+    global _generation
+    with _changes_lock:
+        _generation += 1
+        _changes.append((_generation, changes))
+
+
+def data_generation() -> int:
+    """Змінюється після кожного запису в participants/winners."""
+    return _generation
+
+
+def changes_since(generation: int | None) -> list | None:
+    """
+    Зміни кандидатів після generation у порядку запису або None, якщо їх не відновити
+    (журнал уже обрізаний, нова кампанія, масова зміна) — тоді кеш перебудовується з БД.
+    """
+    with _changes_lock:
+        if generation == _generation:
+            return []
+        if generation is None or not _changes or _changes[0][0] > generation + 1:
+            return None
+        ops: list = []
+        for gen, changes in _changes:
+            if gen <= generation:
+                continue
+            if changes is None:
+                return None
+            ops.extend(changes)
+        return ops
+
+
+class _Cached:
+    """
+    Рідко змінюване значення з БД у пам'яті процесу (правила, довідник магазинів).
+    Запис іде через set()/invalidate() після commit; version росте з кожною зміною,
+    тож читання, що стартувало до запису, не покладе в кеш застаріле значення.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._value = None
+        self._valid = False
+        self.version = 0
+
+    def get(self):
+        with self._lock:
+            if self._valid:
+                return self._value
+            version = self.version
+        value = self._load()
+        with self._lock:
+            if version == self.version:
+                self._value, self._valid = value, True
+        return value
+
+    def set(self, value) -> None:
+        with self._lock:
+            self._value, self._valid = value, True
+            self.version += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._valid = False
+            self.version += 1
+
+    def peek(self):
+        """(version, value), якщо значення в кеші, інакше None — без звернення до БД."""
+        with self._lock:
+            return (self.version, self._value) if self._valid else None
+
+
+@contextmanager
+def _read():
+    """Бере reader-з'єднання з пулу (відкриває нове, поки не досягнуто ліміту)."""
+    global _readers_opened
+    conn = None
+    while conn is None:
+        try:
+            conn = _readers.get_nowait()
+        except queue.Empty:
+            with _readers_lock:
+                epoch = _readers_epoch
+                can_open = _readers_opened < READER_POOL_SIZE
+                if can_open:
+                    _readers_opened += 1
+            if can_open:
+                try:
+                    conn = _open_connection(readonly=True)
+                except BaseException:
+                    with _readers_lock:
+                        if epoch == _readers_epoch:
+                            _readers_opened -= 1
+                    raise
+                _reader_epoch[conn] = epoch
+            else:
+                conn = _readers.get()
+        if conn is not None and _reader_epoch.get(conn) != _readers_epoch:
+            _retire(conn)   # з'єднання попередньої кампанії, що повернулось уже після ротації
+            conn = None
+    try:
+        yield conn
+    finally:
+        if _reader_epoch.get(conn) == _readers_epoch:
+            _readers.put(conn)
+        else:
+            _retire(conn)
+            _readers.put(None)   # будить того, хто чекає в _readers.get(): тепер він може відкрити нове
+
+
+def _retire(conn: sqlite3.Connection) -> None:
+    _reader_epoch.pop(conn, None)
+    conn.close()
+
+
+def _close_all_locked() -> None:
+    """Викликати під _writer_lock + _readers_lock: чекає завершення читань і закриває все."""
+    global _writer, _readers_opened
+    while _readers_opened:
+        conn = _readers.get()
+        if conn is None:
+            continue
+        current = _reader_epoch.get(conn) == _readers_epoch
+        _retire(conn)
+        if current:
+            _readers_opened -= 1
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def _retire_all_locked() -> None:
+    """
+    Як _close_all_locked, але не чекає читань (під _writer_lock, тож чекати довгий /export —
+    зупинити всі реєстрації): вільні з'єднання закриваються одразу, зайняті дочитують
+    попередню кампанію і закриваються, коли повернуться в пул.
+    """
+    global _writer, _readers_opened, _readers_epoch
+    _readers_epoch += 1
+    _readers_opened = 0
+    while True:
+        try:
+            conn = _readers.get_nowait()
+        except queue.Empty:
+            break
+        if conn is not None:
+            _retire(conn)
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def close_db() -> None:
+    """Закриває всі з'єднання пулу (наступний запит відкриє їх заново)."""
+    with _writer_lock:
+        with _readers_lock:
+            _close_all_locked()
+
+
+def backup_to(dest_path: str, schema: str = "main") -> None:
+    """
+    Консистентна онлайн-копія БД через SQLite backup API (разом із вмістом -wal).
+    schema="main" — каталог, "campaign" — файл активної кампанії.
+    Копіює за один крок (pages=-1) з одного read-снепшоту WAL: writer не блокується.
+    Порціями не можна — кожен коміт writer-а (інше з'єднання) перезапускає backup
+    з нульової сторінки, і під потоком реєстрацій він не завершується ніколи.
+    """
+    src = _open_connection(readonly=True)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst, pages=-1, name=schema)
+    finally:
+        dst.close()
+        src.close()
 
 
 def _connect():
-    os.makedirs("data", exist_ok=True)
-    return sqlite3.connect(DB_PATH)
+    """Legacy: окреме з'єднання на виклик (лишив для сторонніх скриптів)."""
+    return _open_connection()
 
 
-def _column_exists(cur: sqlite3.Cursor, table: str, column: str) -> bool:
-    cur.execute(f"PRAGMA table_info({table})")
+def _column_exists(cur: sqlite3.Cursor, table: str, column: str, schema: str = "main") -> bool:
+    cur.execute(f"PRAGMA {schema}.table_info({table})")
     cols = [row[1] for row in cur.fetchall()]
     return column in cols
 
 
-def init_db():
-    """Створює таблиці, якщо вони відсутні + м'які міграції"""
-    with _connect() as conn:
-        cur = conn.cursor()
+def _init_catalog(cur: sqlite3.Cursor):
+    """Таблиці каталогу (main): кампанії + те, що спільне для всіх кампаній."""
+    # ✅ кампанії: кожна має власний файл з participants/winners/rules
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.campaigns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            db_file TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ended_at TIMESTAMP
+        )
+    """)
 
-        # participants
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS participants (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tg_user_id INTEGER,
-                username TEXT,
-                full_name TEXT,
-                phone TEXT,
-                photo_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    # ✅ довідник магазинів (по номеру)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.stores (
+            store_no INTEGER PRIMARY KEY,
+            name TEXT
+        )
+    """)
 
-        # ✅ міграція: додаємо store_no, якщо його ще нема
-        if not _column_exists(cur, "participants", "store_no"):
-            cur.execute("ALTER TABLE participants ADD COLUMN store_no INTEGER")
+    # ✅ розсилки: задача + стан доставки по кожному отримувачу
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_chat_id INTEGER,
+            text TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.broadcast_recipients (
+            job_id INTEGER NOT NULL,
+            tg_user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            PRIMARY KEY (job_id, tg_user_id)
+        ) WITHOUT ROWID
+    """)
 
-        # rules
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS rules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    # ✅ стани FSM (див. fsm_storage.SQLiteStorage): переживають рестарт, старі — видаляються по TTL
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS main.idx_fsm_states_updated_at ON fsm_states(updated_at)")
 
-        # winners
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS winners (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                participant_id INTEGER UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(participant_id) REFERENCES participants(id)
-            )
-        """)
+    # ✅ кеш відповідей OpenAI по хешу вмісту (чек + правила + модель) — повтор не оплачується
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.validation_cache (
+            key TEXT PRIMARY KEY,
+            valid INTEGER NOT NULL,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
 
-        # ✅ довідник магазинів (по номеру)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS stores (
-                store_no INTEGER PRIMARY KEY,
-                name TEXT
+    # ✅ як кожен адмін отримує алерти про реєстрації (див. notifier.py, /notify)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS main.admin_prefs (
+            admin_id INTEGER PRIMARY KEY,
+            notify_mode TEXT NOT NULL
+        )
+    """)
+
+
+# Таблиці, які при міграції зі старої bot.db переїжджають у каталог
+CATALOG_TABLES = ("stores", "broadcast_jobs", "broadcast_recipients")
+
+
+def _init_campaign(cur: sqlite3.Cursor):
+    """Таблиці активної кампанії (схема campaign) + м'які міграції."""
+    # participants
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.participants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tg_user_id INTEGER,
+            username TEXT,
+            full_name TEXT,
+            phone TEXT,
+            photo_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # ✅ міграція: додаємо store_no, якщо його ще нема
+    if not _column_exists(cur, "participants", "store_no", "campaign"):
+        cur.execute("ALTER TABLE campaign.participants ADD COLUMN store_no INTEGER")
+
+    # ✅ міграція: індекси під розсилку (по юзеру), /stores і вибірки по даті
+    cur.execute("CREATE INDEX IF NOT EXISTS campaign.idx_participants_tg_user_id ON participants(tg_user_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS campaign.idx_participants_store_no ON participants(store_no)")
+    cur.execute("CREATE INDEX IF NOT EXISTS campaign.idx_participants_created_at ON participants(created_at)")
+
+    # rules
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # winners
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.winners (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            participant_id INTEGER UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(participant_id) REFERENCES participants(id)
+        )
+    """)
+
+    # ✅ лічильники реєстрацій по магазинах (підтримуються тригерами на participants)
+    cur.execute("SELECT 1 FROM campaign.sqlite_master WHERE type = 'table' AND name = 'store_counters'")
+    counters_existed = cur.fetchone() is not None
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.store_counters (
+            store_no INTEGER PRIMARY KEY,
+            cnt INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign.trg_participants_store_ins
+        AFTER INSERT ON participants WHEN NEW.store_no IS NOT NULL
+        BEGIN
+            INSERT INTO store_counters (store_no, cnt) VALUES (NEW.store_no, 1)
+            ON CONFLICT(store_no) DO UPDATE SET cnt = cnt + 1;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign.trg_participants_store_del
+        AFTER DELETE ON participants WHEN OLD.store_no IS NOT NULL
+        BEGIN
+            UPDATE store_counters SET cnt = cnt - 1 WHERE store_no = OLD.store_no;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign.trg_participants_store_upd
+        AFTER UPDATE OF store_no ON participants
+        WHEN OLD.store_no IS NOT NEW.store_no
+        BEGIN
+            UPDATE store_counters SET cnt = cnt - 1 WHERE store_no = OLD.store_no;
+            INSERT INTO store_counters (store_no, cnt)
+            SELECT NEW.store_no, 1 WHERE NEW.store_no IS NOT NULL
+            ON CONFLICT(store_no) DO UPDATE SET cnt = cnt + 1;
+        END
+    """)
+    if not counters_existed:
+        _rebuild_store_counters(cur)
+
+    # ✅ чекпоінти експорту (останній вивантажений participant id на адміна)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.export_checkpoints (
+            admin_id INTEGER PRIMARY KEY,
+            last_participant_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # ✅ outbox для Google Sheets (пишеться в одній транзакції з participants)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.gs_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            participant_id INTEGER NOT NULL,
+            seq INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    if not _column_exists(cur, "gs_outbox", "seq", "campaign"):
+        cur.execute("ALTER TABLE campaign.gs_outbox ADD COLUMN seq INTEGER")
+
+    # ✅ локальні лічильники (№ рядка в Google Sheet тощо)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO campaign.counters (name, value) VALUES ('gs_seq', 0)")
+
+    # ✅ відбитки чеків: точний дубль — по file_unique_id (UNIQUE), схожий — по dHash (див. receipts.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS campaign.receipts (
+            participant_id INTEGER PRIMARY KEY,
+            file_unique_id TEXT UNIQUE,
+            dhash INTEGER,
+            duplicate_of INTEGER,
+            hashed_at TIMESTAMP
+        )
+    """)
+    # ✅ міграція: результат автоматичної перевірки чека (див. openai_check.py)
+    if not _column_exists(cur, "receipts", "verdict", "campaign"):
+        cur.execute("ALTER TABLE campaign.receipts ADD COLUMN verdict TEXT")
+        cur.execute("ALTER TABLE campaign.receipts ADD COLUMN verdict_reason TEXT")
+    # ✅ міграція: вхід перевірки (підпис чека + чат для відповіді) — щоб після рестарту перевірити те саме
+    if not _column_exists(cur, "receipts", "receipt_text", "campaign"):
+        cur.execute("ALTER TABLE campaign.receipts ADD COLUMN receipt_text TEXT")
+        cur.execute("ALTER TABLE campaign.receipts ADD COLUMN chat_id INTEGER")
+
+
+def _insert_campaign(cur: sqlite3.Cursor, title: str | None = None) -> dict:
+    """Новий рядок campaigns зі статусом active; файл створиться при першому ATTACH."""
+    cur.execute("INSERT INTO main.campaigns (title, db_file) VALUES (?, '')", (title,))
+    campaign_id = cur.lastrowid
+    title = title or f"Кампанія {campaign_id}"
+    db_file = os.path.join(CAMPAIGNS_SUBDIR, f"campaign_{campaign_id}.db")
+    cur.execute("UPDATE main.campaigns SET title = ?, db_file = ? WHERE id = ?", (title, db_file, campaign_id))
+    return {"id": campaign_id, "title": title, "path": _data_path(db_file)}
+
+
+def _to_journal_delete(path: str):
+    """Зливає WAL у файл і вимикає WAL — файл стає самодостатнім (архів/міграція)."""
+    conn = sqlite3.connect(path, timeout=ARCHIVE_BUSY_TIMEOUT_SEC)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        mode = conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+        if mode.lower() != "delete":
+            # WAL не вимикається, поки файл хтось читає (SQLite лише лишає старий режим)
+            raise sqlite3.OperationalError(f"journal_mode лишився {mode}")
+    finally:
+        conn.close()
+
+
+def _archive_file(path: str, attempts: int | None = None) -> bool:
+    """
+    Best-effort _to_journal_delete для архіву закритої кампанії: файл ще може читати
+    backup_to(), довгий /export чи інший процес. Не вдалося — лишається у WAL (дані цілі).
+    """
+    attempts = attempts or ARCHIVE_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            _to_journal_delete(path)
+            return True
+        except sqlite3.Error as e:
+            log.warning("Архів %s: WAL не вимкнено (спроба %d/%d): %s", path, attempt, attempts, e)
+            if attempt < attempts:
+                time.sleep(attempt)
+    return False
+
+
+def _migrate_legacy():
+    """
+    Стара схема: усе в одній data/bot.db. Файл цілком стає кампанією (campaigns/campaign_N.db),
+    на його місці створюється каталог, куди переносяться CATALOG_TABLES.
+    Архіви попереднього /clear (data/archive/bot_*.db) реєструються як завершені кампанії.
+    """
+    if not os.path.exists(DB_PATH):
+        return
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "campaigns" in tables or "participants" not in tables:
+            return
+        started_at = conn.execute("SELECT MIN(created_at) FROM participants").fetchone()[0]
+    finally:
+        conn.close()
+    _to_journal_delete(DB_PATH)
+
+    archives = sorted(glob.glob(os.path.join(os.path.dirname(DB_PATH) or ".", "archive", "bot_*.db")))
+    campaign_id = len(archives) + 1
+    db_file = os.path.join(CAMPAIGNS_SUBDIR, f"campaign_{campaign_id}.db")
+    os.makedirs(os.path.dirname(_data_path(db_file)), exist_ok=True)
+    os.replace(DB_PATH, _data_path(db_file))
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cur = conn.cursor()
+        cur.execute("ATTACH DATABASE ? AS legacy", (_data_path(db_file),))
+        with conn:
+            _init_catalog(cur)
+            for path in archives:
+                ended_at = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+                cur.execute(
+                    "INSERT INTO campaigns (title, db_file, status, started_at, ended_at) VALUES (?, ?, 'archived', NULL, ?)",
+                    (os.path.basename(path), os.path.relpath(path, os.path.dirname(DB_PATH) or "."), _utc_str(ended_at)),
+                )
+            cur.execute(
+                "INSERT INTO campaigns (id, title, db_file, started_at) VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                (campaign_id, f"Кампанія {campaign_id}", db_file, started_at),
             )
-        """)
+            for tbl in CATALOG_TABLES:
+                cur.execute("SELECT 1 FROM legacy.sqlite_master WHERE type = 'table' AND name = ?", (tbl,))
+                if cur.fetchone():
+                    cur.execute(f"INSERT INTO main.{tbl} SELECT * FROM legacy.{tbl}")
+                    cur.execute(f"DROP TABLE legacy.{tbl}")
+        cur.execute("DETACH DATABASE legacy")
+    finally:
+        conn.close()
+
 
-        conn.commit()
+def _open_catalog() -> dict:
+    """Створює/мігрує каталог і повертає активну кампанію (створює першу, якщо нема)."""
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    _migrate_legacy()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cur = conn.cursor()
+        with conn:
+            _init_catalog(cur)
+            cur.execute("SELECT id, title, db_file FROM campaigns WHERE status = 'active' ORDER BY id DESC LIMIT 1")
+            row = cur.fetchone()
+            if row is None:
+                return _insert_campaign(cur)
+            return {"id": row[0], "title": row[1], "path": _data_path(row[2])}
+    finally:
+        conn.close()
+
+
+def init_db():
+    """Створює каталог і таблиці активної кампанії, якщо вони відсутні + м'які міграції"""
+    with _write() as conn:
+        cur = conn.cursor()
+        _init_catalog(cur)
+        _init_campaign(cur)
 
 
 # ==========================================
@@ -79,30 +669,52 @@ def save_participant(username: str, full_name: str, phone: str, photo_id: str =
     Тепер теж пише store_no, але tg_user_id тут нема.
     Рекомендація: використовуй add_participant(...) щоб broadcast працював.
     """
-    with _connect() as conn:
+    with _write() as conn:
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO participants (username, full_name, phone, photo_id, store_no)
             VALUES (?, ?, ?, ?, ?)
         """, (username, full_name, phone, photo_id, store_no))
-        conn.commit()
+        _changed("add", cur.lastrowid, None, store_no)
         return cur.lastrowid
 
 
-def add_participant(tg_user_id: int, username: str, full_name: str, phone: str, photo_id: str = None, store_no: int = None):
-    """Основний метод реєстрації: зберігає tg_user_id + store_no"""
-    with _connect() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO participants (tg_user_id, username, full_name, phone, photo_id, store_no)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (tg_user_id, username, full_name, phone, photo_id, store_no))
-        conn.commit()
-        return cur.lastrowid
+def add_participant(tg_user_id: int, username: str, full_name: str, phone: str, photo_id: str = None, store_no: int = None,
+                    sync_sheet: bool = False, file_unique_id: str = None, receipt_text: str = None,
+                    chat_id: int = None):
+    """
+    Основний метод реєстрації: зберігає tg_user_id + store_no.
+    sync_sheet=True — в тій же транзакції кладе рядок у gs_outbox (див. gs_sync.py).
+    file_unique_id — відбиток фото чека; якщо такий чек уже є, нічого не пише і повертає None.
+    receipt_text/chat_id — підпис чека і чат учасника для перевірки (openai_check.py).
+    """
+    try:
+        with _write() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO participants (tg_user_id, username, full_name, phone, photo_id, store_no)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (tg_user_id, username, full_name, phone, photo_id, store_no))
+            row_id = cur.lastrowid
+            _changed("add", row_id, tg_user_id, store_no)
+            if file_unique_id:
+                cur.execute(
+                    "INSERT INTO receipts (participant_id, file_unique_id, receipt_text, chat_id) VALUES (?, ?, ?, ?)",
+                    (row_id, file_unique_id, receipt_text, chat_id),
+                )
+            if sync_sheet:
+                # № для Google Sheet видаємо тут же, атомарно з реєстрацією (без читання аркуша)
+                cur.execute("UPDATE counters SET value = value + 1 WHERE name = 'gs_seq'")
+                cur.execute("SELECT value FROM counters WHERE name = 'gs_seq'")
+                seq = cur.fetchone()[0]
+                cur.execute("INSERT INTO gs_outbox (participant_id, seq) VALUES (?, ?)", (row_id, seq))
+            return row_id
+    except sqlite3.IntegrityError:
+        return None  # receipts.file_unique_id UNIQUE: цей чек уже зареєстрований
 
 
 def get_participants():
-    with _connect() as conn:
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT id, tg_user_id, username, full_name, phone, photo_id, store_no, created_at
@@ -112,32 +724,168 @@ def get_participants():
         return cur.fetchall()
 
 
+def iter_participants(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    store_no: int | None = None,
+    winners_only: bool = False,
+    after_id: int | None = None,
+    batch_size: int = 1000,
+):
+    """
+    Стрімить учасників курсором (fetchmany), без вивантаження всієї таблиці:
+    (id, tg_user_id, username, full_name, phone, store_no, created_at).
+    date_from/date_to — [from, to) по created_at (індекс), store_no — по індексу магазину,
+    after_id — лише id > after_id (дельта-експорт, по первинному ключу).
+    """
+    where, params = [], []
+    if after_id is not None:
+        where.append("p.id > ?")
+        params.append(after_id)
+    if date_from is not None:
+        where.append("p.created_at >= ?")
+        params.append(_utc_str(date_from))
+    if date_to is not None:
+        where.append("p.created_at < ?")
+        params.append(_utc_str(date_to))
+    if store_no is not None:
+        where.append("p.store_no = ?")
+        params.append(store_no)
+    if winners_only:
+        where.append("EXISTS (SELECT 1 FROM winners w WHERE w.participant_id = p.id)")
+
+    sql = "SELECT p.id, p.tg_user_id, p.username, p.full_name, p.phone, p.store_no, p.created_at FROM participants p"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY p.id ASC"
+
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+
+
+def get_export_checkpoint(admin_id: int) -> int:
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT last_participant_id FROM export_checkpoints WHERE admin_id = ?", (admin_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def set_export_checkpoint(admin_id: int, last_participant_id: int):
+    with _write() as conn:
+        conn.execute("""
+            INSERT INTO export_checkpoints (admin_id, last_participant_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(admin_id) DO UPDATE SET
+                last_participant_id = MAX(last_participant_id, excluded.last_participant_id),
+                updated_at = excluded.updated_at
+        """, (admin_id, last_participant_id))
+
+
 # ==========================================
 #   Підрахунок кількості учасників
 # ==========================================
 
 def count_participants():
-    with _connect() as conn:
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("SELECT COUNT(*) FROM participants")
         return cur.fetchone()[0]
 
 
+# created_at пишеться як CURRENT_TIMESTAMP — це UTC у форматі "YYYY-MM-DD HH:MM:SS".
+# Тому всі вікна часу рахуємо як діапазон рядків [start, end) — він іде по індексу created_at.
+
+def _utc_str(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _local_midnight(now: datetime | None = None) -> datetime:
+    now = now or datetime.now().astimezone()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Діапазон по created_at — має йти по idx_participants_created_at (див. tests/test_db.py)
+COUNT_BETWEEN_SQL = """
+    SELECT COUNT(*) FROM participants
+    WHERE created_at >= ? AND created_at < ?
+"""
+
+
+def count_participants_between(start: datetime, end: datetime) -> int:
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute(COUNT_BETWEEN_SQL, (_utc_str(start), _utc_str(end)))
+        return cur.fetchone()[0]
+
+
 def count_participants_today():
-    today = date.today().isoformat()
-    with _connect() as conn:
+    """Реєстрації з локальної півночі."""
+    now = datetime.now().astimezone()
+    return count_participants_between(_local_midnight(now), now + timedelta(seconds=1))
+
+
+def count_participants_last_hour():
+    now = datetime.now().astimezone()
+    return count_participants_between(now - timedelta(hours=1), now + timedelta(seconds=1))
+
+
+def _hourly_counts(start: datetime, end: datetime) -> dict[datetime, int]:
+    """{локальний початок години: кількість} — групуємо по UTC-годинах у межах діапазону."""
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("""
-            SELECT COUNT(*) FROM participants
-            WHERE DATE(created_at) = DATE(?)
-        """, (today,))
-        return cur.fetchone()[0]
+            SELECT substr(created_at, 1, 13) AS h, COUNT(*)
+            FROM participants
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY h
+        """, (_utc_str(start), _utc_str(end)))
+        out = {}
+        for h, cnt in cur.fetchall():
+            hour = datetime.strptime(h, "%Y-%m-%d %H").replace(tzinfo=timezone.utc).astimezone()
+            out[hour] = cnt
+        return out
+
+
+def participants_per_hour(hours: int = 24) -> list[tuple[datetime, int]]:
+    """Гістограма за останні N годин: [(локальна година, кількість), ...] від старішої до новішої."""
+    now = datetime.now().astimezone()
+    last = now.replace(minute=0, second=0, microsecond=0)
+    first = last - timedelta(hours=hours - 1)
+    counts = _hourly_counts(first, last + timedelta(hours=1))
+    return [(first + timedelta(hours=i), counts.get(first + timedelta(hours=i), 0)) for i in range(hours)]
+
+
+def participants_per_day(days: int = 7) -> list[tuple[str, int]]:
+    """Гістограма за останні N локальних днів: [("YYYY-MM-DD", кількість), ...]."""
+    now = datetime.now().astimezone()
+    first = _local_midnight(now) - timedelta(days=days - 1)
+    per_day = {(first + timedelta(days=i)).date().isoformat(): 0 for i in range(days)}
+    for hour, cnt in _hourly_counts(first, now + timedelta(seconds=1)).items():
+        key = hour.date().isoformat()
+        if key in per_day:
+            per_day[key] += cnt
+    return list(per_day.items())
 
 
 def get_all_user_ids():
-    with _connect() as conn:
+    """Унікальні юзери: (tg_user_id, перший participant id). Один рядок на юзера, а не на чек."""
+    with _read() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT tg_user_id, id FROM participants WHERE tg_user_id IS NOT NULL")
+        cur.execute("""
+            SELECT tg_user_id, MIN(id) FROM participants
+            WHERE tg_user_id IS NOT NULL
+            GROUP BY tg_user_id
+        """)
         return cur.fetchall()
 
 
@@ -146,22 +894,29 @@ def get_all_user_ids():
 # ==========================================
 
 def upsert_store(store_no: int, name: str):
-    with _connect() as conn:
+    with _write() as conn:
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO stores (store_no, name)
             VALUES (?, ?)
             ON CONFLICT(store_no) DO UPDATE SET name=excluded.name
         """, (store_no, name))
-        conn.commit()
+    _stores.invalidate()
 
 
-def get_stores():
-    """Повертає довідник магазинів: (store_no, name)"""
-    with _connect() as conn:
+def _load_stores():
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("SELECT store_no, COALESCE(name,'') FROM stores ORDER BY store_no ASC")
-        return cur.fetchall()
+        return tuple(cur.fetchall())
+
+
+_stores = _Cached(_load_stores)
+
+
+def get_stores():
+    """Повертає довідник магазинів: (store_no, name) — з кешу процесу"""
+    return list(_stores.get())
 
 
 def get_store_stats():
@@ -170,53 +925,457 @@ def get_store_stats():
     Включає:
     - магазини з довідника stores
     - магазини, які вже зустрілись у participants (навіть якщо нема назви)
+    Кількість береться з store_counters (без підрахунку по participants).
     """
-    with _connect() as conn:
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("""
             WITH nums AS (
-              SELECT store_no FROM participants WHERE store_no IS NOT NULL
+              SELECT store_no FROM store_counters WHERE cnt > 0
               UNION
               SELECT store_no FROM stores
             )
             SELECT
               n.store_no,
               COALESCE(s.name, '') AS name,
-              (SELECT COUNT(*) FROM participants p WHERE p.store_no = n.store_no) AS cnt
+              COALESCE(c.cnt, 0) AS cnt
             FROM nums n
             LEFT JOIN stores s ON s.store_no = n.store_no
+            LEFT JOIN store_counters c ON c.store_no = n.store_no
             WHERE n.store_no IS NOT NULL
             ORDER BY n.store_no ASC
         """)
         return cur.fetchall()
 
 
+def _rebuild_store_counters(cur: sqlite3.Cursor):
+    cur.execute("DELETE FROM store_counters")
+    cur.execute("""
+        INSERT INTO store_counters (store_no, cnt)
+        SELECT store_no, COUNT(*) FROM participants
+        WHERE store_no IS NOT NULL
+        GROUP BY store_no
+    """)
+
+
+def check_store_counters(rebuild: bool = False):
+    """
+    Звіряє store_counters з реальними COUNT(*) по participants.
+    Повертає розбіжності [(store_no, counter, actual), ...]; rebuild=True — перераховує з нуля.
+    """
+    with _write() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            WITH actual AS (
+              SELECT store_no, COUNT(*) AS cnt FROM participants
+              WHERE store_no IS NOT NULL
+              GROUP BY store_no
+            )
+            SELECT a.store_no, COALESCE(c.cnt, 0), a.cnt
+            FROM actual a LEFT JOIN store_counters c ON c.store_no = a.store_no
+            WHERE COALESCE(c.cnt, 0) != a.cnt
+            UNION ALL
+            SELECT c.store_no, c.cnt, 0
+            FROM store_counters c
+            WHERE c.cnt != 0 AND c.store_no NOT IN (SELECT store_no FROM actual)
+            ORDER BY 1
+        """)
+        mismatches = cur.fetchall()
+        if rebuild and mismatches:
+            _rebuild_store_counters(cur)
+        return mismatches
+
+
+# ==========================================
+#   Outbox для Google Sheets
+# ==========================================
+
+def fetch_gs_outbox(limit: int = 50):
+    """
+    Повертає пачку готових до відправки рядків:
+    (outbox_id, seq, username, full_name, phone, store_no, created_at)
+    Лише з голови черги: якщо рядок із меншим № ще в backoff, пізніші чекають на нього,
+    інакше вони потрапили б в аркуш раніше і зламали порядок №.
+    """
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT o.id, o.seq, p.username, p.full_name, p.phone, p.store_no, p.created_at,
+                   o.next_attempt_at <= CURRENT_TIMESTAMP
+            FROM gs_outbox o
+            JOIN participants p ON p.id = o.participant_id
+            ORDER BY o.seq ASC, o.id ASC
+            LIMIT ?
+        """, (limit,))
+        batch = []
+        for *row, ready in cur.fetchall():
+            if not ready:
+                break
+            batch.append(tuple(row))
+        return batch
+
+
+def ack_gs_outbox(outbox_ids: list[int]):
+    with _write() as conn:
+        conn.executemany("DELETE FROM gs_outbox WHERE id = ?", [(i,) for i in outbox_ids])
+
+
+def retry_gs_outbox(outbox_ids: list[int], error: str, delay_sec: int):
+    with _write() as conn:
+        conn.executemany("""
+            UPDATE gs_outbox
+            SET attempts = attempts + 1,
+                last_error = ?,
+                next_attempt_at = DATETIME('now', ?)
+            WHERE id = ?
+        """, [(error[:500], f"+{int(delay_sec)} seconds", i) for i in outbox_ids])
+
+
+def reconcile_gs_seq(sheet_max: int) -> int:
+    """
+    Звіряє локальний лічильник № з аркушем (викликається один раз на старті).
+    Якщо в аркуші вже є номери, що перетинаються з чергою, — перенумеровує чергу.
+    Повертає актуальне значення лічильника.
+    """
+    with _write() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT value FROM counters WHERE name = 'gs_seq'")
+        value = cur.fetchone()[0]
+
+        cur.execute("SELECT id, seq FROM gs_outbox ORDER BY seq ASC, id ASC")
+        pending = cur.fetchall()
+        if pending and (pending[0][1] is None or pending[0][1] <= sheet_max):
+            cur.executemany(
+                "UPDATE gs_outbox SET seq = ? WHERE id = ?",
+                [(sheet_max + i, oid) for i, (oid, _) in enumerate(pending, start=1)],
+            )
+            value = sheet_max + len(pending)
+
+        value = max(value, sheet_max)
+        cur.execute("UPDATE counters SET value = ? WHERE name = 'gs_seq'", (value,))
+        return value
+
+
+def count_gs_outbox():
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM gs_outbox")
+        return cur.fetchone()[0]
+
+
+# ==========================================
+#   Розсилки (broadcast jobs)
+# ==========================================
+
+_BROADCAST_JOB_COLS = "id, admin_chat_id, text, status, total, sent, failed, created_at, finished_at"
+
+
+def _broadcast_job_row(row):
+    if not row:
+        return None
+    keys = [c.strip() for c in _BROADCAST_JOB_COLS.split(",")]
+    return dict(zip(keys, row))
+
+
+def create_broadcast_job(admin_chat_id: int, text: str) -> dict:
+    """Створює задачу і список отримувачів одним INSERT ... SELECT (без вивантаження в Python)."""
+    with _write() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO broadcast_jobs (admin_chat_id, text) VALUES (?, ?)", (admin_chat_id, text))
+        job_id = cur.lastrowid
+        cur.execute("""
+            INSERT OR IGNORE INTO broadcast_recipients (job_id, tg_user_id)
+            SELECT DISTINCT ?, tg_user_id FROM participants WHERE tg_user_id IS NOT NULL
+        """, (job_id,))
+        cur.execute("UPDATE broadcast_jobs SET total = ? WHERE id = ?", (cur.rowcount, job_id))
+        cur.execute(f"SELECT {_BROADCAST_JOB_COLS} FROM broadcast_jobs WHERE id = ?", (job_id,))
+        return _broadcast_job_row(cur.fetchone())
+
+
+def fetch_broadcast_batch(job_id: int, after_tg_user_id: int, limit: int = 500) -> list[int]:
+    """Наступна сторінка отримувачів зі статусом pending (keyset-пагінація по tg_user_id)."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT tg_user_id FROM broadcast_recipients
+            WHERE job_id = ? AND status = 'pending' AND tg_user_id > ?
+            ORDER BY tg_user_id ASC
+            LIMIT ?
+        """, (job_id, after_tg_user_id, limit))
+        return [r[0] for r in cur.fetchall()]
+
+
+def save_broadcast_results(job_id: int, results: list[tuple[int, str | None]]):
+    """results = [(tg_user_id, error_class | None), ...] — пишемо пачкою + оновлюємо лічильники задачі."""
+    if not results:
+        return
+    sent = sum(1 for _, err in results if err is None)
+    with _write() as conn:
+        conn.executemany("""
+            UPDATE broadcast_recipients SET status = ?, error = ?
+            WHERE job_id = ? AND tg_user_id = ?
+        """, [("sent" if err is None else "failed", err, job_id, uid) for uid, err in results])
+        conn.execute(
+            "UPDATE broadcast_jobs SET sent = sent + ?, failed = failed + ? WHERE id = ?",
+            (sent, len(results) - sent, job_id),
+        )
+
+
+def finish_broadcast_job(job_id: int, status: str = "done"):
+    with _write() as conn:
+        conn.execute("""
+            UPDATE broadcast_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        """, (status, job_id))
+
+
+def get_broadcast_job(job_id: int | None = None):
+    """Задача за id або остання створена."""
+    with _read() as conn:
+        cur = conn.cursor()
+        if job_id is None:
+            cur.execute(f"SELECT {_BROADCAST_JOB_COLS} FROM broadcast_jobs ORDER BY id DESC LIMIT 1")
+        else:
+            cur.execute(f"SELECT {_BROADCAST_JOB_COLS} FROM broadcast_jobs WHERE id = ?", (job_id,))
+        return _broadcast_job_row(cur.fetchone())
+
+
+def get_running_broadcast_jobs():
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {_BROADCAST_JOB_COLS} FROM broadcast_jobs WHERE status = 'running' ORDER BY id ASC")
+        return [_broadcast_job_row(r) for r in cur.fetchall()]
+
+
+def broadcast_error_summary(job_id: int):
+    """Повертає [(error_class, count), ...] для задачі."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT error, COUNT(*) FROM broadcast_recipients
+            WHERE job_id = ? AND status = 'failed'
+            GROUP BY error
+            ORDER BY COUNT(*) DESC
+        """, (job_id,))
+        return cur.fetchall()
+
+
+# ==========================================
+#   Відбитки чеків (дублі)
+# ==========================================
+
+def find_receipt(file_unique_id: str) -> int | None:
+    """participant_id, якщо чек з таким file_unique_id уже зареєстрований."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT participant_id FROM receipts WHERE file_unique_id = ?", (file_unique_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def get_receipt_hashes() -> list[tuple[int, int, int | None]]:
+    """[(participant_id, dhash, tg_user_id)] для in-memory індексу схожих чеків."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.participant_id, r.dhash, p.tg_user_id
+            FROM receipts r JOIN participants p ON p.id = r.participant_id
+            WHERE r.dhash IS NOT NULL
+        """)
+        return cur.fetchall()
+
+
+def fetch_unhashed_receipts(limit: int = 1000) -> list[tuple[int, str, int | None]]:
+    """Чеки без dHash (напр. рестарт до обробки): [(participant_id, photo_id, tg_user_id)]."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.participant_id, p.photo_id, p.tg_user_id
+            FROM receipts r JOIN participants p ON p.id = r.participant_id
+            WHERE r.dhash IS NULL AND p.photo_id IS NOT NULL
+            ORDER BY r.participant_id
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+
+def save_receipt_hash(participant_id: int, dhash: int, duplicate_of: int | None = None):
+    """dhash — signed int64; duplicate_of виключає учасника з розіграшу, поки адмін не зніме позначку."""
+    with _write() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE receipts SET dhash = ?, duplicate_of = ?, hashed_at = CURRENT_TIMESTAMP WHERE participant_id = ?",
+            (dhash, duplicate_of, participant_id),
+        )
+        if duplicate_of is not None and cur.rowcount:
+            _changed_row(cur, "remove", participant_id)
+
+
+def clear_receipt_flag(participant_id: int) -> bool:
+    with _write(touch=True) as conn:
+        cur = conn.execute(
+            "UPDATE receipts SET duplicate_of = NULL WHERE participant_id = ? AND duplicate_of IS NOT NULL",
+            (participant_id,),
+        )
+        return cur.rowcount > 0
+
+
+def get_flagged_receipts(limit: int = 20) -> list[tuple[int, int, str, str]]:
+    """Останні позначені дублі: [(participant_id, duplicate_of, full_name, created_at)]."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.participant_id, r.duplicate_of, p.full_name, p.created_at
+            FROM receipts r JOIN participants p ON p.id = r.participant_id
+            WHERE r.duplicate_of IS NOT NULL
+            ORDER BY r.participant_id DESC
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+
+# ==========================================
+#   Перевірка чеків (OpenAI) + кеш
+# ==========================================
+
+def get_cached_validation(key: str) -> tuple[bool, str] | None:
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT valid, reason FROM validation_cache WHERE key = ?", (key,))
+        row = cur.fetchone()
+        return (bool(row[0]), row[1] or "") if row else None
+
+
+def save_validation(participant_id: int, valid: bool | None, reason: str, key: str | None = None):
+    """
+    Вердикт чека учасника; key — зберегти ще й у кеш (лише для справжньої відповіді моделі).
+    valid=None — перевірка не вдалася (помилка API), у кеш не йде.
+    """
+    verdict = "error" if valid is None else ("ok" if valid else "reject")
+    with _write() as conn:
+        conn.execute(
+            "UPDATE receipts SET verdict = ?, verdict_reason = ? WHERE participant_id = ?",
+            (verdict, reason, participant_id),
+        )
+        if key is not None and valid is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO validation_cache (key, valid, reason) VALUES (?, ?, ?)",
+                (key, int(valid), reason),
+            )
+
+
+def fetch_unvalidated_receipts(limit: int = 1000) -> list[tuple[int, int | None, str, str, str]]:
+    """Чеки без вердикту (рестарт до перевірки): [(participant_id, chat_id, photo_id, receipt_text, file_unique_id)]."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.participant_id, COALESCE(r.chat_id, p.tg_user_id), p.photo_id, COALESCE(r.receipt_text, ''),
+                   r.file_unique_id
+            FROM receipts r JOIN participants p ON p.id = r.participant_id
+            WHERE r.verdict IS NULL AND p.photo_id IS NOT NULL
+            ORDER BY r.participant_id
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+
+def validation_summary() -> dict[str, int]:
+    """{"ok": .., "reject": .., "error": .., "pending": ..} по чеках активної кампанії."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(verdict, 'pending'), COUNT(*) FROM receipts GROUP BY 1")
+        return dict(cur.fetchall())
+
+
+# ==========================================
+#   Налаштування адмінів (алерти)
+# ==========================================
+
+def get_notify_modes() -> dict[int, str]:
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT admin_id, notify_mode FROM admin_prefs")
+        return dict(cur.fetchall())
+
+
+def set_notify_mode(admin_id: int, mode: str):
+    with _write() as conn:
+        conn.execute("""
+            INSERT INTO admin_prefs (admin_id, notify_mode)
+            VALUES (?, ?)
+            ON CONFLICT(admin_id) DO UPDATE SET notify_mode=excluded.notify_mode
+        """, (admin_id, mode))
+
+
+# ==========================================
+#   FSM storage (стани реєстрації)
+# ==========================================
+
+def fsm_load(since: float) -> list[tuple[str, str | None, str | None, float]]:
+    """Усі записи FSM, оновлені після since (unix time): (key, state, data_json, updated_at)."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT key, state, data, updated_at FROM fsm_states WHERE updated_at >= ?", (since,))
+        return cur.fetchall()
+
+
+def fsm_save(rows: list[tuple[str, str | None, str | None, float]], deleted: list[str]):
+    """Пачка змін FSM однією транзакцією: upsert rows + видалення порожніх ключів."""
+    with _write() as conn:
+        conn.executemany("""
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+        """, rows)
+        conn.executemany("DELETE FROM fsm_states WHERE key = ?", [(k,) for k in deleted])
+
+
+def fsm_expire(before: float) -> int:
+    """Видаляє покинуті стани (не оновлювались з before). Повертає кількість."""
+    with _write() as conn:
+        cur = conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,))
+        return cur.rowcount
+
+
 # ==========================================
 #   Правила розіграшу
 # ==========================================
 
 def set_rules(text: str):
-    with _connect() as conn:
+    with _write() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM rules")
         cur.execute("INSERT INTO rules (text) VALUES (?)", (text,))
-        conn.commit()
+    _rules.set(text)
 
 
-def get_rules():
-    with _connect() as conn:
+def _load_rules():
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("SELECT text FROM rules ORDER BY id DESC LIMIT 1")
         row = cur.fetchone()
         return row[0] if row else None
 
 
+_rules = _Cached(_load_rules)
+
+
+def get_rules():
+    """Поточні правила — з кешу процесу (БД читається лише після зміни)."""
+    return _rules.get()
+
+
+def cached_rules() -> tuple[int, str | None] | None:
+    """(version, text) з кешу або None, якщо правила ще не читались — без звернення до БД."""
+    return _rules.peek()
+
+
 # ==========================================
 #   Очистка таблиць
 # ==========================================
 
 def table_counts():
-    with _connect() as conn:
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("SELECT COUNT(*) FROM participants")
         p = cur.fetchone()[0]
@@ -227,77 +1386,219 @@ def table_counts():
         return p, r, w
 
 
-def clear_tables():
-    stats = {
-        "before_participants": 0,
-        "before_rules": 0,
-        "before_winners": 0,
-        "deleted_participants": 0,
-        "deleted_rules": 0,
-        "deleted_winners": 0,
-    }
-    with _connect() as conn:
-        cur = conn.cursor()
-        for tbl, key in [("participants", "participants"), ("rules", "rules"), ("winners", "winners")]:
-            cur.execute(f"SELECT COUNT(*) FROM {tbl}")
-            stats[f"before_{key}"] = cur.fetchone()[0]
+# ==========================================
+#   Кампанії (/clear = нова кампанія, /campaigns = звіт)
+# ==========================================
 
-        cur.execute("DELETE FROM participants")
-        stats["deleted_participants"] = cur.rowcount
-        cur.execute("DELETE FROM rules")
-        stats["deleted_rules"] = cur.rowcount
-        cur.execute("DELETE FROM winners")
-        stats["deleted_winners"] = cur.rowcount
+def get_active_campaign() -> dict:
+    return dict(_active_campaign())
 
-        try:
-            cur.execute("DELETE FROM sqlite_sequence WHERE name IN ('participants','rules','winners')")
-        except sqlite3.OperationalError:
-            pass
 
-        conn.commit()
+def start_campaign(title: str | None = None) -> dict:
+    """
+    Закриває поточну кампанію і відкриває нову (новий файл у data/campaigns).
+    Старий файл лишається як є (архів), глобальні таблиці каталогу не чіпаються.
+    Повертає {"archive_path", "archived_id", "campaign_id", "title", "participants", "rules", "winners"}.
+    """
+    global _active
+    with _writer_lock:
+        with _readers_lock:
+            old = _active_campaign()
+            with _write() as conn:
+                cur = conn.cursor()
+                stats = {"archive_path": old["path"], "archived_id": old["id"]}
+                for tbl in ("participants", "rules", "winners"):
+                    cur.execute(f"SELECT COUNT(*) FROM {tbl}")
+                    stats[tbl] = cur.fetchone()[0]
+                cur.execute(
+                    "UPDATE campaigns SET status = 'archived', ended_at = CURRENT_TIMESTAMP WHERE id = ?", (old["id"],)
+                )
+                new = _insert_campaign(cur, title)
 
-    with _connect() as conn:
-        conn.execute("VACUUM")
+            # каталог уже каже, що активна нова — процес перемикається одразу, до будь-чого, що може впасти
+            _active = new
+            _retire_all_locked()
+            init_db()
+
+        _publish(None)
+        _rules.invalidate()
+    # архів — один самодостатній файл (звіти відкривають його лише на читання); поза локами і
+    # без повторів — це потік writer-а; повтори робить compact_file у фоні /clear
+    _archive_file(old["path"], attempts=1)
+    stats.update(campaign_id=new["id"], title=new["title"])
     return stats
 
 
+def _ro_uri(path: str) -> str:
+    return "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+
+
+def campaign_report() -> list[dict]:
+    """
+    Зведення по всіх кампаніях. Архівні файли підключаються по одному через
+    ATTACH ... mode=ro, тож звіт не може їх змінити і не тримає writer.
+    """
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, title, db_file, status, started_at, ended_at FROM campaigns ORDER BY id")
+        campaigns = cur.fetchall()
+        active_id = _active_campaign()["id"]
+
+        report = []
+        for campaign_id, title, db_file, status, started_at, ended_at in campaigns:
+            item = {
+                "id": campaign_id, "title": title, "status": status,
+                "started_at": started_at, "ended_at": ended_at,
+                "participants": None, "users": None, "winners": None,
+            }
+            path = _data_path(db_file)
+            schema = "campaign" if campaign_id == active_id else "archived"
+            if schema == "archived":
+                if not os.path.exists(path):
+                    report.append(item)
+                    continue
+                cur.execute("ATTACH DATABASE ? AS archived", (_ro_uri(path),))
+            try:
+                cur.execute(f"SELECT COUNT(*), COUNT(DISTINCT tg_user_id) FROM {schema}.participants")
+                item["participants"], item["users"] = cur.fetchone()
+                cur.execute(f"SELECT COUNT(*) FROM {schema}.winners")
+                item["winners"] = cur.fetchone()[0]
+            except sqlite3.DatabaseError:
+                pass  # битий/чужий файл — показуємо кампанію без цифр
+            finally:
+                if schema == "archived":
+                    cur.execute("DETACH DATABASE archived")
+            report.append(item)
+        return report
+
+
+def compact_file(path: str) -> tuple[int, int]:
+    """VACUUM окремого (архівного) файлу. Повертає (розмір до, розмір після)."""
+    _archive_file(path)   # якщо start_campaign не вдалося вимкнути WAL (файл тоді ще читали)
+    before = os.path.getsize(path)
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before, os.path.getsize(path)
+
+
 # ==========================================
 #   Переможці
 # ==========================================
 
-def pick_random_winner():
-    with _connect() as conn:
+def _participant_dict(row):
+    if not row:
+        return None
+    return {
+        "participant_id": row[0],
+        "username": row[1],
+        "full_name": row[2],
+        "phone": row[3],
+        "created_at": row[4],
+        "store_no": row[5],
+    }
+
+
+def get_participant(participant_id: int):
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("""
-            SELECT p.id, p.username, p.full_name, p.phone, p.created_at, p.store_no
+            SELECT id, username, full_name, phone, created_at, store_no
+            FROM participants WHERE id = ?
+        """, (participant_id,))
+        return _participant_dict(cur.fetchone())
+
+
+def get_eligible_entries():
+    """Учасники, які ще не виграли (без позначених дублів чека): [(id, tg_user_id, store_no), ...] у порядку id."""
+    with _read() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT p.id, p.tg_user_id, p.store_no
             FROM participants p
-            LEFT JOIN winners w ON w.participant_id = p.id
-            WHERE w.participant_id IS NULL
-            ORDER BY RANDOM()
-            LIMIT 1
+            WHERE NOT EXISTS (SELECT 1 FROM winners w WHERE w.participant_id = p.id)
+              AND NOT EXISTS (SELECT 1 FROM receipts r WHERE r.participant_id = p.id AND r.duplicate_of IS NOT NULL)
+            ORDER BY p.id ASC
         """)
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {
-            "participant_id": row[0],
-            "username": row[1],
-            "full_name": row[2],
-            "phone": row[3],
-            "created_at": row[4],
-            "store_no": row[5],
-        }
+        return cur.fetchall()
+
+
+def pick_random_winner(weight: str = "entry"):
+    """Випадковий кандидат (без збереження). Вибірка — через in-memory пул, див. draw.py."""
+    import draw  # draw імпортує db, тому тут — пізній імпорт
+    return draw.pick_random_winner(weight=weight)
+
+
+def draw_winners(n: int, store_no: int | None = None, unique_user: bool = False, rng=None) -> list[dict]:
+    """
+    Атомарний розіграш N переможців: вибір і запис в одній транзакції на writer-з'єднанні,
+    тож два адміни не витягнуть одну людину. Частковий Fisher–Yates — O(N + eligible).
+    unique_user=True — не більше одного виграшу на Telegram-юзера в цьому розіграші.
+    """
+    rng = rng or random.SystemRandom()
+    with _write() as conn:
+        # pysqlite сам не відкриває транзакцію перед SELECT — без BEGIN IMMEDIATE вибір
+        # захищав лише _writer_lock цього процесу; так write-lock файлу береться до вибору
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        sql = """
+            SELECT p.id, p.tg_user_id, p.store_no FROM participants p
+            WHERE NOT EXISTS (SELECT 1 FROM winners w WHERE w.participant_id = p.id)
+              AND NOT EXISTS (SELECT 1 FROM receipts r WHERE r.participant_id = p.id AND r.duplicate_of IS NOT NULL)
+        """
+        params: tuple = ()
+        if store_no is not None:
+            sql += " AND p.store_no = ?"
+            params = (store_no,)
+        cur.execute(sql, params)
+        pool = cur.fetchall()
+
+        picked: list[int] = []
+        seen_users: set = set()
+        size = len(pool)
+        for i in range(size):
+            if len(picked) >= n:
+                break
+            j = rng.randrange(i, size)
+            pool[i], pool[j] = pool[j], pool[i]
+            pid, tg_user_id, store = pool[i]
+            if unique_user and tg_user_id is not None:
+                if tg_user_id in seen_users:
+                    continue
+                seen_users.add(tg_user_id)
+            picked.append(pid)
+            _changed("remove", pid, tg_user_id, store)
+
+        if not picked:
+            return []
+        cur.executemany("INSERT INTO winners (participant_id) VALUES (?)", [(pid,) for pid in picked])
+
+        rows = {}
+        for k in range(0, len(picked), 500):
+            chunk = picked[k:k + 500]
+            cur.execute(f"""
+                SELECT id, username, full_name, phone, created_at, store_no
+                FROM participants WHERE id IN ({",".join("?" * len(chunk))})
+            """, chunk)
+            rows.update((r[0], _participant_dict(r)) for r in cur.fetchall())
+        return [rows[pid] for pid in picked]
 
 
-def save_winner(participant_id: int):
-    with _connect() as conn:
+def save_winner(participant_id: int) -> bool:
+    """True — якщо записали; False — цей учасник уже був переможцем (напр., інший адмін встиг)."""
+    with _write() as conn:
         cur = conn.cursor()
         cur.execute("INSERT OR IGNORE INTO winners (participant_id) VALUES (?)", (participant_id,))
-        conn.commit()
+        if cur.rowcount != 1:
+            return False
+        _changed_row(cur, "remove", participant_id)
+        return True
 
 
 def get_winners(limit: int = 20):
-    with _connect() as conn:
+    with _read() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT w.created_at, p.id, p.username, p.full_name, p.phone, p.store_no
@@ -0,0 +1,183 @@
+# draw.py
+import random
+import threading
+from array import array
+from bisect import bisect_left
+
+import db
+
+# Режими ваги для розіграшу:
+#   entry — кожен чек має однаковий шанс (як раніше ORDER BY RANDOM())
+#   user  — кожен юзер має однаковий шанс, незалежно від кількості чеків
+#   store — кожен магазин має однаковий шанс, незалежно від кількості реєстрацій
+WEIGHTS = ("entry", "user", "store")
+
+_rng = random.SystemRandom()
+
+
+class _Groups:
+    """
+    Кандидати, згруповані за ключем (юзер або магазин): спершу рівноймовірно обираємо ключ,
+    потім — запис усередині нього. Це рівно ваги 1/кількість_записів_ключа, але додавання
+    і видалення — O(1) / O(розмір групи), без перерахунку кумулятивних ваг.
+    """
+
+    def __init__(self):
+        self.keys: list = []
+        self.pos: dict = {}
+        self.members: dict = {}
+
+    def add(self, key, pid: int) -> None:
+        members = self.members.get(key)
+        if members is None:
+            members = self.members[key] = []
+            self.pos[key] = len(self.keys)
+            self.keys.append(key)
+        members.append(pid)
+
+    def remove(self, key, pid: int) -> None:
+        members = self.members.get(key)
+        if members is None or pid not in members:
+            return
+        members.remove(pid)
+        if not members:
+            # swap-remove ключа: останній стає на його місце
+            i = self.pos.pop(key)
+            last = self.keys.pop()
+            if last != key:
+                self.keys[i] = last
+                self.pos[last] = i
+            del self.members[key]
+
+    def pick(self) -> int:
+        members = self.members[self.keys[_rng.randrange(len(self.keys))]]
+        return members[_rng.randrange(len(members))]
+
+
+def _key(pid: int, key):
+    # записи без tg_user_id/store_no — кожен сам по собі
+    return key if key is not None else ("id", pid)
+
+
+class EligiblePool:
+    """
+    In-memory масив id учасників, які ще не виграли.
+    Після запису в participants/winners пул доганяє журнал змін (db.changes_since()):
+    нова реєстрація додається, переможець чи дубль чека прибирається — на місці.
+    Повністю перечитується лише на старті, для нової кампанії чи після масової зміни.
+    Розіграш — O(1) для всіх режимів ваги.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._ids = array("q")          # відсортовані за id (нові id завжди більші)
+        self._users: list = []
+        self._stores: list = []
+        self._gone: set = set()          # вибулі id, ще не вичищені з масивів
+        self._groups: dict[str, _Groups] = {}
+        self.rebuilds = 0
+
+    def _rebuild(self) -> None:
+        generation = db.data_generation()
+        rows = db.get_eligible_entries()
+        self._ids = array("q", (r[0] for r in rows))
+        self._users = [r[1] for r in rows]
+        self._stores = [r[2] for r in rows]
+        self._gone = set()
+        self._groups = {}
+        self._generation = generation
+        self.rebuilds += 1
+
+    def _refresh(self) -> None:
+        # generation — до читання змін: запис між ними просто застосуємо ще раз (операції ідемпотентні)
+        generation = db.data_generation()
+        changes = db.changes_since(self._generation)
+        if changes is None:
+            self._rebuild()
+            return
+        if not changes:
+            return
+        for op, pid, tg_user_id, store_no in changes:
+            if op == "add":
+                self._add(pid, tg_user_id, store_no)
+            else:
+                self._remove(pid, tg_user_id, store_no)
+        self._generation = generation
+        if len(self._gone) * 2 > len(self._ids):
+            self._compact()
+
+    def _find(self, pid: int) -> int | None:
+        i = bisect_left(self._ids, pid)
+        return i if i < len(self._ids) and self._ids[i] == pid else None
+
+    def _add(self, pid: int, tg_user_id, store_no) -> None:
+        i = self._find(pid)
+        if i is not None:
+            if pid not in self._gone:
+                return
+            self._gone.discard(pid)
+        else:
+            i = bisect_left(self._ids, pid)
+            self._ids.insert(i, pid)
+            self._users.insert(i, tg_user_id)
+            self._stores.insert(i, store_no)
+        for weight, groups in self._groups.items():
+            groups.add(_key(pid, tg_user_id if weight == "user" else store_no), pid)
+
+    def _remove(self, pid: int, tg_user_id, store_no) -> None:
+        if pid in self._gone or self._find(pid) is None:
+            return
+        self._gone.add(pid)
+        for weight, groups in self._groups.items():
+            groups.remove(_key(pid, tg_user_id if weight == "user" else store_no), pid)
+
+    def _compact(self) -> None:
+        keep = [i for i, pid in enumerate(self._ids) if pid not in self._gone]
+        self._ids = array("q", (self._ids[i] for i in keep))
+        self._users = [self._users[i] for i in keep]
+        self._stores = [self._stores[i] for i in keep]
+        self._gone = set()
+
+    def _grouped(self, weight: str) -> _Groups:
+        groups = self._groups.get(weight)
+        if groups is None:
+            keys = self._users if weight == "user" else self._stores
+            groups = _Groups()
+            for pid, k in zip(self._ids, keys):
+                if pid not in self._gone:
+                    groups.add(_key(pid, k), pid)
+            self._groups[weight] = groups
+        return groups
+
+    def size(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids) - len(self._gone)
+
+    def pick(self, weight: str = "entry") -> int | None:
+        """Повертає id випадкового учасника (без збереження) або None."""
+        if weight not in WEIGHTS:
+            raise ValueError(f"Невідомий режим ваги: {weight}")
+        with self._lock:
+            self._refresh()
+            if len(self._ids) == len(self._gone):
+                return None
+            if weight == "entry":
+                # вибулих не більше половини (інакше _compact), тож у середньому ≤ 2 спроби
+                while True:
+                    pid = self._ids[_rng.randrange(len(self._ids))]
+                    if pid not in self._gone:
+                        return pid
+            return self._grouped(weight).pick()
+
+
+pool = EligiblePool()
+
+
+def pick_random_winner(weight: str = "entry"):
+    """Як раніше db.pick_random_winner(): dict кандидата або None."""
+    pid = pool.pick(weight)
+    if pid is None:
+        return None
+    return db.get_participant(pid)
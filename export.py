@@ -0,0 +1,104 @@
+# export.py
+import csv
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+import db
+
+COLUMNS = ["№", "tg_user_id", "Telegram", "Ім’я", "Телефон", "Магазин №", "Дата"]
+FORMATS = ("xlsx", "csv")
+
+
+def _parse_dt(value: str, end: bool = False) -> datetime:
+    """
+    "2025-12-18" або "2025-12-18T10:30" (локальний час).
+    Для end=True дата без часу означає "до кінця цього дня".
+    """
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Невірна дата: {value}")
+    if end and len(value) <= 10:
+        dt += timedelta(days=1)
+    return dt.astimezone()
+
+
+def parse_filters(args: list[str]) -> dict:
+    """
+    Аргументи /export: from=YYYY-MM-DD to=YYYY-MM-DD since=YYYY-MM-DDTHH:MM store=8 winners csv
+    Повертає kwargs для build_export(); ValueError — якщо щось не так.
+    """
+    opts = {"date_from": None, "date_to": None, "store_no": None, "winners_only": False, "fmt": "xlsx"}
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key in ("from", "since") and value:
+            opts["date_from"] = _parse_dt(value)
+        elif key == "to" and value:
+            opts["date_to"] = _parse_dt(value, end=True)
+        elif key == "store" and value.isdigit():
+            opts["store_no"] = int(value)
+        elif arg == "winners":
+            opts["winners_only"] = True
+        elif arg in FORMATS:
+            opts["fmt"] = arg
+        else:
+            raise ValueError(f"Невідомий аргумент: {arg}")
+    return opts
+
+
+def is_full(opts: dict) -> bool:
+    """Експорт без фільтрів (після нього можна зсунути чекпоінт дельти)."""
+    return not any(opts.get(k) for k in ("date_from", "date_to", "store_no", "winners_only", "after_id"))
+
+
+def _rows(rows):
+    for pid, tg_user_id, username, full_name, phone, store_no, created_at in rows:
+        yield [pid, tg_user_id, username, full_name, phone, store_no, created_at]
+
+
+def build_export(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    store_no: int | None = None,
+    winners_only: bool = False,
+    after_id: int | None = None,
+    fmt: str = "xlsx",
+) -> tuple[str, int, int]:
+    """
+    Пише експорт у тимчасовий файл рядок за рядком (курсор SQLite -> openpyxl write-only / csv),
+    тож пам'ять не росте з кількістю учасників. Повертає (path, rows, max_id);
+    файл видаляє той, хто викликав.
+    """
+    rows = db.iter_participants(
+        date_from=date_from, date_to=date_to, store_no=store_no, winners_only=winners_only, after_id=after_id
+    )
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{fmt}")
+    count = 0
+    max_id = 0
+    try:
+        if fmt == "csv":
+            with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for row in _rows(rows):
+                    writer.writerow(row)
+                    count += 1
+                    max_id = row[0]
+        else:
+            os.close(fd)
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet()
+            ws.append(COLUMNS)
+            for row in _rows(rows):
+                ws.append(row)
+                count += 1
+                max_id = row[0]
+            wb.save(path)
+    except BaseException:
+        rows.close()
+        os.remove(path)
+        raise
+    return path, count, max_id
@@ -0,0 +1,173 @@
+# fsm_storage.py
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from async_db import adb
+
+log = logging.getLogger("fsm")
+
+# FSM_STORAGE=sqlite (за замовчуванням) | redis | memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+FSM_TTL_SEC = float(os.getenv("FSM_TTL_HOURS", "24")) * 3600   # покинута реєстрація живе стільки
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FLUSH_EVERY_SEC = 1.0
+SWEEP_EVERY_SEC = 300
+
+
+class _Entry:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: str | None = None, data: dict | None = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data or {}
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM у пам'яті процесу + write-behind у таблицю fsm_states (каталог БД).
+    Читання — лише з пам'яті; змінені ключі пишуться пачкою раз на FLUSH_EVERY_SEC
+    (після падіння губиться максимум ця секунда). Записи, не оновлені за ttl,
+    видаляються з пам'яті і з БД — покинуті реєстрації не накопичуються.
+    Один процес на БД; для кількох процесів — FSM_STORAGE=redis.
+    """
+
+    def __init__(self, ttl: float = FSM_TTL_SEC, flush_every: float = FLUSH_EVERY_SEC):
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._entries: dict[str, _Entry] = {}
+        self._dirty: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Піднімає живі стани з БД і запускає фоновий flush."""
+        rows = await adb.fsm_load(time.time() - self.ttl)
+        for key, state, data, updated_at in rows:
+            self._entries[key] = _Entry(state, json.loads(data) if data else {}, updated_at)
+        self._flusher = asyncio.create_task(self._flush_loop(), name="fsm_flush")
+        log.info("FSM: відновлено %d станів із SQLite", len(rows))
+
+    def _get(self, key: StorageKey) -> _Entry | None:
+        k = self.key_builder.build(key)
+        entry = self._entries.get(k)
+        if entry is not None and entry.updated_at < time.time() - self.ttl:
+            del self._entries[k]
+            self._dirty.add(k)
+            return None
+        return entry
+
+    def _touch(self, key: StorageKey) -> _Entry:
+        k = self.key_builder.build(key)
+        entry = self._entries.get(k)
+        if entry is None:
+            entry = self._entries[k] = _Entry()
+        entry.updated_at = time.time()
+        self._dirty.add(k)
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._touch(key).state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._get(key)
+        return entry.state if entry else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self._touch(key).data = copy.deepcopy(dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._get(key)
+        return copy.deepcopy(entry.data) if entry else {}
+
+    async def flush(self) -> None:
+        """Пише всі змінені ключі однією транзакцією; порожні (state=None, data={}) видаляє."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        rows, deleted = [], []
+        for k in keys:
+            entry = self._entries.get(k)
+            if entry is None or (entry.state is None and not entry.data):
+                self._entries.pop(k, None)
+                deleted.append(k)
+            else:
+                rows.append((k, entry.state, json.dumps(entry.data, ensure_ascii=False), entry.updated_at))
+        try:
+            await adb.fsm_save(rows, deleted)
+        except Exception:
+            self._dirty |= keys   # спробуємо наступного разу
+            raise
+
+    def sweep(self) -> int:
+        """Викидає з пам'яті записи, старші за ttl. Повертає кількість."""
+        expired_before = time.time() - self.ttl
+        expired = [k for k, e in self._entries.items() if e.updated_at < expired_before]
+        for k in expired:
+            del self._entries[k]
+            self._dirty.discard(k)
+        return len(expired)
+
+    async def _flush_loop(self) -> None:
+        last_sweep = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_every)
+            try:
+                await self.flush()
+                if time.monotonic() - last_sweep >= SWEEP_EVERY_SEC:
+                    last_sweep = time.monotonic()
+                    evicted = self.sweep()
+                    deleted = await adb.fsm_expire(time.time() - self.ttl)
+                    if evicted or deleted:
+                        log.info("FSM: прибрано %d покинутих станів (БД: %d)", evicted, deleted)
+            except Exception:
+                log.exception("FSM flush не вдався")
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+
+def redis_storage(redis=None, ttl: float = FSM_TTL_SEC) -> BaseStorage:
+    """
+    aiogram RedisStorage з TTL на стан і дані. redis — готовий клієнт
+    (для тестів — fakeredis.aioredis.FakeRedis()), інакше підключення за REDIS_URL.
+    """
+    try:
+        from aiogram.fsm.storage.redis import RedisStorage
+    except ImportError as e:
+        raise RuntimeError("FSM_STORAGE=redis потребує пакет redis (є в requirements.txt)") from e
+
+    options = dict(
+        key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        state_ttl=int(ttl),
+        data_ttl=int(ttl),
+    )
+    if redis is None:
+        return RedisStorage.from_url(REDIS_URL, **options)
+    return RedisStorage(redis=redis, **options)
+
+
+async def create_storage() -> tuple[BaseStorage, BaseEventIsolation | None]:
+    """FSM storage за FSM_STORAGE + events isolation для Dispatcher."""
+    if FSM_STORAGE == "redis":
+        storage = redis_storage()
+        return storage, storage.create_isolation()
+    if FSM_STORAGE == "memory":
+        return MemoryStorage(), None
+
+    storage = SQLiteStorage()
+    await storage.start()
+    return storage, None
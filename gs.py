@@ -1,11 +1,16 @@
 # gs.py
 import os
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 from typing import Tuple
 
 import gspread
 from google.oauth2.service_account import Credentials
 
+import metrics
+
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
@@ -19,26 +24,105 @@ WORKSHEET_TITLE = os.getenv("GOOGLE_WORKSHEET_TITLE", "Лист1").strip()
 HEADER: Tuple[str, ...] = ("№", "Telegram user", "Ім’я", "Номер телефону", "Магазин №", "Дата")
 
 
+# ==========================================
+#   Кеш клієнта/аркуша на весь процес
+# ==========================================
+
+# Лічильники HTTP-викликів до Google API (по операціях) + кількість записаних рядків
+API_CALLS: Counter = Counter()
+
+_lock = threading.RLock()
+_ws = None
+_header_ok = False
+
+# Помилки, після яких кеш вважаємо протухлим (токен/доступ/аркуш зник)
+_STALE_STATUS = {401, 403, 404}
+
+
+def _count(op: str, n: int = 1) -> None:
+    API_CALLS[op] += n
+
+
 def _client() -> gspread.Client:
     creds = Credentials.from_service_account_file(CREDS_FILE, scopes=SCOPES)
+    _count("auth")
     return gspread.authorize(creds)
 
 
 def _open_spreadsheet(gc: gspread.Client):
     """Пробуємо спочатку відкрити по ID, якщо нема — по name."""
+    _count("open_spreadsheet")
     if SHEET_ID:
         return gc.open_by_key(SHEET_ID)
     return gc.open(SHEET_NAME)
 
 
 def _open_ws(sh):
+    _count("open_worksheet")
     try:
         return sh.worksheet(WORKSHEET_TITLE)
     except gspread.WorksheetNotFound:
         # cols=10 щоб точно вистачило під майбутні колонки
+        _count("add_worksheet")
         return sh.add_worksheet(title=WORKSHEET_TITLE, rows=1000, cols=10)
 
 
+def _worksheet():
+    """
+    Лінива ініціалізація: credentials читаються і аркуш резолвиться один раз на процес.
+    Токен оновлює сам google-auth (AuthorizedSession) при закінченні терміну дії.
+    """
+    global _ws
+    with _lock:
+        if _ws is None:
+            _ws = _open_ws(_open_spreadsheet(_client()))
+        return _ws
+
+
+def invalidate() -> None:
+    """Скидає кеш клієнта/аркуша і перевірку хедера."""
+    global _ws, _header_ok
+    with _lock:
+        _ws = None
+        _header_ok = False
+
+
+def _is_stale_error(e: Exception) -> bool:
+    if isinstance(e, (gspread.SpreadsheetNotFound, gspread.WorksheetNotFound)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        return getattr(e, "code", None) in _STALE_STATUS
+    return False
+
+
+def _with_ws(fn, op: str):
+    """Виконує fn(ws); при auth/not-found помилці скидає кеш і пробує ще раз. Час — у metrics (bot_gs_seconds)."""
+    started = time.perf_counter()
+    try:
+        try:
+            return fn(_worksheet())
+        except Exception as e:
+            if not _is_stale_error(e):
+                raise
+            invalidate()
+            return fn(_worksheet())
+    finally:
+        metrics.observe("bot_gs_seconds", time.perf_counter() - started, op=op)
+
+
+def api_stats() -> dict:
+    """Лічильники викликів API + середня кількість викликів на записаний рядок."""
+    calls = dict(API_CALLS)
+    rows = calls.pop("rows_appended", 0)
+    total = sum(calls.values())
+    return {
+        "calls": calls,
+        "total_calls": total,
+        "rows_appended": rows,
+        "calls_per_row": round(total / rows, 2) if rows else None,
+    }
+
+
 def _a1_range_for_header(headers: Tuple[str, ...]) -> str:
     # A1 + (len(headers) колонок)
     # 1->A, 2->B, ..., 26->Z, 27->AA ...
@@ -54,21 +138,26 @@ def _a1_range_for_header(headers: Tuple[str, ...]) -> str:
 
 
 def _ensure_header(ws, headers: Tuple[str, ...] = HEADER) -> None:
+    """Перевіряє хедер один раз на процес (до invalidate())."""
+    global _header_ok
+    if _header_ok:
+        return
+
     rng = _a1_range_for_header(headers)
+    _count("get_values")
     vals = ws.get_values(rng)
 
     need = list(headers)
-    if not vals or not vals[0]:
-        ws.update(rng, [need])
-        return
-
-    row = vals[0]
+    row = vals[0] if vals else []
     # якщо не співпало по довжині або по значеннях — перезаписуємо хедер
     if len(row) < len(need) or any((row[i] if i < len(row) else "") != need[i] for i in range(len(need))):
+        _count("update")
         ws.update(rng, [need])
+    _header_ok = True
 
 
-def _next_seq(ws) -> int:
+def _max_seq(ws) -> int:
+    _count("col_values")
     col = ws.col_values(1)[1:]  # без заголовка
     seq = 0
     for v in col:
@@ -76,7 +165,16 @@ def _next_seq(ws) -> int:
             seq = max(seq, int(v))
         except Exception:
             pass
-    return seq + 1
+    return seq
+
+
+def _next_seq(ws) -> int:
+    return _max_seq(ws) + 1
+
+
+def max_seq() -> int:
+    """Найбільший № в аркуші (O(rows) — лише для звірки на старті)."""
+    return _with_ws(_max_seq, "max_seq")
 
 
 def append_participant_row(
@@ -89,49 +187,75 @@ def append_participant_row(
     """
     ✅ Тепер пишемо і store_no.
     row_id лишив як опційний, щоб не ламати старі виклики.
+    ⚠️ Legacy: № рахується скануванням колонки A. Основний шлях — gs_outbox + append_participant_rows.
     """
-    gc = _client()
-    sh = _open_spreadsheet(gc)
-    ws = _open_ws(sh)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def run(ws):
+        seq = _next_seq(ws)
+        _append(ws, [(seq, username, full_name, phone, store_no, now)])
+        return seq
+
+    with _lock:
+        return _with_ws(run, "append_row")
+
+
+def _append(ws, rows: list[tuple]) -> None:
     _ensure_header(ws)
+    values = [
+        [seq, username or "", full_name or "", phone or "", (store_no if store_no is not None else ""), date_str or ""]
+        for seq, username, full_name, phone, store_no, date_str in rows
+    ]
+    _count("append_rows")
+    ws.append_rows(values, value_input_option="USER_ENTERED")
+    _count("rows_appended", len(values))
 
-    seq = _next_seq(ws)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    ws.append_row(
-        [seq, username or "", full_name or "", phone or "", (store_no if store_no is not None else ""), now],
-        value_input_option="USER_ENTERED"
-    )
-    return seq
+def append_participant_rows(rows: list[tuple]) -> None:
+    """
+    Пакетний запис: rows = [(seq, username, full_name, phone, store_no, date_str), ...].
+    № приходить з локального лічильника (db.counters), аркуш не читається — O(1) на рядок.
+    """
+    with _lock:
+        _with_ws(lambda ws: _append(ws, rows), "append_rows")
 
 
 def sheet_row_count() -> int:
-    gc = _client()
-    sh = _open_spreadsheet(gc)
-    ws = _open_ws(sh)
-    return len([x for x in ws.col_values(1) if str(x).strip()])
+    def run(ws):
+        _count("col_values")
+        return len([x for x in ws.col_values(1) if str(x).strip()])
 
+    return _with_ws(run, "row_count")
 
-def clear_gsheet_keep_header(headers: Tuple[str, ...] = HEADER) -> tuple[bool, dict | str]:
-    try:
-        gc = _client()
-        sh = _open_spreadsheet(gc)
-        ws = _open_ws(sh)
 
+def clear_gsheet_keep_header(headers: Tuple[str, ...] = HEADER) -> tuple[bool, dict | str]:
+    def run(ws):
+        global _header_ok
+        _count("col_values")
         before = max(len(ws.col_values(1)) - 1, 0)
+        _count("clear")
         ws.clear()
+        _header_ok = False
 
         rng = _a1_range_for_header(headers)
+        _count("update")
         ws.update(rng, [list(headers)])
+        _header_ok = tuple(headers) == HEADER
 
+        _count("col_values")
         after = max(len(ws.col_values(1)) - 1, 0)
-        return True, {"before": before, "after": after}
+        return {"before": before, "after": after}
+
+    try:
+        with _lock:
+            return True, _with_ws(run, "clear")
     except Exception as e:
         return False, str(e)
 
 
 def gs_diagnostics() -> dict:
     """Повертає детальний стан для логів/команди /gs_diag."""
+    global _ws
     info = {
         "creds_file_exists": os.path.exists(CREDS_FILE),
         "sheet_id": SHEET_ID or None,
@@ -142,14 +266,21 @@ def gs_diagnostics() -> dict:
         "row_count_including_header": None,
         "error": None,
     }
+    def row_count(ws):
+        _count("col_values")
+        return len(ws.col_values(1))
+
     try:
-        gc = _client()
-        sh = _open_spreadsheet(gc)
-        info["can_open"] = True
-        ws = _open_ws(sh)
-        info["worksheet_ok"] = True
-        info["row_count_including_header"] = len(ws.col_values(1))
+        with _lock:
+            if _ws is None:
+                sh = _open_spreadsheet(_client())
+                info["can_open"] = True
+                _ws = _open_ws(sh)
+            info["can_open"] = True
+            info["worksheet_ok"] = True
+        info["row_count_including_header"] = _with_ws(row_count, "diagnostics")
     except Exception as e:
         info["error"] = str(e)
+    info["api"] = api_stats()
     return info
 
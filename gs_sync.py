@@ -0,0 +1,198 @@
+# gs_sync.py
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from async_db import adb
+
+# --- опційний імпорт Google Sheet (якщо є gs.py і gspread) ---
+try:
+    from gs import HEADER, append_participant_rows, clear_gsheet_keep_header, max_seq
+    GS_AVAILABLE = True
+except Exception:
+    GS_AVAILABLE = False
+
+log = logging.getLogger("gs_sync")
+
+BATCH_SIZE = 50
+IDLE_SEC = 5           # як часто перевіряти outbox, якщо ніхто не "штурхнув"
+BACKOFF_MIN_SEC = 5
+BACKOFF_MAX_SEC = 600
+CLEAR_ATTEMPTS = 5     # стільки спроб очистити аркуш під нову кампанію, далі — нумерація після старих рядків
+CLEAR_BACKOFF_MAX_SEC = 30
+
+_wakeup = asyncio.Event()
+_gate = asyncio.Event()   # знятий — воркер не пише в аркуш (поки /clear чи /gs_clear чистять його)
+_gate.set()
+_pauses = 0               # скільки pause() ще не відпущено: gate відкриває лише останній resume()
+_batch = asyncio.Lock()   # тримається на час fetch → append → ack однієї пачки
+_clearing = asyncio.Lock()   # одна очистка аркуша за раз (/clear і /gs_clear)
+_needs_reconcile = False  # аркуш не очищено під нову кампанію — перед записом звірити № з аркушем
+
+
+def kick() -> None:
+    """Розбудити воркер одразу після нової реєстрації."""
+    _wakeup.set()
+
+
+async def pause() -> None:
+    """
+    Зупинити запис в аркуш; повертається, коли пачка, що вже пишеться, завершена.
+    Кожен pause() — у парі з resume(); запис відновлюється після останнього.
+    """
+    global _pauses
+    _pauses += 1
+    _gate.clear()
+    async with _batch:
+        pass
+
+
+def resume() -> None:
+    global _pauses
+    _pauses = max(_pauses - 1, 0)
+    if not _pauses:
+        _gate.set()
+        kick()
+
+
+async def clear_sheet() -> tuple[bool, dict | str]:
+    """/gs_clear: очистка аркуша з паузою запису; чекає, якщо /clear саме чистить аркуш."""
+    await pause()
+    try:
+        async with _clearing:
+            return await asyncio.to_thread(clear_gsheet_keep_header, HEADER)
+    finally:
+        resume()
+
+
+async def reset_sheet() -> tuple[bool, dict | str]:
+    """
+    Очищає аркуш під нову кампанію, поки воркер на паузі (pause() — до start_campaign),
+    і лише тоді відновлює запис: рядки нової кампанії (№ з 1) не потрапляють під очистку.
+    Не більше CLEAR_ATTEMPTS спроб (~1 хв); не вдалося — воркер перед наступним записом
+    звірить лічильник з аркушем (reconcile_gs_seq), щоб нові № йшли після старих рядків,
+    а не дублювали їх. Повертає (очищено, info/помилка).
+    """
+    global _needs_reconcile
+    try:
+        if not GS_AVAILABLE:
+            return False, "Google Sheets недоступний"
+        backoff = BACKOFF_MIN_SEC
+        async with _clearing:
+            for attempt in range(1, CLEAR_ATTEMPTS + 1):
+                try:
+                    ok, info = await asyncio.to_thread(clear_gsheet_keep_header, HEADER)
+                except Exception as e:
+                    ok, info = False, str(e)
+                if ok:
+                    return True, info
+                log.warning("GS очистка не вдалася (спроба %d/%d): %s", attempt, CLEAR_ATTEMPTS, info)
+                if attempt < CLEAR_ATTEMPTS:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, CLEAR_BACKOFF_MAX_SEC)
+        _needs_reconcile = True
+        return False, f"{info}; аркуш не очищено за {CLEAR_ATTEMPTS} спроб — № продовжаться після рядків, що вже в аркуші"
+    finally:
+        resume()
+
+
+def _local_time(created_at: str | None) -> str:
+    """created_at у SQLite — UTC (CURRENT_TIMESTAMP); в таблицю пишемо локальний час."""
+    if not created_at:
+        return ""
+    try:
+        dt = datetime.fromisoformat(str(created_at)).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return str(created_at)
+    return dt.astimezone().strftime("%Y-%m-%d %H:%M:%S")
+
+
+async def _sleep(stop: asyncio.Event, seconds: float) -> None:
+    _wakeup.clear()
+    waiters = [asyncio.create_task(stop.wait()), asyncio.create_task(_wakeup.wait())]
+    try:
+        await asyncio.wait(waiters, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in waiters:
+            t.cancel()
+
+
+async def _reconcile(stop: asyncio.Event) -> None:
+    """На старті і після невдалої очистки аркуша: звіряємо локальний лічильник № з аркушем (з повторами)."""
+    global _needs_reconcile
+    backoff = BACKOFF_MIN_SEC
+    while not stop.is_set():
+        try:
+            async with _batch:
+                sheet_max = await asyncio.to_thread(max_seq)
+                value = await adb.reconcile_gs_seq(sheet_max)
+            _needs_reconcile = False
+            log.info("GS: звірка № — аркуш=%d, лічильник=%d", sheet_max, value)
+            return
+        except Exception as e:
+            log.warning("GS звірка не вдалася, повтор через %ss: %s", backoff, e)
+            await _sleep(stop, backoff)
+            backoff = min(backoff * 2, BACKOFF_MAX_SEC)
+
+
+async def outbox_worker(stop: asyncio.Event) -> None:
+    """
+    Фоновий воркер: вигрібає gs_outbox пачками і пише в Google Sheet одним append_rows.
+    При помилці — рядки лишаються в outbox, наступна спроба з експоненційним backoff.
+    """
+    if not GS_AVAILABLE:
+        log.info("Google Sheets недоступний — outbox воркер не запущено")
+        return
+
+    await _reconcile(stop)
+
+    backoff = BACKOFF_MIN_SEC
+    while not stop.is_set():
+        if not _gate.is_set():
+            await _wait_gate(stop)
+            continue
+        if _needs_reconcile:
+            await _reconcile(stop)
+            continue
+
+        sleep_for = 0
+        async with _batch:   # pause() чекає, поки ця пачка допишеться
+            if not _gate.is_set():
+                continue
+            try:
+                batch = await adb.fetch_gs_outbox(BATCH_SIZE)
+            except Exception:
+                log.exception("Не вдалося прочитати gs_outbox")
+                batch, sleep_for = None, IDLE_SEC
+
+            if batch == []:
+                sleep_for = IDLE_SEC
+            elif batch:
+                ids = [row[0] for row in batch]
+                rows = [
+                    (seq, f"@{username}" if username and username != "—" else "", full_name, phone, store_no, _local_time(created_at))
+                    for _, seq, username, full_name, phone, store_no, created_at in batch
+                ]
+                try:
+                    await asyncio.to_thread(append_participant_rows, rows)
+                except Exception as e:
+                    log.warning("GS append не вдався (%d рядків), повтор через %ss: %s", len(ids), backoff, e)
+                    await adb.retry_gs_outbox(ids, str(e), backoff)
+                    sleep_for = backoff
+                    backoff = min(backoff * 2, BACKOFF_MAX_SEC)
+                else:
+                    await adb.ack_gs_outbox(ids)
+                    backoff = BACKOFF_MIN_SEC
+                    log.info("GS: записано %d рядків", len(ids))
+
+        if sleep_for:
+            await _sleep(stop, sleep_for)
+
+
+async def _wait_gate(stop: asyncio.Event) -> None:
+    waiters = [asyncio.create_task(stop.wait()), asyncio.create_task(_gate.wait())]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in waiters:
+            t.cancel()
@@ -1,25 +1,31 @@
 # handlers/admin.py
 import io
 import os
+import csv
+import tempfile
 import asyncio
 from datetime import datetime
 
-import pandas as pd
 from dotenv import load_dotenv
 from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import Message, BufferedInputFile
+from aiogram.types import Message, BufferedInputFile, FSInputFile
 from aiogram.utils.text_decorations import html_decoration as hd
 
-from db import (
-    get_participants, clear_tables, table_counts, DB_PATH,
-    count_participants, count_participants_today,
-    get_all_user_ids, pick_random_winner, save_winner, get_winners,
-    set_rules, get_rules,
-    get_store_stats, upsert_store
-)
+from db import DB_PATH, compact_file
+from async_db import adb
 
-from gs import clear_gsheet_keep_header, SHEET_NAME, sheet_row_count, gs_diagnostics
+import broadcast
+import gs_sync
+import metrics
+import profiler
+import notifier
+import openai_check
+from backup import make_snapshot
+from draw import WEIGHTS
+from export import build_export, parse_filters, is_full
+from gs import SHEET_NAME, sheet_row_count, gs_diagnostics
 
 load_dotenv()
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
@@ -27,6 +33,9 @@ VERSION = os.getenv("BOT_VERSION", "1.0.0")
 
 router = Router()
 
+# посилання на фонові задачі хендлерів (щоб їх не зібрав GC)
+_background: set[asyncio.Task] = set()
+
 def is_admin(uid: int) -> bool:
     return uid in ADMIN_IDS
 
@@ -39,17 +48,28 @@ async def help_admin_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
     commands = [
-        ("📊 /stats", "Показує статистику по учасниках і базі."),
+        ("📊 /stats", "Статистика; /stats hours [N] або /stats days [N] — по годинах/днях."),
+        ("🔬 /profile", "Семплінговий профайлер: /profile 30 — флеймграф (.folded) + блокування event loop."),
+        ("⏱ /perf", "Швидкодія (мс): p50/p95/p99 хендлерів, запитів БД і Google Sheets; /perf reset — з нуля."),
         ("🏪 /stores", "Список магазинів по номерам + кількість реєстрацій."),
         ("🧩 /store_add", "Додати/оновити магазин: /store_add 12 Назва магазину."),
-        ("📤 /export", "Експортує учасників у Excel."),
-        ("🧷 /backup", "Завантажує файл бази даних."),
-        ("🧹 /clear", "Очищає всі таблиці (та Google Sheet)."),
+        ("🔧 /stores_check", "Звірити й перерахувати лічильники магазинів."),
+        ("📤 /export", "Експорт у Excel/CSV: /export [from=…] [to=…] [since=…] [store=8] [winners] [csv]."),
+        ("🆕 /export_delta", "Лише нові рядки з твого попереднього експорту."),
+        ("🧷 /backup", "Консистентний знімок БД (gzip)."),
+        ("🧹 /clear", "Нова кампанія: /clear [назва]. Попередня лишається в архіві, Google Sheet очищується."),
+        ("🗂 /campaigns", "Усі кампанії: учасники, юзери, переможці."),
         ("📋 /set_rules", "Задати правила розіграшу."),
         ("📖 /get_rules", "Показати поточні правила."),
-        ("🏆 /random_winner", "Випадковий переможець."),
+        ("🏆 /random_winner", "Випадковий переможець: /random_winner [entry|user|store]."),
+        ("🎰 /draw", "N переможців разом: /draw 10 [store=8] [unique_user]."),
         ("🎖 /winners", "Показує останніх переможців."),
+        ("🧾 /duplicates", "Схожі чеки (виключені з розіграшу)."),
+        ("👌 /dup_ok", "Повернути чек у розіграш: /dup_ok 123."),
+        ("🔔 /notify", "Алерти про реєстрації: /notify all|digest|off."),
         ("📢 /broadcast", "Надіслати повідомлення всім учасникам."),
+        ("📨 /broadcast_status", "Стан розсилки: /broadcast_status [id]."),
+        ("🛑 /broadcast_cancel", "Зупинити розсилку: /broadcast_cancel [id]."),
         ("🧪 /gs_diag", "Діагностика доступу до Google Sheets."),
         ("🧽 /gs_clear", "Очистити аркуш у Google Sheets, лишити шапку."),
         ("💡 /version", "Показує версію бота."),
@@ -70,31 +90,119 @@ async def version_cmd(m: Message):
         return await m.answer("🚫 Тільки для адмінів.")
     await m.answer(f"🤖 Bot version: <b>{VERSION}</b>")
 
+def _histogram(rows: list[tuple[str, int]]) -> str:
+    peak = max((cnt for _, cnt in rows), default=0) or 1
+    return "\n".join(
+        f"<code>{label}</code> {'█' * max(round(cnt / peak * 12), 1 if cnt else 0)} {cnt}"
+        for label, cnt in rows
+    )
+
+
 @router.message(Command("stats"))
 async def stats_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    total = count_participants()
-    today = count_participants_today()
+
+    # /stats hours [N] | /stats days [N] — розбивка по годинах/днях
+    args = (m.text or "").split()[1:]
+    if args and args[0] in ("hours", "days"):
+        n = int(args[1]) if len(args) > 1 and args[1].isdigit() else (24 if args[0] == "hours" else 7)
+        if args[0] == "hours":
+            n = min(max(n, 1), 72)
+            rows = await adb.participants_per_hour(n)
+            lines = [(f"{h:%d.%m %H}:00", cnt) for h, cnt in rows]
+            title = f"🕒 <b>Реєстрації по годинах</b> (останні {n})"
+        else:
+            n = min(max(n, 1), 60)
+            rows = await adb.participants_per_day(n)
+            lines = [(d, cnt) for d, cnt in rows]
+            title = f"📅 <b>Реєстрації по днях</b> (останні {n})"
+        return await m.answer(f"{title}\n{_histogram(lines)}")
+
+    total = await adb.count_participants()
+    today = await adb.count_participants_today()
+    last_hour = await adb.count_participants_last_hour()
     try:
-        gs_rows = sheet_row_count()
+        gs_rows = await asyncio.to_thread(sheet_row_count)
     except Exception:
         gs_rows = "—"
-    p, r, w = table_counts()
+    p, r, w = await adb.table_counts()
+    gs_queue = await adb.count_gs_outbox()
+    campaign = await adb.get_active_campaign()
+    checks = ""
+    if openai_check.ENABLED:
+        v = await adb.validation_summary()
+        checks = (
+            f"Перевірка чеків: ✅ {v.get('ok', 0)}, ❌ {v.get('reject', 0)}, "
+            f"помилок {v.get('error', 0)}, в черзі {v.get('pending', 0)}\n"
+        )
     txt = (
         "📊 <b>Статистика</b>\n"
-        f"Учасників всього: <b>{total}</b> (сьогодні: {today})\n"
-        f"Google Sheet «{SHEET_NAME}»: {gs_rows} рядків\n"
+        f"Кампанія #{campaign['id']}: {hd.quote(campaign['title'])}\n"
+        f"Учасників всього: <b>{total}</b> (сьогодні: {today}, за годину: {last_hour})\n"
+        f"Google Sheet «{SHEET_NAME}»: {gs_rows} рядків (в черзі: {gs_queue})\n"
         f"Таблиці: participants={p}, rules={r}, winners={w}\n"
-        f"📄 БД: <code>{DB_PATH}</code>"
+        f"{checks}"
+        f"📄 БД: <code>{hd.quote(campaign['path'])}</code>\n"
+        "Розбивка: /stats hours [N], /stats days [N]"
     )
     await m.answer(txt)
 
+@router.message(Command("perf"))
+async def perf_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    if (m.text or "").partition(" ")[2].strip() == "reset":
+        metrics.reset()
+        return await m.answer("⏱ Лічильники швидкодії скинуто.")
+    blocks = metrics.perf_report()
+    if not blocks:
+        return await m.answer("⏱ Ще немає вимірів.")
+    parts = ["⏱ <b>Швидкодія</b>, мс (оцінка по кошиках гістограми)"]
+    for title, table in blocks:
+        parts.append(f"<b>{title}</b>\n<pre>{hd.quote(table)}</pre>")
+    await m.answer("\n".join(parts))
+
+@router.message(Command("profile"))
+async def profile_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    arg = (m.text or "").partition(" ")[2].strip()
+    if arg and not arg.isdigit():
+        return await m.answer(f"Використай: /profile [секунд] (1–{profiler.MAX_SECONDS}, за замовчуванням 10)")
+    seconds = min(max(int(arg or 10), 1), profiler.MAX_SECONDS)
+    if profiler.busy():
+        return await m.answer("⏳ Профайлер уже працює, зачекай.")
+    await m.answer(f"🔬 Профілюю {seconds} с (event loop + потоки пулів)…")
+    _background.add(task := asyncio.create_task(_profile_background(m, seconds)))
+    task.add_done_callback(_background.discard)
+
+async def _profile_background(m: Message, seconds: int):
+    try:
+        prof = await profiler.Profiler().run(seconds)
+    except RuntimeError as e:
+        return await m.answer(f"⏳ {e}")
+    stamp = f"{datetime.now():%Y%m%d_%H%M%S}"
+    lines = [f"🔬 <b>Профіль за {seconds} с</b>: {prof.samples} семплів"]
+    top = prof.top()
+    if top:
+        lines.append("Найгарячіше (без простою):")
+        lines.append("<pre>" + hd.quote("\n".join(f"{pct:5.1f}% {leaf}" for leaf, _, pct in top)) + "</pre>")
+    lines.append(
+        f"Блокувань event loop ≥ {profiler.BLOCK_THRESHOLD_SEC * 1000:.0f} мс: <b>{len(prof.blocks)}</b>"
+        + (" — стеки у blocks_*.txt" if prof.blocks else "")
+    )
+    lines.append("Флеймграф: flamegraph.pl або speedscope.app (формат collapsed).")
+    await m.answer("\n".join(lines))
+    await m.answer_document(BufferedInputFile(prof.folded().encode("utf-8"), filename=f"profile_{stamp}.folded"))
+    if prof.blocks:
+        await m.answer_document(BufferedInputFile(prof.blocks_report().encode("utf-8"), filename=f"blocks_{stamp}.txt"))
+
 @router.message(Command("stores"))
 async def stores_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    rows = get_store_stats()
+    rows = await adb.get_store_stats()
     if not rows:
         return await m.answer("Поки що немає даних по магазинах.")
     lines = ["🏪 <b>Магазини та реєстрації:</b>"]
@@ -103,6 +211,18 @@ async def stores_cmd(m: Message):
         lines.append(f"• <b>{store_no}</b>{title}: <b>{cnt}</b>")
     await m.answer("\n".join(lines))
 
+@router.message(Command("stores_check"))
+async def stores_check_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    mismatches = await adb.check_store_counters(rebuild=True)
+    if not mismatches:
+        return await m.answer("✅ Лічильники магазинів узгоджені.")
+    lines = [f"🔧 Знайдено розбіжності ({len(mismatches)}), лічильники перераховано:"]
+    for store_no, counter, actual in mismatches[:30]:
+        lines.append(f"• <b>{store_no}</b>: було {counter}, насправді {actual}")
+    await m.answer("\n".join(lines))
+
 @router.message(Command("store_add"))
 async def store_add_cmd(m: Message):
     if not is_admin(m.from_user.id):
@@ -112,31 +232,58 @@ async def store_add_cmd(m: Message):
         return await m.answer("Використай: <code>/store_add 12 Назва магазину</code>")
     store_no = int(args[1])
     name = args[2].strip()
-    upsert_store(store_no, name)
+    await adb.upsert_store(store_no, name)
     await m.answer(f"✅ Збережено: магазин <b>{store_no}</b> — {hd.quote(name)}")
 
+EXPORT_USAGE = (
+    "Використай: <code>/export [from=2025-12-18] [to=2025-12-31] [since=2025-12-20T10:00] "
+    "[store=8] [winners] [csv]</code>"
+)
+
+
+async def _send_export(m: Message, opts: dict, prefix: str = "participants") -> int:
+    """Будує файл у фоні, стрімом з курсора, і відправляє його. Повертає max id у файлі (0 — порожньо)."""
+    path, count, max_id = await adb.read(build_export, **opts)
+    try:
+        if not count:
+            await m.answer("ℹ️ Нових рядків немає." if opts.get("after_id") is not None else "ℹ️ Нічого не знайдено.")
+            return 0
+        fname = f"{prefix}_{datetime.now():%Y%m%d_%H%M}.{opts['fmt']}"
+        await m.answer_document(FSInputFile(path, filename=fname), caption=f"📤 Експорт готовий ✅ ({count} рядків)")
+        return max_id
+    finally:
+        os.remove(path)
+
+
 @router.message(Command("export"))
 async def export_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
+    try:
+        opts = parse_filters((m.text or "").split()[1:])
+    except ValueError as e:
+        return await m.answer(f"⚠️ {hd.quote(str(e))}\n{EXPORT_USAGE}")
 
-    rows = get_participants()
-    cleaned_rows = []
-    for (pid, tg_user_id, username, full_name, phone, photo_id, store_no, created_at) in rows:
-        cleaned_rows.append([pid, tg_user_id, username, full_name, phone, store_no, created_at])
+    max_id = await _send_export(m, opts)
+    if max_id and is_full(opts):
+        await adb.set_export_checkpoint(m.from_user.id, max_id)
 
-    df = pd.DataFrame(
-        cleaned_rows,
-        columns=["№", "tg_user_id", "Telegram", "Ім’я", "Телефон", "Магазин №", "Дата"]
-    )
 
-    buf = io.BytesIO()
-    df.to_excel(buf, index=False)
-    buf.seek(0)
+@router.message(Command("export_delta"))
+async def export_delta_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    fmt = "csv" if "csv" in (m.text or "").split()[1:] else "xlsx"
+    last_id = await adb.get_export_checkpoint(m.from_user.id)
+
+    # ✅ лише нові рядки після попереднього експорту цього адміна (id > чекпоінт)
+    max_id = await _send_export(m, {"after_id": last_id, "fmt": fmt}, prefix=f"participants_after_{last_id}")
+    if max_id:
+        await adb.set_export_checkpoint(m.from_user.id, max_id)
+
+def _mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.2f} MB"
 
-    fname = f"participants_{datetime.now():%Y%m%d_%H%M}.xlsx"
-    file = BufferedInputFile(buf.getvalue(), filename=fname)
-    await m.answer_document(file, caption="📤 Експорт готовий ✅")
 
 @router.message(Command("backup"))
 async def backup_cmd(m: Message):
@@ -144,35 +291,99 @@ async def backup_cmd(m: Message):
         return await m.answer("🚫 Тільки для адмінів.")
     if not os.path.exists(DB_PATH):
         return await m.answer("⚠️ Файл бази не знайдено.")
-    with open(DB_PATH, "rb") as f:
-        data = f.read()
-    file = BufferedInputFile(data, filename=f"bot_backup_{datetime.now():%Y%m%d_%H%M}.db")
-    await m.answer_document(file, caption="🧷 Бекап бази")
+
+    # ✅ консистентний знімок через SQLite backup API у фоновому потоці + gzip
+    with tempfile.TemporaryDirectory() as tmp:
+        info = await asyncio.to_thread(make_snapshot, tmp)
+        await m.answer_document(
+            FSInputFile(info["path"], filename=os.path.basename(info["path"])),
+            caption=(
+                f"🧷 Бекап бази за {info['seconds']:.1f} с\n"
+                f"БД: {_mb(info['db_size'])} → gzip: {_mb(info['gz_size'])}"
+            ),
+        )
+
+async def _clear_background(status: Message, stats: dict):
+    """
+    Фон після ротації, дві незалежні задачі: очистка Google Sheet (запис в аркуш на паузі
+    з моменту /clear, рядки нової кампанії підуть лише після неї; спроби обмежені)
+    і стиснення архівного файлу. Кожна дописує свій рядок у статус, як тільки завершиться.
+    """
+    base = status.html_text
+    lines: list[str] = []
+    edit_lock = asyncio.Lock()
+
+    async def show(line: str) -> None:
+        async with edit_lock:
+            lines.append(line)
+            try:
+                await status.edit_text(base + "\n" + "\n".join(lines))
+            except TelegramBadRequest:
+                pass
+
+    async def sheet() -> None:
+        ok, gs_info = await gs_sync.reset_sheet()
+        await show(
+            f"Google Sheet: before={gs_info['before']}, after={gs_info['after']}"
+            if ok else f"❌ Google Sheet: {hd.quote(str(gs_info))}"
+        )
+
+    async def compact() -> None:
+        try:
+            before, after = await asyncio.to_thread(compact_file, stats["archive_path"])
+            await show(f"Архів стиснуто: {_mb(before)} → {_mb(after)}")
+        except Exception as e:
+            await show(f"⚠️ Стиснення архіву: {hd.quote(str(e))}")
+
+    await asyncio.gather(sheet(), compact())
+    await show("✅ Готово")
+
 
 @router.message(Command("clear"))
 async def clear_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    stats = clear_tables()
-    p_left, r_left, w_left = table_counts()
-
-    # ✅ 6 колонок
-    headers = ("№", "Telegram user", "Ім’я", "Номер телефону", "Магазин №", "Дата")
-    ok, gs_info = clear_gsheet_keep_header(headers=headers)
-    gs_line = (
-        f"Google Sheet: before={gs_info['before']}, after={gs_info['after']}"
-        if ok else f"❌ Google Sheet: {gs_info}"
-    )
+    title = (m.text or "").partition(" ")[2].strip() or None
+    status = await m.answer("🧹 Закриваю поточну кампанію…")
 
-    txt = (
-        "🧹 <b>Очищено</b>\n"
-        f"До: participants={stats['before_participants']}, rules={stats['before_rules']}, winners={stats['before_winners']}\n"
-        f"Видалено: participants={stats['deleted_participants']}, rules={stats['deleted_rules']}, winners={stats['deleted_winners']}\n"
+    # ✅ замість DELETE + VACUUM: стара кампанія лишається своїм файлом, бот переходить на новий;
+    # запис в аркуш — на паузі, доки _clear_background його не очистить
+    await gs_sync.pause()
+    try:
+        stats = await adb.start_campaign(title)
+    except Exception:
+        gs_sync.resume()
+        raise
+    p_left, r_left, w_left = await adb.table_counts()
+    status = await status.edit_text(
+        f"🧹 <b>Нова кампанія #{stats['campaign_id']}</b>: {hd.quote(stats['title'])}\n"
+        f"Кампанія #{stats['archived_id']}: participants={stats['participants']}, "
+        f"rules={stats['rules']}, winners={stats['winners']}\n"
+        f"📦 Архів: <code>{hd.quote(stats['archive_path'])}</code>\n"
         f"Після: participants={p_left}, rules={r_left}, winners={w_left}\n"
-        f"{gs_line}\n"
-        f"📄 БД: <code>{DB_PATH}</code>"
+        "⏳ Google Sheet і стиснення архіву — у фоні…"
     )
-    await m.answer(txt)
+    _background.add(task := asyncio.create_task(_clear_background(status, stats)))
+    task.add_done_callback(_background.discard)
+
+
+@router.message(Command("campaigns"))
+async def campaigns_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    report = await adb.campaign_report()
+    if not report:
+        return await m.answer("Кампаній ще немає.")
+    lines = ["🗂 <b>Кампанії</b>"]
+    for c in report:
+        mark = "🟢" if c["status"] == "active" else "📦"
+        period = f"{(c['started_at'] or '?')[:10]} — {(c['ended_at'] or 'зараз')[:10]}"
+        counts = (
+            f"учасників {c['participants']}, юзерів {c['users']}, переможців {c['winners']}"
+            if c["participants"] is not None else "файл недоступний"
+        )
+        lines.append(f"{mark} #{c['id']} {hd.quote(c['title'] or '')} ({period}): {counts}")
+    await m.answer("\n".join(lines))
 
 @router.message(Command("set_rules"))
 async def set_rules_cmd(m: Message):
@@ -181,14 +392,14 @@ async def set_rules_cmd(m: Message):
     text = m.text.partition(" ")[2].strip()
     if not text:
         return await m.answer("Використай: /set_rules умови (наприклад: сума ≥ 300 грн; дата ≤ 7 днів)")
-    set_rules(text)
+    await adb.set_rules(text)
     await m.answer("✅ Правила оновлено.")
 
 @router.message(Command("get_rules"))
 async def get_rules_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    rules = get_rules()
+    rules = await adb.get_rules()
     if not rules:
         return await m.answer("ℹ️ Правила ще не задані.")
     await m.answer(f"📋 Поточні правила:\n{hd.quote(rules)}")
@@ -197,10 +408,19 @@ async def get_rules_cmd(m: Message):
 async def random_winner_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    cand = pick_random_winner()
-    if not cand:
-        return await m.answer("😕 Немає кандидатів (усі вже виграли).")
-    save_winner(cand["participant_id"])
+    weight = (m.text or "").partition(" ")[2].strip() or "entry"
+    if weight not in WEIGHTS:
+        return await m.answer("Використай: /random_winner [entry|user|store]")
+
+    # save_winner повертає False, якщо цього учасника щойно забрав інший адмін — тягнемо ще раз
+    for _ in range(5):
+        cand = await adb.pick_random_winner(weight=weight)
+        if not cand:
+            return await m.answer("😕 Немає кандидатів (усі вже виграли).")
+        if await adb.save_winner(cand["participant_id"]):
+            break
+    else:
+        return await m.answer("⚠️ Не вдалося зафіксувати переможця, спробуй ще раз.")
     await m.answer(
         "🎉 <b>Випадковий переможець</b>\n"
         f"№: {cand['participant_id']}\n"
@@ -211,11 +431,59 @@ async def random_winner_cmd(m: Message):
         f"🕒 {cand['created_at']}"
     )
 
+DRAW_MAX = 1000
+DRAW_INLINE_MAX = 20  # більше — відправляємо файлом
+
+
+@router.message(Command("draw"))
+async def draw_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    usage = "Використай: <code>/draw 10 [store=8] [unique_user]</code>"
+    args = (m.text or "").split()[1:]
+    if not args or not args[0].isdigit() or not (1 <= int(args[0]) <= DRAW_MAX):
+        return await m.answer(usage)
+    n = int(args[0])
+    store_no = None
+    unique_user = False
+    for arg in args[1:]:
+        if arg.startswith("store=") and arg[6:].isdigit():
+            store_no = int(arg[6:])
+        elif arg == "unique_user":
+            unique_user = True
+        else:
+            return await m.answer(usage)
+
+    winners = await adb.draw_winners(n, store_no=store_no, unique_user=unique_user)
+    if not winners:
+        return await m.answer("😕 Немає кандидатів.")
+
+    scope = f" (магазин {store_no})" if store_no is not None else ""
+    head = f"🎉 <b>Розіграш: {len(winners)} з {n}</b>{scope}" + (" · 1 виграш на юзера" if unique_user else "")
+    if len(winners) <= DRAW_INLINE_MAX:
+        lines = [head]
+        for i, w in enumerate(winners, start=1):
+            uname = f"@{w['username']}" if w["username"] else "—"
+            lines.append(
+                f"{i}. #{w['participant_id']} — {hd.quote(w['full_name'] or '—')} | 🏪 {w['store_no'] or '—'} | "
+                f"{spoiler(uname)} | {spoiler(w['phone'] or '—')}"
+            )
+        return await m.answer("\n".join(lines))
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["#", "№", "Telegram", "Ім’я", "Телефон", "Магазин №", "Дата"])
+    for i, w in enumerate(winners, start=1):
+        writer.writerow([i, w["participant_id"], w["username"] or "", w["full_name"] or "",
+                         w["phone"] or "", w["store_no"] or "", w["created_at"]])
+    file = BufferedInputFile(buf.getvalue().encode("utf-8-sig"), filename=f"draw_{datetime.now():%Y%m%d_%H%M}.csv")
+    await m.answer_document(file, caption=head)
+
 @router.message(Command("winners"))
 async def winners_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    rows = get_winners(limit=20)
+    rows = await adb.get_winners(limit=20)
     if not rows:
         return await m.answer("Переможців поки нема.")
 
@@ -227,6 +495,49 @@ async def winners_cmd(m: Message):
         )
     await m.answer("\n".join(lines))
 
+@router.message(Command("duplicates"))
+async def duplicates_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    rows = await adb.get_flagged_receipts(limit=20)
+    if not rows:
+        return await m.answer("Схожих чеків не знайдено 👍")
+
+    lines = ["🧾 <b>Схожі чеки</b> (виключені з розіграшу)"]
+    for pid, dup_of, full_name, created_at in rows:
+        lines.append(f"• #{pid} ≈ #{dup_of} — {hd.quote(full_name or '—')} | {created_at} | /dup_ok {pid}")
+    await m.answer("\n".join(lines))
+
+@router.message(Command("dup_ok"))
+async def dup_ok_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    arg = (m.text or "").partition(" ")[2].strip()
+    if not arg.isdigit():
+        return await m.answer("Використай: /dup_ok 123 (№ учасника)")
+    if await adb.clear_receipt_flag(int(arg)):
+        await m.answer(f"✅ Чек №{arg} повернуто в розіграш.")
+    else:
+        await m.answer(f"ℹ️ Чек №{arg} не позначений як дубль.")
+
+@router.message(Command("notify"))
+async def notify_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    arg = (m.text or "").partition(" ")[2].strip().lower()
+    if not arg:
+        return await m.answer(
+            f"🔔 Алерти про реєстрації: <b>{notifier.get_mode(m.from_user.id)}</b>\n"
+            f"all — кожна окремо (у сплеск понад {notifier.BURST_LIMIT} — дайджестом)\n"
+            f"digest — лише дайджест раз на {notifier.DIGEST_WINDOW_SEC:g} с\n"
+            "off — вимкнути (алерти про дублі чеків лишаються)\n"
+            "Змінити: /notify all|digest|off"
+        )
+    if arg not in notifier.MODES:
+        return await m.answer("Використай: /notify all|digest|off")
+    await notifier.set_mode(m.from_user.id, arg)
+    await m.answer(f"✅ Алерти про реєстрації: <b>{arg}</b>")
+
 @router.message(Command("broadcast"))
 async def broadcast_cmd(m: Message):
     if not is_admin(m.from_user.id):
@@ -234,28 +545,64 @@ async def broadcast_cmd(m: Message):
     text = m.text.partition(" ")[2].strip()
     if not text:
         return await m.answer("Використай: /broadcast ваш текст для всіх.")
-    users = get_all_user_ids()
-    if not users:
+    running = broadcast.running_job_ids()
+    if running:
+        return await m.answer(f"⏳ Розсилка #{running[0]} ще йде. /broadcast_status або /broadcast_cancel")
+
+    # ✅ задача пишеться в БД і йде у фоні, хендлер одразу звільняється
+    job = await broadcast.start_job(m.bot, m.chat.id, text)
+    if not job["total"]:
         return await m.answer("Немає користувачів.")
-    sent = 0
-    fail = 0
-    await m.answer(f"🚀 Розсилка на {len(users)} користувачів…")
+    await m.answer(f"📨 Розсилка #{job['id']} створена: {job['total']} отримувачів.")
 
-    for tg_id, pid in users:
-        try:
-            await m.bot.send_message(tg_id, text)
-            sent += 1
-        except Exception:
-            fail += 1
-        await asyncio.sleep(0.05)
 
-    await m.answer(f"✅ Готово. Надіслано: {sent}, помилок: {fail}.")
+def _job_id_arg(m: Message) -> int | None:
+    arg = (m.text or "").partition(" ")[2].strip().lstrip("#")
+    return int(arg) if arg.isdigit() else None
+
+
+@router.message(Command("broadcast_status"))
+async def broadcast_status_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    job = await adb.get_broadcast_job(_job_id_arg(m))
+    if not job:
+        return await m.answer("Розсилок ще не було.")
+    pending = job["total"] - job["sent"] - job["failed"]
+    lines = [
+        f"📨 <b>Розсилка #{job['id']}</b> — {job['status']}",
+        f"Отримувачів: {job['total']}",
+        f"✅ Надіслано: {job['sent']}, ❌ помилок: {job['failed']}, ⏳ в черзі: {pending}",
+        f"🕒 Створено: {job['created_at']}" + (f", завершено: {job['finished_at']}" if job["finished_at"] else ""),
+    ]
+    errors = await adb.broadcast_error_summary(job["id"])
+    if errors:
+        lines.append("Помилки: " + ", ".join(f"{hd.quote(err or '?')}={cnt}" for err, cnt in errors))
+    await m.answer("\n".join(lines))
+
+
+@router.message(Command("broadcast_cancel"))
+async def broadcast_cancel_cmd(m: Message):
+    if not is_admin(m.from_user.id):
+        return await m.answer("🚫 Тільки для адмінів.")
+    job_id = _job_id_arg(m)
+    if job_id is None:
+        running = broadcast.running_job_ids()
+        if not running:
+            return await m.answer("Немає активних розсилок.")
+        job_id = running[0]
+    if await broadcast.cancel_job(job_id):
+        await m.answer(f"🛑 Розсилку #{job_id} зупиняю…")
+    else:
+        await m.answer(f"Розсилка #{job_id} не активна.")
+
 
 @router.message(Command("gs_diag"))
 async def gs_diag_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    d = gs_diagnostics()
+    d = await asyncio.to_thread(gs_diagnostics)
+    api = d.get("api") or {}
     lines = [
         "🧪 <b>GS діагностика</b>",
         f"credentials.json існує: {d.get('creds_file_exists')}",
@@ -265,6 +612,7 @@ async def gs_diag_cmd(m: Message):
         f"Відкривається книга: {d.get('can_open')}",
         f"Аркуш ок: {d.get('worksheet_ok')}",
         f"Рядків (з хедером): {d.get('row_count_including_header')}",
+        f"API викликів: {api.get('total_calls')}, рядків записано: {api.get('rows_appended')}, викликів/рядок: {api.get('calls_per_row') or '—'}",
         f"Помилка: {hd.quote(d.get('error') or '—')}",
     ]
     await m.answer("\n".join(lines))
@@ -273,9 +621,8 @@ async def gs_diag_cmd(m: Message):
 async def gs_clear_cmd(m: Message):
     if not is_admin(m.from_user.id):
         return await m.answer("🚫 Тільки для адмінів.")
-    # ✅ 6 колонок
-    headers = ("№", "Telegram user", "Ім’я", "Номер телефону", "Магазин №", "Дата")
-    ok, info = clear_gsheet_keep_header(headers=headers)
+    # пауза запису + спільний з /clear лок: не чистимо посеред append і не відкриваємо запис, поки /clear чистить
+    ok, info = await gs_sync.clear_sheet()
     if ok:
         await m.answer(f"🧽 GS очищено: було {info['before']}, стало {info['after']}.")
     else:
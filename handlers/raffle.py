@@ -1,6 +1,5 @@
 # handlers/raffle.py
 import re
-import os
 from dotenv import load_dotenv
 
 from aiogram import Router, F
@@ -8,22 +7,16 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from db import add_participant  # ✅ важливо: тепер пишемо tg_user_id + store_no
+from async_db import adb  # ✅ важливо: тепер пишемо tg_user_id + store_no
 
-# --- опційний імпорт Google Sheet (якщо є gs.py) ---
-try:
-    # якщо хочеш ще й магазин в таблицю — скажеш, я піджену gs.py під це
-    from gs import append_participant_row  # (username, full_name, phone, row_id)  (legacy)
-    _GS_AVAILABLE = True
-except Exception:
-    _GS_AVAILABLE = False
+import gs_sync  # Google Sheet пишеться фоновим воркером через gs_outbox
+import receipts  # dHash чеків рахується у фоні, див. receipts.py
+import openai_check  # опційна перевірка чека моделлю — теж у фоні, результат приходить окремим повідомленням
+import notifier  # алерти адмінам про реєстрації
 
 load_dotenv()
 router = Router()
 
-# ADMIN_IDS з .env або вшити руками типу: ADMIN_IDS = [111, 222]
-ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
-
 # ===== FSM =====
 class Reg(StatesGroup):
     waiting_for_name = State()
@@ -35,10 +28,6 @@ PHONE_RE = re.compile(r"^\+?\d[\d\s\-\(\)]{6,}$")
 def _clean_phone(x: str) -> str:
     return re.sub(r"[^\d+]", "", (x or "")).lstrip("0")
 
-def _spoil(text: str | None) -> str:
-    t = (text or "").strip()
-    return f"<tg-spoiler>{t}</tg-spoiler>" if t else "—"
-
 # ===== FLOW =====
 
 @router.message(F.photo)
@@ -46,9 +35,16 @@ async def handle_receipt_photo(message: Message, state: FSMContext):
     """
     Користувач кидає фото чеку -> просимо ім'я
     """
-    photo_id = message.photo[-1].file_id if message.photo else None
+    photo = message.photo[-1] if message.photo else None
+    photo_id = photo.file_id if photo else None
+    file_unique_id = photo.file_unique_id if photo else None
+
+    # ✅ той самий файл уже реєстрували — одразу відмова (індекс по file_unique_id)
+    if file_unique_id and await adb.find_receipt(file_unique_id):
+        return await message.answer("🧾 Цей чек уже зареєстрований у розіграші. Надішли, будь ласка, інший чек 📸")
+
     caption = message.caption or ""
-    await state.update_data(photo_id=photo_id, caption=caption)
+    await state.update_data(photo_id=photo_id, file_unique_id=file_unique_id, caption=caption)
     await message.answer("📸 Бачу чек — напиши, будь ласка, своє ім’я та бажання ✍️")
     await state.set_state(Reg.waiting_for_name)
 
@@ -109,7 +105,7 @@ async def handle_store(message: Message, state: FSMContext):
 
 async def _finalize_registration(message: Message, state: FSMContext, store_no: int):
     """
-    Завершуємо: пишемо в БД, (опційно) у Google Sheet, шлемо адмінам алерт.
+    Завершуємо: пишемо в БД (+ gs_outbox для Google Sheet), шлемо адмінам алерт.
     """
     data = await state.get_data()
     full_name = data.get("full_name") or "—"
@@ -121,47 +117,35 @@ async def _finalize_registration(message: Message, state: FSMContext, store_no:
 
     # 1) зберегти в БД (✅ тепер є tg_user_id і store_no)
     try:
-        row_id = add_participant(
+        row_id = await adb.add_participant(
             tg_user_id=tg_user_id,
             username=username or "—",
             full_name=full_name,
             phone=phone,
             photo_id=photo_id,
-            store_no=store_no
+            store_no=store_no,
+            sync_sheet=gs_sync.GS_AVAILABLE,
+            file_unique_id=data.get("file_unique_id"),
+            receipt_text=data.get("caption") or "",
+            chat_id=message.chat.id,
         )
     except Exception as e:
         await message.answer(f"⚠️ Помилка збереження: {e}")
         return
+    if row_id is None:
+        await state.clear()
+        return await message.answer("🧾 Цей чек уже зареєстрований у розіграші. Надішли, будь ласка, інший чек 📸")
 
-    # 2) Google Sheet (опц., якщо підключено)
-    # Якщо хочеш, щоб в gs теж був store_no — скажеш, я оновлю gs.py
-    if _GS_AVAILABLE:
-        try:
-            append_participant_row(f"@{username}" if username else "", full_name, phone, row_id)
-        except Exception:
-            pass  # не блокуємо флоу
+    # 2) Google Sheet: рядок уже в gs_outbox, воркер допише його у фоні; чек — на перевірку схожості
+    gs_sync.kick()
+    receipts.submit(row_id, photo_id, tg_user_id)
+    openai_check.submit(row_id, message.chat.id, photo_id, data.get("caption") or "", data.get("file_unique_id"))
 
     # 3) Відповідь учаснику
     await message.answer("✅ Дякуємо! Ти успішно зареєстрований у розіграші 💜", reply_markup=None)
 
-    # 4) Нотиф адмінам (з фото, якщо є)
-    if ADMIN_IDS:
-        caption = (
-            "🆕 <b>Нова реєстрація</b>\n"
-            f"№: <b>{row_id}</b>\n"
-            f"🏪 Магазин: <b>{store_no}</b>\n"
-            f"👤 Ім’я: {full_name}\n"
-            f"🧑‍💻 Telegram: {_spoil('@' + username if username else '—')}\n"
-            f"📞 Телефон: {_spoil(phone)}"
-        )
-        for admin_id in ADMIN_IDS:
-            try:
-                if photo_id:
-                    await message.bot.send_photo(admin_id, photo_id, caption=caption, parse_mode="HTML")
-                else:
-                    await message.bot.send_message(admin_id, caption, parse_mode="HTML")
-            except Exception:
-                pass
+    # 4) Нотиф адмінам — у фоні (notifier.py): паралельно всім, у сплеск — дайджестом
+    notifier.registration(row_id, store_no, full_name, username, phone, photo_id)
 
     # 5) кінець FSM
     await state.clear()
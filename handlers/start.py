@@ -3,7 +3,8 @@ from aiogram import Router
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 
-from db import get_rules
+import db
+from async_db import adb
 
 router = Router()
 
@@ -15,21 +16,36 @@ WELCOME = (
 )
 
 
-def _rules_block() -> str:
-    rules = get_rules()
+# (version правил, готовий HTML) — перерендерюється лише після /set_rules або нової кампанії
+_rendered: tuple[int, str] | None = None
+
+
+def _render_rules(rules: str | None) -> str:
     if not rules:
         return "ℹ️ Правила ще не встановлені адміністратором."
     return f"📋 <b>Актуальні правила:</b>\n{rules}"
 
+
+async def _rules_block() -> str:
+    global _rendered
+    cached = db.cached_rules()
+    if cached is None:
+        # кеш порожній (старт або інвалідація) — один раз читаємо з БД
+        return _render_rules(await adb.get_rules())
+    version, rules = cached
+    if _rendered is None or _rendered[0] != version:
+        _rendered = (version, _render_rules(rules))
+    return _rendered[1]
+
 @router.message(CommandStart())
 async def start_cmd(m: Message):
     await m.answer(WELCOME)
 
-    await m.answer(_rules_block())
+    await m.answer(await _rules_block())
 
     await m.answer("Готовий брати участь? Надсилай фото чека 📸")
 
 @router.message(Command("rules"))
 @router.message(Command("get_rules"))
 async def show_rules_cmd(m: Message):
-    await m.answer(_rules_block())
+    await m.answer(await _rules_block())
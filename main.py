@@ -1,6 +1,7 @@
 # main.py
 import os
 import asyncio
+import argparse
 import logging
 from dotenv import load_dotenv
 
@@ -10,8 +11,17 @@ from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramUnauthorizedError
 
 # === локальні модулі ===
-from db import init_db
+from async_db import adb
 from commands import setup_bot_commands
+from gs_sync import outbox_worker
+from backup import backup_scheduler
+from fsm_storage import create_storage
+from receipts import hash_worker
+from openai_check import validation_worker
+from notifier import notify_worker
+import metrics
+from webhook import MAX_CONCURRENT_UPDATES, run_webhook
+import broadcast
 from handlers.start import router as start_router
 from handlers.raffle import router as raffle_router
 from handlers.admin import router as admin_router
@@ -43,23 +53,53 @@ async def _create_bot() -> Bot:
 # ======================================
 #  ГОЛОВНА АСИНХРОННА ФУНКЦІЯ
 # ======================================
-async def main() -> None:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Punch bot")
+    parser.add_argument(
+        "--mode",
+        choices=("polling", "webhook"),
+        default=os.getenv("BOT_MODE", "polling"),
+        help="polling (за замовчуванням) або webhook (aiohttp, див. webhook.py)",
+    )
+    return parser.parse_args(argv)
+
+
+async def main(mode: str = "polling") -> None:
     setup_logging()
     log = logging.getLogger("main")
 
     # 1️⃣ Ініціалізуємо базу
-    init_db()
+    await adb.init_db()
+    # прогріваємо кеш правил/магазинів, щоб /start не ходив у БД
+    await adb.get_rules()
+    await adb.get_stores()
     log.info("SQLite ініціалізовано")
 
     # 2️⃣ Ініціалізуємо бота + диспетчер
     bot = await _create_bot()
-    dp = Dispatcher()
+    # FSM реєстрації переживає рестарт (FSM_STORAGE=sqlite|redis|memory)
+    storage, events_isolation = await create_storage()
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
 
     # 3️⃣ Підключаємо всі роутери
     dp.include_router(start_router)
     dp.include_router(raffle_router)
     dp.include_router(admin_router)
 
+    # ⏱ Час обробки апдейтів по хендлерах і станах FSM (/perf, /metrics)
+    metrics.setup(dp)
+
+    # 🔄 Фонові задачі
+    stop = asyncio.Event()
+    background = [
+        asyncio.create_task(outbox_worker(stop), name="gs_outbox"),
+        asyncio.create_task(backup_scheduler(stop), name="backup"),
+        asyncio.create_task(hash_worker(bot, stop), name="receipt_hash"),
+        asyncio.create_task(validation_worker(bot, stop), name="receipt_validation"),
+        asyncio.create_task(notify_worker(bot, stop), name="admin_notify"),
+        asyncio.create_task(metrics.metrics_server(stop), name="metrics"),
+    ]
+
     try:
         # ✅ Перевірка: який бот реально запущений
         me = await bot.get_me()
@@ -68,19 +108,32 @@ async def main() -> None:
         # 4️⃣ Меню команд (окремо для юзерів і адмінів)
         await setup_bot_commands(bot)
 
-        # 5️⃣ Лог
-        log.info("Polling on 🔥")
+        # 📨 Продовжуємо розсилки, перервані рестартом
+        resumed = await broadcast.resume_jobs(bot)
+        if resumed:
+            log.info(f"Відновлено розсилки: {resumed}")
 
-        # 6️⃣ Запуск
-        await dp.start_polling(bot)
+        # 5️⃣ Запуск (апдейти обробляються паралельно, не більше MAX_CONCURRENT_UPDATES)
+        if mode == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            log.info("Polling on 🔥")
+            await bot.delete_webhook()
+            await dp.start_polling(bot, tasks_concurrency_limit=MAX_CONCURRENT_UPDATES)
 
     except TelegramUnauthorizedError:
         log.error("❌ Unauthorized: BOT_TOKEN неправильний/старий. Онови токен в BotFather і встав в Railway Variables.")
         raise
 
     finally:
+        await broadcast.shutdown()
+        stop.set()
+        await asyncio.gather(*background, return_exceptions=True)
+        await storage.close()
+
         # ✅ щоб не було Unclosed client session
         await bot.session.close()
+        adb.shutdown()
 
 
 # ======================================
@@ -88,6 +141,6 @@ async def main() -> None:
 # ======================================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(main(parse_args().mode))
     except (KeyboardInterrupt, SystemExit):
         print("🛑 Бот зупинено вручну.")
@@ -0,0 +1,217 @@
+# metrics.py
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+log = logging.getLogger("metrics")
+
+# Prometheus-ендпоінт: http://METRICS_HOST:METRICS_PORT/metrics ; METRICS_PORT=0 — вимкнено
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+SLOW_HANDLER_SEC = float(os.getenv("SLOW_HANDLER_SEC", "2"))
+
+# Межі кошиків (секунди) — від швидкого читання з пулу до довгого запиту в Google
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HELP = {
+    "bot_handler_seconds": "Час обробки апдейта: хендлер + стан FSM на вході",
+    "bot_db_seconds": "Виклик db.* через AsyncDB (черга пулу + запит)",
+    "bot_gs_seconds": "Операція з Google Sheets",
+}
+
+
+class Histogram:
+    """
+    Кумулятивна гістограма в стилі Prometheus: лічильники по кошиках + сума.
+    observe() — bisect і три інкременти під локом (викликається і з потоків пулів).
+    Перцентилі — оцінка лінійною інтерполяцією всередині кошика.
+    """
+
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # останній — +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+# (метрика, (("label", "value"), ...)) -> Histogram
+_series: dict[tuple[str, tuple], Histogram] = {}
+_series_lock = threading.Lock()
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    h = _series.get(key)
+    if h is None:
+        with _series_lock:
+            h = _series.setdefault(key, Histogram())
+    h.observe(seconds)
+
+
+def series(name: str | None = None) -> list[tuple[str, dict, Histogram]]:
+    return [(n, dict(labels), h) for (n, labels), h in list(_series.items()) if name is None or n == name]
+
+
+def reset() -> None:
+    with _series_lock:
+        _series.clear()
+
+
+# ==========================================
+#   Prometheus text format
+# ==========================================
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, le: str | None = None) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render() -> str:
+    lines = []
+    by_name: dict[str, list] = {}
+    for (name, labels), h in sorted(_series.items()):
+        by_name.setdefault(name, []).append((labels, h))
+    for name, items in by_name.items():
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, h in items:
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, "+Inf"), h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels, str(bound))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def metrics_server(stop: asyncio.Event) -> None:
+    """Локальний aiohttp-сервер з /metrics для Prometheus."""
+    if not METRICS_PORT:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+        log.info("Metrics: http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+        await stop.wait()
+    except OSError as e:
+        log.warning("Metrics-сервер не стартував: %s", e)
+    finally:
+        await runner.cleanup()
+
+
+# ==========================================
+#   Middleware aiogram
+# ==========================================
+
+def _handler_name(callback) -> str:
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rpartition('.')[2]}.{getattr(callback, '__name__', '?')}"
+
+
+class _NameHandler(BaseMiddleware):
+    """Inner: лише записує, який хендлер спрацював, у спільний dict outer-middleware."""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        slot = data.get("_metrics")
+        if slot is not None:
+            slot["handler"] = _handler_name(data["handler"].callback)
+        return await handler(event, data)
+
+
+class TimingMiddleware(BaseMiddleware):
+    """
+    Outer на dp.update (після FSM-middleware, тож raw_state уже відомий):
+    міряє весь шлях апдейта — фільтри, хендлер, відповідь — з мітками handler і state.
+    """
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        slot = data["_metrics"] = {}
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            name = slot.get("handler", "unhandled")
+            state = data.get("raw_state") or "-"
+            observe("bot_handler_seconds", elapsed, handler=name, state=state)
+            if elapsed >= SLOW_HANDLER_SEC:
+                log.warning("Повільний апдейт: %s (стан %s) — %.2f с", name, state, elapsed)
+
+
+def setup(dp: Dispatcher) -> None:
+    dp.update.outer_middleware(TimingMiddleware())
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(_NameHandler())
+
+
+# ==========================================
+#   /perf
+# ==========================================
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}" if seconds >= 0.01 else f"{seconds * 1000:.1f}"
+
+
+def perf_report(limit: int = 15) -> list[tuple[str, str]]:
+    """Для /perf: [(назва, таблиця)] — p50/p95/p99 (мс) по найчастіших серіях кожної метрики."""
+    blocks = []
+    for name, title in (("bot_handler_seconds", "Хендлери"), ("bot_db_seconds", "БД"), ("bot_gs_seconds", "Google Sheets")):
+        rows = sorted(series(name), key=lambda s: -s[2].count)[:limit]
+        if not rows:
+            continue
+        lines = [f"{'':<32} {'n':>6} {'p50':>6} {'p95':>6} {'p99':>6}"]
+        for _, labels, h in rows:
+            label = labels.get("handler") or labels.get("fn") or labels.get("op") or "-"
+            if labels.get("state", "-") != "-":
+                label += f" [{labels['state'].rpartition(':')[2]}]"
+            lines.append(
+                f"{label[:32]:<32} {h.count:>6} {_ms(h.quantile(.5)):>6} {_ms(h.quantile(.95)):>6} {_ms(h.quantile(.99)):>6}"
+            )
+        blocks.append((title, "\n".join(lines)))
+    return blocks
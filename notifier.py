@@ -0,0 +1,241 @@
+# notifier.py
+import asyncio
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+from aiogram.utils.text_decorations import html_decoration as hd
+
+from async_db import adb
+
+load_dotenv()
+log = logging.getLogger("notifier")
+
+ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
+
+# Режими алертів про реєстрації (кожен адмін обирає свій через /notify):
+#   all    — кожна реєстрація окремо, але не більше BURST_LIMIT за вікно; решта — дайджестом у кінці вікна
+#   digest — лише дайджест раз на DIGEST_WINDOW_SEC
+#   off    — без алертів про реєстрації (алерти про дублі чеків приходять завжди)
+MODES = ("all", "digest", "off")
+DEFAULT_MODE = os.getenv("ADMIN_NOTIFY_MODE", "all")
+BURST_LIMIT = int(os.getenv("ADMIN_NOTIFY_BURST", "5"))
+DIGEST_WINDOW_SEC = float(os.getenv("ADMIN_DIGEST_SEC", "60"))
+DIGEST_LINES = 30
+ALBUM_SIZE = 10        # ліміт Telegram на media group
+MAX_ATTEMPTS = 3
+QUEUE_SIZE = 10000
+
+_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+_modes: dict[int, str] = {}
+
+
+def _spoil(text: str | None) -> str:
+    t = (text or "").strip()
+    return f"<tg-spoiler>{hd.quote(t)}</tg-spoiler>" if t else "—"
+
+
+def get_mode(admin_id: int) -> str:
+    return _modes.get(admin_id, DEFAULT_MODE)
+
+
+async def set_mode(admin_id: int, mode: str) -> None:
+    await adb.set_notify_mode(admin_id, mode)
+    _modes[admin_id] = mode
+
+
+# ==========================================
+#   Постановка в чергу (з хендлерів, без очікування)
+# ==========================================
+
+def _put(kind: str, payload) -> None:
+    try:
+        _queue.put_nowait((kind, payload))
+    except asyncio.QueueFull:
+        log.warning("Черга алертів переповнена — %s пропущено", kind)
+
+
+def registration(row_id: int, store_no: int, full_name: str, username: str, phone: str, photo_id: str | None) -> None:
+    """Алерт про нову реєстрацію (з урахуванням режиму кожного адміна)."""
+    if ADMIN_IDS:
+        _put("registration", {
+            "row_id": row_id, "store_no": store_no, "full_name": full_name,
+            "username": username, "phone": phone, "photo_id": photo_id,
+        })
+
+
+def alert(text: str) -> None:
+    """Службовий алерт (HTML) усім адмінам одразу, без дайджесту."""
+    if ADMIN_IDS:
+        _put("alert", text)
+
+
+# ==========================================
+#   Надсилання
+# ==========================================
+
+def _registration_caption(reg: dict) -> str:
+    username = reg["username"]
+    return (
+        "🆕 <b>Нова реєстрація</b>\n"
+        f"№: <b>{reg['row_id']}</b>\n"
+        f"🏪 Магазин: <b>{reg['store_no']}</b>\n"
+        f"👤 Ім’я: {hd.quote(reg['full_name'] or '—')}\n"
+        f"🧑‍💻 Telegram: {_spoil('@' + username if username else '—')}\n"
+        f"📞 Телефон: {_spoil(reg['phone'])}"
+    )
+
+
+def _window_title() -> str:
+    if DIGEST_WINDOW_SEC % 60 == 0:
+        minutes = int(DIGEST_WINDOW_SEC // 60)
+        return "за останню хвилину" if minutes == 1 else f"за останні {minutes} хв"
+    return f"за останні {DIGEST_WINDOW_SEC:g} с"
+
+
+def _digest_text(regs: list[dict]) -> str:
+    lines = [f"🆕 Нових реєстрацій {_window_title()}: <b>{len(regs)}</b>"]
+    for reg in regs[-DIGEST_LINES:]:
+        lines.append(f"№{reg['row_id']} · 🏪 {reg['store_no']} · {hd.quote(reg['full_name'] or '—')}")
+    if len(regs) > DIGEST_LINES:
+        lines.insert(1, f"…і ще {len(regs) - DIGEST_LINES} раніше")
+    return "\n".join(lines)
+
+
+async def send_with_retry(call, before=None, on_retry_after=None) -> Exception | None:
+    """
+    Повтори запиту до Bot API (алерти і розсилка). call() — корутина запиту,
+    before() — чекаємо перед кожною спробою (token bucket розсилки).
+    RetryAfter не рахується як спроба: on_retry_after(seconds) або sleep.
+    Мережеві помилки — до MAX_ATTEMPTS, решта — одразу. Повертає None або помилку.
+    """
+    attempt = 0
+    while True:
+        if before is not None:
+            await before()
+        try:
+            await call()
+            return None
+        except TelegramRetryAfter as e:
+            if on_retry_after is not None:
+                on_retry_after(e.retry_after)
+            else:
+                log.warning("RetryAfter %ss", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+        except TelegramNetworkError as e:
+            attempt += 1
+            if attempt == MAX_ATTEMPTS:
+                return e
+            await asyncio.sleep(attempt)
+        except Exception as e:   # Forbidden, BadRequest, ...
+            return e
+
+
+async def _send(admin_id: int, call) -> bool:
+    error = await send_with_retry(call)
+    if error is not None:
+        log.warning("Алерт адміну %s не доставлено: %s: %s", admin_id, type(error).__name__, error)
+    return error is None
+
+
+class _Notifier:
+    """
+    Один воркер над чергою; кожен алерт іде всім адмінам паралельно (gather).
+    Лічильник на адміна обмежує кількість окремих алертів за вікно — у сплеск реєстрацій
+    адмін отримує один дайджест (текст + альбом фото) замість сотні повідомлень.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.sent: dict[int, int] = {}            # окремих алертів у поточному вікні
+        self.pending: dict[int, list[dict]] = {}  # реєстрації на дайджест
+        self.requests = 0
+
+    async def _call(self, admin_id: int, call) -> None:
+        self.requests += 1
+        await _send(admin_id, call)
+
+    def _send_registration(self, admin_id: int, reg: dict):
+        caption = _registration_caption(reg)
+        if reg["photo_id"]:
+            return self._call(admin_id, lambda: self.bot.send_photo(admin_id, reg["photo_id"], caption=caption, parse_mode="HTML"))
+        return self._call(admin_id, lambda: self.bot.send_message(admin_id, caption, parse_mode="HTML"))
+
+    async def _send_digest(self, admin_id: int, regs: list[dict]) -> None:
+        if len(regs) == 1:
+            return await self._send_registration(admin_id, regs[0])
+        await self._call(admin_id, lambda: self.bot.send_message(admin_id, _digest_text(regs), parse_mode="HTML"))
+        photos = [reg for reg in regs if reg["photo_id"]][-ALBUM_SIZE:]
+        if len(photos) == 1:
+            reg = photos[0]
+            await self._call(admin_id, lambda: self.bot.send_photo(admin_id, reg["photo_id"], caption=f"№{reg['row_id']}"))
+        elif photos:
+            album = [InputMediaPhoto(media=reg["photo_id"], caption=f"№{reg['row_id']}") for reg in photos]
+            await self._call(admin_id, lambda: self.bot.send_media_group(admin_id, album))
+
+    async def on_registration(self, reg: dict) -> None:
+        sends = []
+        for admin_id in ADMIN_IDS:
+            mode = get_mode(admin_id)
+            if mode == "off":
+                continue
+            if mode == "all" and not self.pending.get(admin_id) and self.sent.get(admin_id, 0) < BURST_LIMIT:
+                self.sent[admin_id] = self.sent.get(admin_id, 0) + 1
+                sends.append(self._send_registration(admin_id, reg))
+            else:
+                self.pending.setdefault(admin_id, []).append(reg)
+        await asyncio.gather(*sends)
+
+    async def on_alert(self, text: str) -> None:
+        await asyncio.gather(*(
+            self._call(admin_id, lambda admin_id=admin_id: self.bot.send_message(admin_id, text, parse_mode="HTML"))
+            for admin_id in ADMIN_IDS
+        ))
+
+    async def flush(self) -> None:
+        """Кінець вікна: дайджести всім, у кого щось накопичилось; лічильники — з нуля."""
+        pending, self.pending, self.sent = self.pending, {}, {}
+        if pending:
+            log.info("Дайджест реєстрацій: %s", {a: len(r) for a, r in pending.items()})
+        await asyncio.gather(*(self._send_digest(a, regs) for a, regs in pending.items()))
+
+
+async def notify_worker(bot: Bot, stop: asyncio.Event) -> None:
+    """Фоновий воркер алертів адмінам; перед зупинкою відправляє накопичені дайджести."""
+    _modes.update(await adb.get_notify_modes())
+    notifier = _Notifier(bot)
+    window_ends = time.monotonic() + DIGEST_WINDOW_SEC
+    try:
+        while not stop.is_set():
+            timeout = min(window_ends - time.monotonic(), 1.0)
+            if timeout <= 0:
+                await notifier.flush()
+                window_ends = time.monotonic() + DIGEST_WINDOW_SEC
+                continue
+            try:
+                kind, payload = await asyncio.wait_for(_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            try:
+                if kind == "registration":
+                    await notifier.on_registration(payload)
+                else:
+                    await notifier.on_alert(payload)
+            except Exception:
+                log.exception("Алерт адмінам впав")
+    finally:
+        while not _queue.empty():
+            kind, payload = _queue.get_nowait()
+            if kind == "registration":
+                for admin_id in ADMIN_IDS:
+                    if get_mode(admin_id) != "off":
+                        notifier.pending.setdefault(admin_id, []).append(payload)
+        try:
+            await asyncio.wait_for(notifier.flush(), 10)
+        except Exception:
+            log.warning("Дайджест перед зупинкою не відправлено")
+        log.info("Алерти: %d запитів до API", notifier.requests)
@@ -0,0 +1,215 @@
+# openai_check.py
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+
+from aiogram import Bot
+
+import db
+from async_db import adb
+
+# --- опційний імпорт OpenAI SDK ---
+try:
+    from openai import AsyncOpenAI, OpenAI
+    OPENAI_AVAILABLE = True
+except Exception:
+    OPENAI_AVAILABLE = False
+
+log = logging.getLogger("openai_check")
+
+# Вмикається явно: OPENAI_VALIDATION=1 + OPENAI_API_KEY.
+# OPENAI_BASE_URL (читає сам SDK) — напр. http://127.0.0.1:8000/v1 для локального stub-сервера.
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+ENABLED = os.getenv("OPENAI_VALIDATION", "0") == "1" and OPENAI_AVAILABLE and bool(os.getenv("OPENAI_API_KEY"))
+CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+TIMEOUT_SEC = float(os.getenv("OPENAI_TIMEOUT_SEC", "30"))
+MAX_RETRIES = 2
+QUEUE_SIZE = 10000
+
+# Змінюй разом із SYSTEM_PROMPT — інакше кеш віддаватиме відповіді на старий промпт
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = (
+    "Ти перевіряєш чеки для розіграшу. Тобі дають правила акції і чек (фото та/або текст). "
+    "Відповідай лише JSON: {\"valid\": true|false, \"reason\": \"коротко українською\"}. "
+    "valid=false лише якщо чек явно не відповідає правилам або це не чек."
+)
+
+_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+
+def _messages(rules_text: str, receipt_text: str, image: bytes | None = None) -> list[dict]:
+    content: list[dict] = [{"type": "text", "text": f"Правила:\n{rules_text or '—'}\n\nЧек:\n{receipt_text or '—'}"}]
+    if image:
+        data_url = "data:image/jpeg;base64," + base64.b64encode(image).decode()
+        content.append({"type": "image_url", "image_url": {"url": data_url}})
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def _parse(content: str | None) -> dict:
+    """{"valid": bool, "reason": str}; нерозбірна відповідь — valid=None."""
+    try:
+        data = json.loads(content or "")
+        return {"valid": bool(data["valid"]), "reason": str(data.get("reason") or "")}
+    except (ValueError, KeyError, TypeError):
+        return {"valid": None, "reason": f"Нерозбірна відповідь моделі: {(content or '')[:200]}"}
+
+
+def content_key(rules_text: str, receipt_text: str, file_unique_id: str) -> str:
+    """
+    Хеш усього, що впливає на відповідь: модель, промпт, правила, підпис і фото.
+    Фото — за file_unique_id (однаковий для того самого файлу, хоч би хто і коли його надіслав),
+    тож кеш перевіряється ще до завантаження фото.
+    """
+    h = hashlib.sha256()
+    for part in (MODEL, str(PROMPT_VERSION), rules_text or "", receipt_text or "", file_unique_id):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def validate_receipt(receipt_text: str, rules_text: str) -> dict:
+    """
+    Синхронна перевірка одного чека (для скриптів/консолі).
+    ⚠️ Блокує на секунди — з хендлерів не викликати, там лише submit().
+    """
+    client = OpenAI(timeout=TIMEOUT_SEC, max_retries=MAX_RETRIES)
+    resp = client.chat.completions.create(
+        model=MODEL,
+        messages=_messages(rules_text, receipt_text),
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    return _parse(resp.choices[0].message.content)
+
+
+async def avalidate(client: "AsyncOpenAI", rules_text: str, receipt_text: str, image: bytes | None = None) -> dict:
+    resp = await client.chat.completions.create(
+        model=MODEL,
+        messages=_messages(rules_text, receipt_text, image),
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    return _parse(resp.choices[0].message.content)
+
+
+# ==========================================
+#   Черга перевірок (після реєстрації)
+# ==========================================
+
+def submit(participant_id: int, chat_id: int | None, photo_id: str | None, receipt_text: str = "",
+           file_unique_id: str | None = None) -> None:
+    """Поставити чек у чергу перевірки (з хендлера, без очікування)."""
+    if not ENABLED or not photo_id:
+        return
+    try:
+        _queue.put_nowait((
+            db.get_active_campaign()["id"], participant_id, chat_id, photo_id, receipt_text, file_unique_id or photo_id,
+        ))
+    except asyncio.QueueFull:
+        log.warning("Черга перевірки переповнена — чек #%s перевірю після рестарту", participant_id)
+
+
+async def _deliver(bot: Bot, chat_id: int | None, participant_id: int, result: dict) -> None:
+    if not chat_id or result["valid"] is None:
+        return  # помилка перевірки — користувача не турбуємо, вердикт "error" видно адмінам
+    if result["valid"]:
+        text = f"🧾 Чек №{participant_id} перевірено ✅"
+    else:
+        text = (
+            f"🧾 Чек №{participant_id} не пройшов автоматичну перевірку: {result['reason'] or '—'}\n"
+            "Якщо це помилка — напиши адміністратору."
+        )
+    try:
+        await bot.send_message(chat_id, text, parse_mode=None)
+    except Exception:
+        pass
+
+
+class _Validator:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.client = AsyncOpenAI(timeout=TIMEOUT_SEC, max_retries=MAX_RETRIES)
+        self.calls = 0
+        self.cache_hits = 0
+        self._seen: set[tuple[int, int]] = set()   # (кампанія, учасник) — повтор із черги не перевіряємо
+
+    async def process(self, campaign_id: int, participant_id: int, chat_id: int | None, photo_id: str,
+                      receipt_text: str, file_unique_id: str) -> None:
+        seen = (campaign_id, participant_id)
+        if campaign_id != db.get_active_campaign()["id"] or seen in self._seen:
+            return  # чек закритої кампанії або вже в роботі
+        self._seen.add(seen)
+        try:
+            await self._validate(participant_id, chat_id, photo_id, receipt_text, file_unique_id)
+        except BaseException:
+            self._seen.discard(seen)   # вердикт не записано — наступний submit (чи рестарт) перевірить знову
+            raise
+
+    async def _validate(self, participant_id: int, chat_id: int | None, photo_id: str, receipt_text: str,
+                        file_unique_id: str) -> None:
+        rules_text = await adb.get_rules() or ""
+        key = content_key(rules_text, receipt_text, file_unique_id)
+
+        cached = await adb.get_cached_validation(key)
+        if cached is not None:
+            self.cache_hits += 1
+            result = {"valid": cached[0], "reason": cached[1]}
+            await adb.save_validation(participant_id, result["valid"], result["reason"])
+        else:
+            buf = io.BytesIO()
+            await self.bot.download(photo_id, destination=buf)
+            image = buf.getvalue()
+            self.calls += 1
+            try:
+                result = await avalidate(self.client, rules_text, receipt_text, image)
+            except Exception as e:
+                log.warning("OpenAI: перевірка чека #%s не вдалася: %s", participant_id, e)
+                result = {"valid": None, "reason": type(e).__name__}
+            await adb.save_validation(participant_id, result["valid"], result["reason"], key=key)
+        await _deliver(self.bot, chat_id, participant_id, result)
+
+    async def worker(self) -> None:
+        while True:
+            job = await _queue.get()
+            try:
+                await self.process(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Перевірка чека #%s впала", job[1])
+            finally:
+                _queue.task_done()
+
+
+async def validation_worker(bot: Bot, stop: asyncio.Event) -> None:
+    """
+    CONCURRENCY воркерів над однією чергою: не більше CONCURRENCY одночасних запитів до API,
+    кеш по хешу вмісту (validation_cache) — повторний чек з тими ж правилами не оплачується.
+    Чеки не пакуються в один запит: кожен — окремий chat-виклик (вердикт і ціна — на чек).
+    """
+    if not ENABLED:
+        log.info("OpenAI-перевірка чеків вимкнена (OPENAI_VALIDATION=1 + OPENAI_API_KEY)")
+        return
+
+    validator = _Validator(bot)
+    pending = await adb.fetch_unvalidated_receipts(QUEUE_SIZE)
+    for participant_id, chat_id, photo_id, receipt_text, file_unique_id in pending:
+        submit(participant_id, chat_id, photo_id, receipt_text, file_unique_id)
+    log.info("OpenAI: у черзі %d неперевірених чеків", len(pending))
+
+    workers = [asyncio.create_task(validator.worker()) for _ in range(CONCURRENCY)]
+    try:
+        await stop.wait()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await validator.client.close()
+        log.info("OpenAI: запитів %d, з кешу %d", validator.calls, validator.cache_hits)
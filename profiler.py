@@ -0,0 +1,175 @@
+# profiler.py
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+log = logging.getLogger("profiler")
+
+SAMPLE_INTERVAL_SEC = float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000   # 100 Гц, як у py-spy
+BLOCK_THRESHOLD_SEC = float(os.getenv("PROFILE_BLOCK_MS", "100")) / 1000
+MAX_SECONDS = 120
+MAX_BLOCKS = 50
+
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# Листові кадри, де потік просто чекає роботи — у топ «гарячих» функцій не потрапляють
+_IDLE = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("profiler.py", "_heartbeat"),
+}
+
+_running = threading.Lock()
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_ROOT):
+        return filename[len(_ROOT):]
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        return filename[marker + len("site-packages") + 1:]
+    return os.path.basename(filename)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})".replace(";", ",")
+
+
+def _collapse(frame) -> tuple[str, tuple[str, str]]:
+    """Стек від кореня до листа у форматі collapsed (через ';') + лист для топу."""
+    labels = []
+    leaf = None
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        if leaf is None:
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels), leaf
+
+
+def _thread_group(name: str) -> str:
+    """db-read_3 → db-read: потоки одного пулу зливаються в один корінь флеймграфа."""
+    return re.sub(r"_\d+$", "", name or "thread")
+
+
+class Profiler:
+    """
+    Семплінговий профайлер: окремий потік раз на interval знімає sys._current_frames()
+    (стеки всіх потоків — event loop і пулів executor) і рахує однакові стеки.
+    Паралельно heartbeat-корутина позначає кожен оберт event loop; якщо вона не
+    оновлювалась довше threshold — loop заблокований: записуємо задачу і стек потоку loop.
+    Стек зі sampling-потоку знімається без зупинки інших потоків, тож накладні витрати —
+    лише GIL на час обходу кадрів (~десятки мкс на семпл).
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SEC, block_threshold: float = BLOCK_THRESHOLD_SEC):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.stacks: Counter = Counter()
+        self.leaves: Counter = Counter()
+        self.samples = 0
+        self.blocks: list[dict] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread = None
+        self._last_tick = time.monotonic()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _current_task_name(self) -> str:
+        try:
+            task = asyncio.current_task(self._loop)
+        except Exception:
+            task = None
+        if task is None:
+            return "— (колбек loop, не задача)"
+        coro = task.get_coro()
+        return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+    def _sample(self, names: dict[int, str], me: int, block: dict | None) -> dict | None:
+        loop_frame = None
+        frames = sys._current_frames()
+        if not names.keys() >= frames.keys():
+            names.update((t.ident, t.name) for t in threading.enumerate())   # з'явились нові потоки
+        for tid, frame in frames.items():
+            if tid == me:
+                continue
+            stack, leaf = _collapse(frame)
+            group = "event-loop" if tid == self._loop_thread else _thread_group(names.get(tid, str(tid)))
+            self.stacks[f"{group};{stack}"] += 1
+            if leaf not in _IDLE:
+                self.leaves[f"{group}: {leaf[1]} ({leaf[0]})"] += 1
+            if tid == self._loop_thread:
+                loop_frame = frame
+        self.samples += 1
+
+        lag = time.monotonic() - self._last_tick
+        if lag > self.block_threshold and loop_frame is not None:
+            if block is None:
+                block = {"at": time.strftime("%H:%M:%S"), "task": self._current_task_name(), "stacks": Counter()}
+            block["duration"] = lag
+            block["stacks"]["".join(traceback.format_stack(loop_frame))] += 1
+            return block
+        if block is not None and len(self.blocks) < MAX_BLOCKS:
+            self.blocks.append(block)
+        return None
+
+    def _run(self, seconds: float) -> None:
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        names: dict[int, str] = {}
+        block = None
+        while time.monotonic() < deadline:
+            block = self._sample(names, me, block)
+            time.sleep(self.interval)
+        if block is not None and len(self.blocks) < MAX_BLOCKS:
+            self.blocks.append(block)
+
+    async def run(self, seconds: float) -> "Profiler":
+        """Профілює seconds секунд (викликати з event loop — його потік і профілюємо)."""
+        if not _running.acquire(blocking=False):
+            raise RuntimeError("Профайлер уже запущений")
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        heartbeat = asyncio.create_task(self._heartbeat(), name="profiler_heartbeat")
+        try:
+            await asyncio.to_thread(self._run, min(seconds, MAX_SECONDS))
+        finally:
+            heartbeat.cancel()
+            _running.release()
+        log.info("Профіль: %d семплів, блокувань loop: %d", self.samples, len(self.blocks))
+        return self
+
+    # ---------- результати ----------
+
+    def folded(self) -> str:
+        """Collapsed stacks: «кадр;кадр;… кількість» — для flamegraph.pl / speedscope."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, limit: int = 10) -> list[tuple[str, int, float]]:
+        """Найгарячіші листові функції (без простою): (функція, семпли, % семплів)."""
+        return [(leaf, n, 100 * n / self.samples) for leaf, n in self.leaves.most_common(limit)] if self.samples else []
+
+    def blocks_report(self) -> str:
+        lines = []
+        for b in sorted(self.blocks, key=lambda b: -b["duration"]):
+            stack, _ = b["stacks"].most_common(1)[0]
+            lines.append(f"=== {b['at']}  loop заблоковано ≥ {b['duration'] * 1000:.0f} мс  задача: {b['task']}")
+            lines.append(stack)
+        return "\n".join(lines)
+
+
+def busy() -> bool:
+    return _running.locked()
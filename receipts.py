@@ -0,0 +1,220 @@
+# receipts.py
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram import Bot
+
+import db
+import notifier
+from async_db import adb
+
+# --- опційний імпорт Pillow (без нього працює лише точна перевірка по file_unique_id) ---
+try:
+    from PIL import Image
+    HASH_AVAILABLE = True
+except Exception:
+    HASH_AVAILABLE = False
+
+log = logging.getLogger("receipts")
+
+# Поріг (біт з 64). Чеки на фото схожі між собою (білий папір + текст), тому:
+#   той самий юзер, різниця <= DUP_DISTANCE — дубль, виключаємо з розіграшу до перевірки адміном;
+#   різні юзери — лише майже ідентичне фото (пересланий/перезбережений файл), і лише алерт адмінам.
+DUP_DISTANCE = int(os.getenv("RECEIPT_DUP_DISTANCE", "6"))
+CROSS_USER_DISTANCE = int(os.getenv("RECEIPT_CROSS_USER_DISTANCE", "2"))
+HASH_WORKERS = int(os.getenv("RECEIPT_HASH_WORKERS", "4"))
+QUEUE_SIZE = 10000
+
+_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+
+# ==========================================
+#   dHash + індекс по відстані Хеммінга
+# ==========================================
+
+def dhash(image_bytes: bytes) -> int:
+    """64-бітний difference hash: сірий 9x8, порівняння сусідніх пікселів по рядку."""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft("L", (64, 64))   # JPEG декодується одразу зменшеним — у рази швидше
+        pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            h = (h << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return h
+
+
+def to_signed(h: int) -> int:
+    """SQLite INTEGER — signed int64."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+class HammingIndex:
+    """
+    Multi-index hashing: 64 біти ділимо на max_distance + 1 шматків.
+    Якщо два хеші відрізняються не більше ніж на max_distance біт, хоча б один шматок
+    у них збігається точно (принцип Діріхле) — тож кандидати беремо лише з цих кошиків,
+    а не перебираємо всі хеші.
+    """
+
+    def __init__(self, max_distance: int = DUP_DISTANCE):
+        self.max_distance = max_distance
+        parts = max_distance + 1
+        widths = [64 // parts + (1 if i < 64 % parts else 0) for i in range(parts)]
+        self._chunks: list[tuple[int, int]] = []
+        shift = 0
+        for width in widths:
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in self._chunks]
+        self._hashes: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._hashes
+
+    def add(self, item_id: int, h: int) -> None:
+        self._hashes[item_id] = h
+        for (shift, mask), bucket in zip(self._chunks, self._buckets):
+            bucket.setdefault((h >> shift) & mask, []).append(item_id)
+
+    def query(self, h: int) -> list[tuple[int, int]]:
+        """[(distance, item_id)] у межах max_distance, найближчі першими."""
+        seen: set[int] = set()
+        found = []
+        for (shift, mask), bucket in zip(self._chunks, self._buckets):
+            for item_id in bucket.get((h >> shift) & mask, ()):
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                distance = (self._hashes[item_id] ^ h).bit_count()
+                if distance <= self.max_distance:
+                    found.append((distance, item_id))
+        found.sort()
+        return found
+
+
+# ==========================================
+#   Фоновий воркер (завантаження + хешування)
+# ==========================================
+
+def submit(participant_id: int, photo_id: str, tg_user_id: int | None = None) -> None:
+    """Поставити чек у чергу на хешування (з хендлера, без очікування)."""
+    if not HASH_AVAILABLE or not photo_id:
+        return
+    try:
+        _queue.put_nowait((db.get_active_campaign()["id"], participant_id, photo_id, tg_user_id))
+    except asyncio.QueueFull:
+        log.warning("Черга хешування переповнена — чек #%s оброблю після рестарту", participant_id)
+
+
+def _notify(participant_id: int, similar_to: int, distance: int, excluded: bool) -> None:
+    text = (
+        "⚠️ <b>Схожий чек</b>\n"
+        f"№{participant_id} схожий на №{similar_to} (різниця {distance} біт з 64).\n"
+        + (
+            f"Той самий учасник — виключено з розіграшу. Якщо це різні чеки — /dup_ok {participant_id}"
+            if excluded else "Різні учасники — перевір вручну."
+        )
+    )
+    notifier.alert(text)
+
+
+class _Hasher:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="receipt-hash")
+        self.index = HammingIndex()
+        self.users: dict[int, int | None] = {}
+        self.campaign_id = None
+        self._reload = asyncio.Lock()
+        self._busy: set[int] = set()
+
+    async def load(self) -> None:
+        """Індекс активної кампанії з БД + у чергу все, що не встигли захешувати."""
+        self.campaign_id = db.get_active_campaign()["id"]
+        self.index = HammingIndex()
+        self.users = {}
+        for participant_id, h, tg_user_id in await adb.get_receipt_hashes():
+            self.index.add(participant_id, to_unsigned(h))
+            self.users[participant_id] = tg_user_id
+        pending = await adb.fetch_unhashed_receipts(QUEUE_SIZE)
+        for participant_id, photo_id, tg_user_id in pending:
+            submit(participant_id, photo_id, tg_user_id)
+        log.info("Чеки: індекс %d хешів, у черзі %d", len(self.index), len(pending))
+
+    async def process(self, campaign_id: int, participant_id: int, photo_id: str, tg_user_id: int | None) -> None:
+        async with self._reload:
+            if db.get_active_campaign()["id"] != self.campaign_id:
+                await self.load()   # нова кампанія — свій індекс
+        if campaign_id != self.campaign_id or participant_id in self.index or participant_id in self._busy:
+            return              # чек закритої кампанії або вже оброблений (повтор із черги)
+        self._busy.add(participant_id)
+        try:
+            buf = io.BytesIO()
+            await self.bot.download(photo_id, destination=buf)
+            loop = asyncio.get_running_loop()
+            h = await loop.run_in_executor(self.executor, dhash, buf.getvalue())
+        finally:
+            self._busy.discard(participant_id)
+
+        # query + add без await між ними — атомарно для всіх воркерів event loop
+        same_user, other_user = None, None
+        for distance, pid in self.index.query(h):
+            if pid == participant_id:
+                continue
+            if tg_user_id is not None and self.users.get(pid) == tg_user_id:
+                same_user = same_user or (distance, pid)
+            elif distance <= CROSS_USER_DISTANCE:
+                other_user = other_user or (distance, pid)
+        self.index.add(participant_id, h)
+        self.users[participant_id] = tg_user_id
+
+        duplicate_of = same_user[1] if same_user else None
+        await adb.save_receipt_hash(participant_id, to_signed(h), duplicate_of)
+        match = same_user or other_user
+        if match:
+            log.info("Чек #%s схожий на #%s (d=%d, той самий юзер: %s)", participant_id, match[1], match[0], bool(same_user))
+            _notify(participant_id, match[1], match[0], excluded=same_user is not None)
+
+    async def worker(self) -> None:
+        while True:
+            job = await _queue.get()
+            try:
+                await self.process(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Не вдалося захешувати чек #%s: %s", job[1], e)
+            finally:
+                _queue.task_done()
+
+
+async def hash_worker(bot: Bot, stop: asyncio.Event) -> None:
+    """
+    Фонові воркери: качають фото чеків і рахують dHash у пулі потоків,
+    шукають схожі в HammingIndex і позначають дублі того самого юзера (duplicate_of).
+    """
+    if not HASH_AVAILABLE:
+        log.info("Pillow не встановлено — перевірка схожих чеків вимкнена (лише точна)")
+        return
+
+    hasher = _Hasher(bot)
+    await hasher.load()
+    workers = [asyncio.create_task(hasher.worker()) for _ in range(HASH_WORKERS)]
+    try:
+        await stop.wait()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        hasher.executor.shutdown(wait=False)
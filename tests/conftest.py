@@ -0,0 +1,20 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Свіжий каталог + кампанія у тимчасовій теці; пул з'єднань — з нуля."""
+    db.close_db()
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(db, "_active", None)
+    db.init_db()
+    yield db
+    db.close_db()
@@ -0,0 +1,93 @@
+# tests/test_db.py
+import sqlite3
+import threading
+import time
+
+
+def test_count_between_uses_created_at_index(temp_db):
+    with temp_db._read() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN " + temp_db.COUNT_BETWEEN_SQL,
+            ("2024-01-01 00:00:00", "2024-01-02 00:00:00"),
+        ).fetchall()
+    details = " | ".join(row[-1] for row in plan)
+    assert "idx_participants_created_at" in details, details
+
+
+def test_start_campaign_switches_even_if_archive_is_busy(temp_db, monkeypatch):
+    monkeypatch.setattr(temp_db, "ARCHIVE_ATTEMPTS", 2)
+    monkeypatch.setattr(temp_db, "ARCHIVE_BUSY_TIMEOUT_SEC", 0.1)
+    monkeypatch.setattr(temp_db.time, "sleep", lambda s: None)
+    temp_db.add_participant(1, "u", "Старий", "+380", None, 1)
+    old = temp_db.get_active_campaign()
+
+    # чужий читач архіву (backup_to, інший процес) — WAL вимкнути не вийде
+    reader = sqlite3.connect(old["path"])
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM participants").fetchone()
+    try:
+        stats = temp_db.start_campaign("Нова")
+    finally:
+        reader.close()
+
+    assert temp_db.get_active_campaign()["id"] == stats["campaign_id"] != old["id"]
+    temp_db.add_participant(2, "u", "Новий", "+380", None, 1)
+    assert temp_db.count_participants() == 1
+    assert _query(old["path"], "SELECT full_name FROM participants") == [("Старий",)]
+
+    # compact_file пізніше таки робить архів самодостатнім
+    temp_db.compact_file(old["path"])
+    assert _query(old["path"], "PRAGMA journal_mode") == [("delete",)]
+
+
+def _query(path: str, sql: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_start_campaign_does_not_wait_for_long_reads(temp_db):
+    temp_db.add_participant(1, "u", "Старий", "+380", None, 1)
+    reading, release = threading.Event(), threading.Event()
+    seen = []
+
+    def long_export():
+        with temp_db._read() as conn:
+            reading.set()
+            release.wait(10)
+            seen.append(conn.execute("SELECT full_name FROM participants").fetchall())
+
+    reader = threading.Thread(target=long_export)
+    reader.start()
+    try:
+        assert reading.wait(5)
+        started = time.monotonic()
+        temp_db.start_campaign("Нова")
+        temp_db.add_participant(2, "u", "Новий", "+380", None, 1)
+        assert time.monotonic() - started < 2
+        assert temp_db.count_participants() == 1
+    finally:
+        release.set()
+        reader.join()
+
+    # довге читання дочитало стару кампанію, а його з'єднання не повернулось у пул
+    assert seen == [[("Старий",)]]
+    assert temp_db._readers_opened == len(temp_db._reader_epoch) == 1
+    assert temp_db.get_participants()[0][3] == "Новий"
+
+
+def test_gs_outbox_keeps_sheet_order_behind_backoff(temp_db):
+    for i in range(3):
+        temp_db.add_participant(i, "u", f"Учасник {i}", "+380", None, 1, sync_sheet=True)
+    batch = temp_db.fetch_gs_outbox(10)
+    assert [row[1] for row in batch] == [1, 2, 3]
+
+    # № 1 не записався і чекає повтору — № 2 і 3 не повинні обігнати його в аркуші
+    temp_db.retry_gs_outbox([batch[0][0]], "503", 60)
+    assert temp_db.fetch_gs_outbox(10) == []
+
+    with temp_db._write() as conn:
+        conn.execute("UPDATE gs_outbox SET next_attempt_at = CURRENT_TIMESTAMP")
+    assert [row[1] for row in temp_db.fetch_gs_outbox(10)] == [1, 2, 3]
@@ -0,0 +1,44 @@
+# tests/test_draw.py
+import draw
+
+
+def _register(db, n, users):
+    return [db.add_participant(i % users, f"user{i}", f"Учасник {i}", "+380670000000", None, i % 5 + 1)
+            for i in range(n)]
+
+
+def test_pool_follows_writes_without_rebuild(temp_db):
+    _register(temp_db, 60, users=20)
+    pool = draw.EligiblePool()
+    assert pool.size() == 60
+    for weight in draw.WEIGHTS:
+        pool.pick(weight)
+
+    won = set()
+    for i in range(45):
+        pid = pool.pick(draw.WEIGHTS[i % 3])
+        assert pid not in won
+        assert temp_db.save_winner(pid)
+        won.add(pid)
+        if i % 5 == 0:
+            _register(temp_db, 1, users=20)
+    won.update(w["participant_id"] for w in temp_db.draw_winners(3))
+
+    assert pool.rebuilds == 1
+    eligible = {row[0] for row in temp_db.get_eligible_entries()}
+    assert pool.size() == len(eligible)
+    assert not eligible & won
+    for weight in ("user", "store"):
+        groups = pool._grouped(weight)
+        assert {pid for members in groups.members.values() for pid in members} == eligible
+        assert len(groups.keys) == len(groups.members)
+
+
+def test_pool_rebuilds_for_new_campaign(temp_db):
+    _register(temp_db, 10, users=10)
+    pool = draw.EligiblePool()
+    assert pool.size() == 10
+    temp_db.start_campaign("Нова")
+    assert pool.size() == 0
+    assert pool.pick() is None
+    assert pool.rebuilds == 2
@@ -0,0 +1,106 @@
+# tests/test_fsm_storage.py
+import asyncio
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+class _SQLiteBackend:
+    def __init__(self, db):
+        self.db = db
+
+    async def open(self, ttl: float):
+        storage = fsm_storage.SQLiteStorage(ttl=ttl, flush_every=0.05)
+        await storage.start()
+        return storage
+
+    async def stored_keys(self) -> int:
+        with self.db._read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM fsm_states").fetchone()[0]
+
+
+class _RedisBackend:
+    def __init__(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        self._fakeredis = fakeredis
+        self.server = fakeredis.FakeServer()
+
+    def _client(self):
+        return self._fakeredis.aioredis.FakeRedis(server=self.server)
+
+    async def open(self, ttl: float):
+        # новий клієнт до того ж сервера — як рестарт бота з живим Redis
+        return fsm_storage.redis_storage(redis=self._client(), ttl=ttl)
+
+    async def stored_keys(self) -> int:
+        client = self._client()
+        try:
+            return len(await client.keys("*"))
+        finally:
+            await client.aclose()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, temp_db):
+    if request.param == "sqlite":
+        return _SQLiteBackend(temp_db)
+    pytest.importorskip("redis")
+    return _RedisBackend()
+
+
+def test_state_survives_restart(backend):
+    async def main():
+        storage = await backend.open(ttl=3600)
+        state = FSMContext(storage, KEY)
+        await state.set_state("Registration:photo")
+        await state.update_data(full_name="Учасник", phone="+380670000000")
+        await storage.close()
+
+        storage = await backend.open(ttl=3600)
+        state = FSMContext(storage, KEY)
+        try:
+            return await state.get_state(), await state.get_data()
+        finally:
+            await storage.close()
+
+    assert asyncio.run(main()) == ("Registration:photo", {"full_name": "Учасник", "phone": "+380670000000"})
+
+
+def test_abandoned_state_expires(backend):
+    async def main():
+        storage = await backend.open(ttl=1)
+        await FSMContext(storage, KEY).set_state("Registration:photo")
+        await storage.close()
+        await asyncio.sleep(1.2)
+
+        storage = await backend.open(ttl=1)
+        try:
+            return await FSMContext(storage, KEY).get_state()
+        finally:
+            await storage.close()
+
+    assert asyncio.run(main()) is None
+
+
+def test_clear_deletes_stored_state(backend):
+    async def main():
+        storage = await backend.open(ttl=3600)
+        state = FSMContext(storage, KEY)
+        await state.set_state("Registration:photo")
+        await state.update_data(full_name="Учасник")
+        await storage.close()
+        stored_before = await backend.stored_keys()
+
+        storage = await backend.open(ttl=3600)
+        await FSMContext(storage, KEY).clear()
+        await storage.close()
+        return stored_before, await backend.stored_keys()
+
+    before, after = asyncio.run(main())
+    assert before > 0
+    assert after == 0
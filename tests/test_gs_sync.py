@@ -0,0 +1,98 @@
+# tests/test_gs_sync.py
+import asyncio
+import threading
+
+import pytest
+
+import gs_sync
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """Аркуш, що падає fail разів поспіль; backoff — мілісекунди."""
+    if not gs_sync.GS_AVAILABLE:
+        pytest.skip("gspread не встановлено")
+    state = {"fail": 0, "clears": 0, "hold": None}
+
+    def clear(header):
+        state["clears"] += 1
+        if state["hold"] is not None:
+            state["hold"].wait(5)
+        if state["fail"]:
+            state["fail"] -= 1
+            return False, "503 Service Unavailable"
+        return True, {"before": 10, "after": 1}
+
+    monkeypatch.setattr(gs_sync, "clear_gsheet_keep_header", clear)
+    monkeypatch.setattr(gs_sync, "BACKOFF_MIN_SEC", 0.01)
+    monkeypatch.setattr(gs_sync, "CLEAR_BACKOFF_MAX_SEC", 0.02)
+    monkeypatch.setattr(gs_sync, "_needs_reconcile", False)
+    monkeypatch.setattr(gs_sync, "_pauses", 0)
+    monkeypatch.setattr(gs_sync, "_gate", asyncio.Event())
+    monkeypatch.setattr(gs_sync, "_batch", asyncio.Lock())
+    monkeypatch.setattr(gs_sync, "_clearing", asyncio.Lock())
+    monkeypatch.setattr(gs_sync, "_wakeup", asyncio.Event())
+    gs_sync._gate.set()
+    return state
+
+
+def test_reset_gives_up_after_capped_attempts(sheet):
+    sheet["fail"] = 100
+
+    async def main():
+        await gs_sync.pause()
+        return await asyncio.wait_for(gs_sync.reset_sheet(), 5)
+
+    ok, info = asyncio.run(main())
+    assert not ok and "не очищено" in info
+    assert sheet["clears"] == gs_sync.CLEAR_ATTEMPTS
+    assert gs_sync._gate.is_set()
+    assert gs_sync._needs_reconcile   # воркер звірить № перед наступним записом
+
+
+def test_reset_retries_until_cleared(sheet):
+    sheet["fail"] = 2
+
+    async def main():
+        await gs_sync.pause()
+        return await gs_sync.reset_sheet()
+
+    assert asyncio.run(main()) == (True, {"before": 10, "after": 1})
+    assert sheet["clears"] == 3
+    assert not gs_sync._needs_reconcile
+
+
+def test_gs_clear_waits_for_reset(sheet):
+    sheet["hold"] = threading.Event()
+
+    async def main():
+        await gs_sync.pause()                      # /clear
+        reset = asyncio.create_task(gs_sync.reset_sheet())
+        await asyncio.sleep(0.05)
+        gs_clear = asyncio.create_task(gs_sync.clear_sheet())
+        await asyncio.sleep(0.05)
+        assert sheet["clears"] == 1                # /gs_clear чекає, поки /clear дочистить
+        sheet["hold"].set()
+        await asyncio.gather(reset, gs_clear)
+
+    asyncio.run(main())
+    assert sheet["clears"] == 2
+    assert gs_sync._gate.is_set() and gs_sync._pauses == 0
+
+
+def test_gate_stays_closed_while_reset_runs(sheet):
+    sheet["hold"] = threading.Event()
+
+    async def main():
+        await gs_sync.pause()                      # /clear
+        reset = asyncio.create_task(gs_sync.reset_sheet())
+        await asyncio.sleep(0.05)
+        await gs_sync.pause()                      # /gs_clear посеред reset
+        gs_sync.resume()
+        closed = not gs_sync._gate.is_set()
+        sheet["hold"].set()
+        await reset
+        return closed
+
+    assert asyncio.run(main())
+    assert gs_sync._gate.is_set()
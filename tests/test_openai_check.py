@@ -0,0 +1,131 @@
+# tests/test_openai_check.py
+import asyncio
+import json
+import time
+
+import pytest
+from aiohttp import web
+
+import openai_check
+
+
+class _StubOpenAI:
+    """Локальний сервер з API chat-completions: на кожен чек відповідає valid=true."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+
+    async def completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests.append(body)
+        content = json.dumps({"valid": True, "reason": "ок"}, ensure_ascii=False)
+        return web.json_response({
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    async def start(self) -> tuple[web.AppRunner, str]:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+
+class _Bot:
+    """Лише те, що валідатор викликає в aiogram Bot: download і send_message."""
+
+    def __init__(self, fail_downloads: int = 0):
+        self.fail_downloads = fail_downloads
+        self.downloads = 0
+        self.sent: list[tuple[int, str]] = []
+
+    async def download(self, file_id, destination):
+        self.downloads += 1
+        if self.fail_downloads:
+            self.fail_downloads -= 1
+            raise ConnectionError("download failed")
+        destination.write(b"\xff\xd8jpeg")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def _validate(monkeypatch, bot, jobs):
+    """Проганяє jobs через _Validator проти stub-сервера; повертає (validator, stub)."""
+    if not openai_check.OPENAI_AVAILABLE:
+        pytest.skip("openai SDK не встановлено")
+    stub = _StubOpenAI()
+
+    async def main():
+        runner, base_url = await stub.start()
+        monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        validator = openai_check._Validator(bot)
+        try:
+            for job in jobs:
+                if callable(job):
+                    job = job()
+                try:
+                    await validator.process(*job)
+                except ConnectionError:
+                    pass
+        finally:
+            await validator.client.close()
+            await runner.cleanup()
+        return validator
+
+    return asyncio.run(main()), stub
+
+
+def _register(db, file_unique_id: str, caption: str = "Чек АТБ") -> tuple:
+    pid = db.add_participant(42, "user", "Учасник", "+380670000000", f"photo-{file_unique_id}", 1,
+                             file_unique_id=file_unique_id, receipt_text=caption, chat_id=42)
+    return (db.get_active_campaign()["id"], pid, 42, f"photo-{file_unique_id}", caption, file_unique_id)
+
+
+def _verdict(db, participant_id: int):
+    with db._read() as conn:
+        return conn.execute("SELECT verdict FROM receipts WHERE participant_id = ?", (participant_id,)).fetchone()[0]
+
+
+def test_repeat_receipt_is_served_from_cache(temp_db, monkeypatch):
+    first = _register(temp_db, "AgADfile1")
+
+    def same_receipt_next_campaign():
+        temp_db.start_campaign("Друга")
+        return _register(temp_db, "AgADfile1")
+
+    bot = _Bot()
+    validator, stub = _validate(monkeypatch, bot, [first, same_receipt_next_campaign])
+
+    assert len(stub.requests) == 1
+    assert stub.requests[0]["model"] == openai_check.MODEL
+    assert (validator.calls, validator.cache_hits) == (1, 1)
+    assert bot.downloads == 1            # з кешу — без завантаження фото
+    assert [text for _, text in bot.sent] == [f"🧾 Чек №{first[1]} перевірено ✅"] * 2
+
+
+def test_cache_key_depends_on_rules_and_caption():
+    key = openai_check.content_key("Правила", "Чек", "AgADfile1")
+    assert key == openai_check.content_key("Правила", "Чек", "AgADfile1")
+    assert key != openai_check.content_key("Нові правила", "Чек", "AgADfile1")
+    assert key != openai_check.content_key("Правила", "Інший підпис", "AgADfile1")
+    assert key != openai_check.content_key("Правила", "Чек", "AgADfile2")
+
+
+def test_failed_receipt_can_be_retried(temp_db, monkeypatch):
+    job = _register(temp_db, "AgADfile1")
+    bot = _Bot(fail_downloads=1)
+    validator, stub = _validate(monkeypatch, bot, [job, job])
+
+    assert bot.downloads == 2
+    assert len(stub.requests) == 1
+    assert _verdict(temp_db, job[1]) == "ok"
@@ -0,0 +1,127 @@
+# tests/test_webhook.py
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+import webhook
+
+TOKEN = "123456:test"
+SECRET = "s3cret"
+
+
+def _update(update_id: int) -> dict:
+    """Записаний апдейт Telegram: текстове повідомлення в приватному чаті."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": 42, "type": "private", "first_name": "Тест"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+            "text": "/start",
+        },
+    }
+
+
+class _Handler:
+    """Хендлер, що тримає апдейт, поки тест не відпустить release."""
+
+    def __init__(self, hold: bool = False):
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+        self.running = 0
+        self.max_running = 0
+        self.done: list[int] = []
+
+    async def handle(self, message: Message) -> None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            self.done.append(message.message_id)
+        finally:
+            self.running -= 1
+
+
+def _run(scenario, concurrency: int = 4, hold: bool = False):
+    async def main():
+        handler = _Handler(hold)
+        router = Router()
+        router.message()(handler.handle)
+        dp = Dispatcher()
+        dp.include_router(router)
+        bot = Bot(TOKEN)
+        server = webhook.UpdateServer(dp, bot, concurrency=concurrency, secret=SECRET)
+        client = TestClient(TestServer(server.app()))
+        await client.start_server()
+        try:
+            await scenario(client, server, handler)
+        finally:
+            handler.release.set()
+            await server.drain(timeout=1)
+            await client.close()
+            await bot.session.close()
+
+    asyncio.run(main())
+
+
+def _post(client: TestClient, update_id: int, secret: str = SECRET):
+    return client.post(webhook.WEBHOOK_PATH, json=_update(update_id),
+                       headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+
+
+def test_valid_update_is_accepted_and_handled():
+    async def scenario(client, server, handler):
+        resp = await _post(client, 1)
+        assert resp.status == 200
+        assert await server.drain() == 0
+        assert handler.done == [1]
+        assert server.handled == 1
+
+    _run(scenario)
+
+
+def test_bad_secret_is_rejected():
+    async def scenario(client, server, handler):
+        resp = await _post(client, 1, secret="wrong")
+        assert resp.status == 401
+        resp = await client.post(webhook.WEBHOOK_PATH, json=_update(2))
+        assert resp.status == 401
+        await server.drain()
+        assert handler.done == []
+
+    _run(scenario)
+
+
+def test_drain_waits_for_inflight_and_rejects_new():
+    async def scenario(client, server, handler):
+        assert (await _post(client, 1)).status == 200
+        drain = asyncio.create_task(server.drain(timeout=5))
+        await asyncio.sleep(0.05)
+        assert (await _post(client, 2)).status == 503
+        assert not drain.done()
+        handler.release.set()
+        assert await drain == 0
+        assert handler.done == [1]
+
+    _run(scenario, hold=True)
+
+
+def test_concurrency_is_capped():
+    async def scenario(client, server, handler):
+        posts = [asyncio.create_task(_post(client, i)) for i in range(1, 7)]
+        await asyncio.sleep(0.2)
+        # два апдейти в обробці, решта чекає слота — відповідь їм ще не віддано
+        assert handler.running == 2
+        assert sum(p.done() for p in posts) == 2
+        handler.release.set()
+        statuses = [(await p).status for p in posts]
+        assert statuses == [200] * 6
+        assert await server.drain() == 0
+        assert sorted(handler.done) == [1, 2, 3, 4, 5, 6]
+        assert handler.max_running == 2
+
+    _run(scenario, concurrency=2, hold=True)
@@ -0,0 +1,124 @@
+# webhook.py
+import asyncio
+import logging
+import os
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+log = logging.getLogger("webhook")
+
+# WEBHOOK_URL — публічна адреса (https://host); порожня — сервер без set_webhook (локальні тести)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+DRAIN_TIMEOUT_SEC = float(os.getenv("DRAIN_TIMEOUT_SEC", "30"))
+
+
+class UpdateServer:
+    """
+    Приймає апдейти POST-ом і обробляє кожен окремою задачею.
+    Семафор обмежує кількість апдейтів в обробці: коли він вичерпаний, нові запити
+    чекають слота (Telegram сам тримає не більше max_connections з'єднань).
+    drain() перестає приймати нові (503 — Telegram повторить або віддасть іншому інстансу)
+    і чекає завершення тих, що вже в обробці.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int = MAX_CONCURRENT_UPDATES, secret: str = WEBHOOK_SECRET):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self._slots = asyncio.Semaphore(concurrency)
+        self._inflight: set[asyncio.Task] = set()
+        self._closing = False
+        self.handled = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            return web.Response(status=401)
+        if self._closing:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+
+        await self._slots.acquire()
+        if self._closing:
+            # drain() почався, поки чекали слот (або парсили тіло) — його знімок _inflight
+            # цю задачу вже не побачить; віддаємо 503, Telegram повторить апдейт
+            self._slots.release()
+            return web.Response(status=503)
+        task = asyncio.create_task(self._process(update))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            log.exception("Помилка обробки апдейта %s", update.update_id)
+        finally:
+            self.handled += 1
+            self._slots.release()
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SEC) -> int:
+        """Повертає кількість апдейтів, які не встигли завершитись за timeout (їх скасовано)."""
+        self._closing = True
+        pending = set(self._inflight)
+        if pending:
+            log.info("Webhook: чекаю завершення %d апдейтів…", len(pending))
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        return len(pending)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.handle)
+        return app
+
+
+def _stop_on_signals(stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: лишається KeyboardInterrupt
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, stop: asyncio.Event | None = None) -> None:
+    """Webhook-режим: aiohttp-сервер + graceful shutdown (drain апдейтів в обробці)."""
+    stop = stop or asyncio.Event()
+    server = UpdateServer(dp, bot)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await site.start()
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(MAX_CONCURRENT_UPDATES, 100),
+            )
+        log.info("Webhook on 🔥 %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+        _stop_on_signals(stop)
+        await stop.wait()
+    finally:
+        # webhook у Telegram не знімаємо: за балансувальником працюють інші інстанси
+        cancelled = await server.drain()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        log.info("Webhook зупинено: оброблено %d апдейтів, скасовано %d", server.handled, cancelled)